@@ -14,11 +14,12 @@
 
 import os
 import sys
+import warnings
 from traceback import format_exc
 
 import click
 
-from platformio import __version__, exception, maintenance, util
+from platformio import __version__, exception, util
 from platformio.commands import PlatformioCLI
 from platformio.compat import CYGWIN
 
@@ -33,15 +34,30 @@ from platformio.compat import CYGWIN
 @click.option("--caller", "-c", help="Caller ID (service).")
 @click.pass_context
 def cli(ctx, force, caller):
+    # pylint: disable=import-outside-toplevel
+    if is_home_worker():
+        # a call of PIO Home, hooks have been run by `pio home` command
+        from platformio import app
+        app.set_session_var("command_ctx", ctx)
+        app.set_session_var("force_option", force)
+        return
+    from platformio import maintenance
     maintenance.on_platformio_start(ctx, force, caller)
 
 
 @cli.resultcallback()
 @click.pass_context
 def process_result(ctx, result, force, caller):  # pylint: disable=W0613
+    if is_home_worker():
+        return
+    from platformio import maintenance  # pylint: disable=import-outside-toplevel
     maintenance.on_platformio_end(ctx, result)
 
 
+def is_home_worker():
+    return str(os.getenv("PLATFORMIO_HOME_WORKER", "")).lower() == "true"
+
+
 @util.memoized()
 def configure():
     if CYGWIN:
@@ -49,11 +65,9 @@ def configure():
 
     # https://urllib3.readthedocs.org
     # /en/latest/security.html#insecureplatformwarning
-    try:
-        import urllib3
-        urllib3.disable_warnings()
-    except (AttributeError, ImportError):
-        pass
+    # a filter instead of `urllib3.disable_warnings()`, urllib3 is imported
+    # only by commands which need network
+    warnings.filterwarnings("ignore", module=r"urllib3(\..*)?$")
 
     try:
         if str(os.getenv("PLATFORMIO_DISABLE_COLOR", "")).lower() == "true":
@@ -92,6 +106,8 @@ def main(argv=None):
         pass
     except Exception as e:  # pylint: disable=broad-except
         if not isinstance(e, exception.ReturnErrorCode):
+            # pylint: disable=import-outside-toplevel
+            from platformio import maintenance
             maintenance.on_platformio_exception(e)
             error_str = "Error: "
             if isinstance(e, exception.PlatformioException):
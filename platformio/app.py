@@ -14,21 +14,26 @@
 
 import codecs
 import hashlib
+import json
 import os
+import threading
 import uuid
 from os import environ, getenv, listdir, remove
 from os.path import abspath, dirname, expanduser, isdir, isfile, join
 from time import time
 
-import requests
-
-from platformio import exception, fs, lockfile
+from platformio import exception, fs, lockfile, util
 from platformio.compat import (WINDOWS, dump_json_to_unicode,
                                hashlib_encode_data)
 from platformio.proc import is_ci
 from platformio.project.helpers import (get_project_cache_dir,
                                         get_project_core_dir)
 
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
 
 def get_default_projects_dir():
     docs_dir = join(expanduser("~"), "Documents")
@@ -172,6 +177,140 @@ class State(object):
         return item in self._storage
 
 
+class StateDatabase(object):
+    """Application state stored per key in SQLite database (WAL mode).
+
+    Readers never block writers and a write touches only one row, so
+    parallel processes sharing the same core directory do not serialize on
+    a lock file as they do with `appstate.json`.
+    """
+
+    BUSY_TIMEOUT = 30  # in seconds
+
+    _instances = {}
+
+    @staticmethod
+    def is_available():
+        return sqlite3 is not None and getenv(
+            "PLATFORMIO_DISABLE_STATE_DB") != "true"
+
+    @staticmethod
+    def get_instance(path=None):
+        path = path or join(get_project_core_dir(), "appstate.db")
+        if path not in StateDatabase._instances:
+            StateDatabase._instances[path] = StateDatabase(path)
+        return StateDatabase._instances[path]
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._thread_lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn:
+            return self._conn
+        is_new = not isfile(self.path)
+        try:
+            conn = sqlite3.connect(self.path,
+                                   timeout=self.BUSY_TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS state "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        except sqlite3.Error:
+            raise exception.HomeDirPermissionsError(dirname(self.path))
+        self._conn = conn
+        if is_new:
+            self._import_json_state()
+        return conn
+
+    def _import_json_state(self):
+        json_path = join(dirname(self.path), "appstate.json")
+        if not isfile(json_path):
+            return
+        with State(json_path) as state:
+            items = [(key, json.dumps(value))
+                     for key, value in state.as_dict().items()]
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO state (key, value) VALUES (?, ?)", items)
+
+    def _execute(self, sql, params=()):
+        with self._thread_lock:
+            try:
+                return self._connect().execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                raise exception.HomeDirPermissionsError(dirname(self.path))
+
+    def get(self, key, default=None):
+        rows = self._execute("SELECT value FROM state WHERE key = ?", (key, ))
+        if not rows:
+            return default
+        try:
+            return json.loads(rows[0][0])
+        except ValueError:
+            return default
+
+    def set(self, key, value):
+        self._execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+            (key, json.dumps(value)))
+
+    def update(self, key, func, default=None):
+        """Replace a value with `func(value)` in one transaction, so
+        concurrent processes do not lose each other's updates"""
+        with self._thread_lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    rows = conn.execute(
+                        "SELECT value FROM state WHERE key = ?",
+                        (key, )).fetchall()
+                    value = default
+                    if rows:
+                        try:
+                            value = json.loads(rows[0][0])
+                        except ValueError:
+                            pass
+                    value = func(value)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO state (key, value) "
+                        "VALUES (?, ?)", (key, json.dumps(value)))
+                except:  # pylint: disable=bare-except
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                raise exception.HomeDirPermissionsError(dirname(self.path))
+        return value
+
+    def delete(self, key):
+        self._execute("DELETE FROM state WHERE key = ?", (key, ))
+
+    def as_dict(self):
+        result = {}
+        for key, value in self._execute("SELECT key, value FROM state"):
+            try:
+                result[key] = json.loads(value)
+            except ValueError:
+                pass
+        return result
+
+    def close(self):
+        with self._thread_lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+
+def get_state_db():
+    if not StateDatabase.is_available():
+        return None
+    return StateDatabase.get_instance()
+
+
 class ContentCache(object):
 
     def __init__(self, cache_dir=None):
@@ -225,6 +364,18 @@ class ContentCache(object):
         with codecs.open(cache_path, "rb", encoding="utf8") as fp:
             return fp.read()
 
+    def get_expire_time(self, key):
+        if not isfile(self._db_path):
+            return None
+        cache_path = self.get_cache_path(key)
+        expire_time = None
+        with open(self._db_path) as fp:
+            for line in fp:
+                expire, path = line.strip().partition("=")[::2]
+                if path == cache_path and expire.isdigit():
+                    expire_time = int(expire)
+        return expire_time
+
     def set(self, key, data, valid):
         if not get_setting("enable_cache"):
             return False
@@ -235,9 +386,7 @@ class ContentCache(object):
             return False
         if not isdir(self.cache_dir):
             os.makedirs(self.cache_dir)
-        tdmap = {"s": 1, "m": 60, "h": 3600, "d": 86400}
-        assert valid.endswith(tuple(tdmap))
-        expire_time = int(time() + tdmap[valid[-1]] * int(valid[:-1]))
+        expire_time = int(time() + util.parse_duration(valid))
 
         if not self._lock_dbindex():
             return False
@@ -328,20 +477,60 @@ def sanitize_setting(name, value):
 
 
 def get_state_item(name, default=None):
+    db = get_state_db()
+    if db:
+        return db.get(name, default)
     with State() as state:
         return state.get(name, default)
 
 
 def set_state_item(name, value):
+    if name == "settings":
+        _SETTINGS_CACHE.clear()
+    db = get_state_db()
+    if db:
+        return db.set(name, value)
     with State(lock=True) as state:
         state[name] = value
         state.modified = True
+    return None
+
+
+def update_state_item(name, func, default=None):
+    """Atomic read-modify-write of a state item, returns a new value"""
+    db = get_state_db()
+    if db:
+        value = db.update(name, func, default)
+    else:
+        with State(lock=True) as state:
+            value = state[name] = func(state.get(name, default))
+            state.modified = True
+    if name == "settings":
+        _SETTINGS_CACHE.clear()
+    return value
 
 
 def delete_state_item(name):
+    if name == "settings":
+        _SETTINGS_CACHE.clear()
+    db = get_state_db()
+    if db:
+        return db.delete(name)
     with State(lock=True) as state:
         if name in state:
             del state[name]
+    return None
+
+
+# settings are read many times per command, keep them per state location
+_SETTINGS_CACHE = {}
+
+
+def _get_stored_settings():
+    key = get_project_core_dir()
+    if key not in _SETTINGS_CACHE:
+        _SETTINGS_CACHE[key] = get_state_item("settings", None) or {}
+    return _SETTINGS_CACHE[key]
 
 
 def get_setting(name):
@@ -349,25 +538,21 @@ def get_setting(name):
     if _env_name in environ:
         return sanitize_setting(name, getenv(_env_name))
 
-    with State() as state:
-        if "settings" in state and name in state['settings']:
-            return state['settings'][name]
+    settings = _get_stored_settings()
+    if name in settings:
+        return settings[name]
 
     return DEFAULT_SETTINGS[name]['value']
 
 
 def set_setting(name, value):
-    with State(lock=True) as state:
-        if "settings" not in state:
-            state['settings'] = {}
-        state['settings'][name] = sanitize_setting(name, value)
-        state.modified = True
+    value = sanitize_setting(name, value)
+    update_state_item("settings",
+                      lambda settings: dict(settings or {}, **{name: value}))
 
 
 def reset_settings():
-    with State(lock=True) as state:
-        if "settings" in state:
-            del state['settings']
+    delete_state_item("settings")
 
 
 def get_session_var(name, default=None):
@@ -396,6 +581,7 @@ def get_cid():
         uid = getenv("C9_UID")
     elif getenv("CHE_API", getenv("CHE_API_ENDPOINT")):
         try:
+            import requests  # pylint: disable=import-outside-toplevel
             uid = requests.get("{api}/user?token={token}".format(
                 api=getenv("CHE_API", getenv("CHE_API_ENDPOINT")),
                 token=getenv("USER_TOKEN"))).json().get("id")
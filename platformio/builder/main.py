@@ -12,11 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from os import environ, makedirs
-from os.path import isdir, join
+from os import environ
+from os.path import join
 from time import time
 
 import click
+from SCons.Errors import UserError  # pylint: disable=import-error
 from SCons.Script import ARGUMENTS  # pylint: disable=import-error
 from SCons.Script import COMMAND_LINE_TARGETS  # pylint: disable=import-error
 from SCons.Script import DEFAULT_TARGETS  # pylint: disable=import-error
@@ -31,6 +32,7 @@ from platformio import fs
 from platformio.compat import PY2, dump_json_to_unicode
 from platformio.managers.platform import PlatformBase
 from platformio.proc import get_pythonexe_path
+from platformio.profiler import Profiler
 from platformio.project import helpers as project_helpers
 
 AllowSubstExceptions(NameError)
@@ -41,15 +43,26 @@ clivars.AddVariables(
     ("PLATFORM_MANIFEST",),
     ("BUILD_SCRIPT",),
     ("PROJECT_CONFIG",),
+    ("PROJECT_SNAPSHOT",),
     ("PIOENV",),
     ("PIOTEST_RUNNING_NAME",),
-    ("UPLOAD_PORT",)
+    ("UPLOAD_PORT",),
+    ("PROFILE_TRACE",)
 )  # yapf: disable
 
+# use directories resolved by the parent process when it is possible
+PROJECT_SNAPSHOT = None
+if "PROJECT_SNAPSHOT" in ARGUMENTS:
+    PROJECT_SNAPSHOT = project_helpers.load_project_snapshot(
+        PlatformBase.decode_scons_arg(ARGUMENTS['PROJECT_SNAPSHOT']))
+PROJECT_DIRS = (PROJECT_SNAPSHOT['dirs']
+                if PROJECT_SNAPSHOT else project_helpers.get_project_dirs())
+
 DEFAULT_ENV_OPTIONS = dict(
     tools=[
         "ar", "gas", "gcc", "g++", "gnulink", "platformio", "pioplatform",
-        "pioproject", "piowinhooks", "piolib", "pioupload", "piomisc", "pioide"
+        "pioproject", "piowinhooks", "piolib", "pioupload", "piomisc", "pioide",
+        "piocache", "pioprofiler", "piosize"
     ],
     toolpath=[join(fs.get_source_dir(), "builder", "tools")],
     variables=clivars,
@@ -57,25 +70,25 @@ DEFAULT_ENV_OPTIONS = dict(
     # Propagating External Environment
     ENV=environ,
     UNIX_TIME=int(time()),
-    PROJECT_DIR=project_helpers.get_project_dir(),
-    PROJECTCORE_DIR=project_helpers.get_project_core_dir(),
-    PROJECTPACKAGES_DIR=project_helpers.get_project_packages_dir(),
-    PROJECTWORKSPACE_DIR=project_helpers.get_project_workspace_dir(),
-    PROJECTLIBDEPS_DIR=project_helpers.get_project_libdeps_dir(),
-    PROJECTINCLUDE_DIR=project_helpers.get_project_include_dir(),
-    PROJECTSRC_DIR=project_helpers.get_project_src_dir(),
-    PROJECTTEST_DIR=project_helpers.get_project_test_dir(),
-    PROJECTDATA_DIR=project_helpers.get_project_data_dir(),
-    PROJECTBUILD_DIR=project_helpers.get_project_build_dir(),
-    BUILDCACHE_DIR=project_helpers.get_project_optional_dir("build_cache_dir"),
+    PROJECT_DIR=PROJECT_DIRS['project_dir'],
+    PROJECTCORE_DIR=PROJECT_DIRS['core_dir'],
+    PROJECTPACKAGES_DIR=PROJECT_DIRS['packages_dir'],
+    PROJECTWORKSPACE_DIR=PROJECT_DIRS['workspace_dir'],
+    PROJECTLIBDEPS_DIR=PROJECT_DIRS['libdeps_dir'],
+    PROJECTINCLUDE_DIR=PROJECT_DIRS['include_dir'],
+    PROJECTSRC_DIR=PROJECT_DIRS['src_dir'],
+    PROJECTTEST_DIR=PROJECT_DIRS['test_dir'],
+    PROJECTDATA_DIR=PROJECT_DIRS['data_dir'],
+    PROJECTBUILD_DIR=PROJECT_DIRS['build_dir'],
+    BUILDCACHE_DIR=PROJECT_DIRS['build_cache_dir'],
     BUILD_DIR=join("$PROJECTBUILD_DIR", "$PIOENV"),
     BUILDSRC_DIR=join("$BUILD_DIR", "src"),
     BUILDTEST_DIR=join("$BUILD_DIR", "test"),
     LIBPATH=["$BUILD_DIR"],
     LIBSOURCE_DIRS=[
-        project_helpers.get_project_lib_dir(),
+        PROJECT_DIRS['lib_dir'],
         join("$PROJECTLIBDEPS_DIR", "$PIOENV"),
-        project_helpers.get_project_global_lib_dir()
+        PROJECT_DIRS['globallib_dir']
     ],
     PROGNAME="program",
     PROG_PATH=join("$BUILD_DIR", "$PROGNAME$PROGSUFFIX"),
@@ -97,10 +110,8 @@ env.Replace(
         for key in list(clivars.keys()) if key in env
     })
 
-if env.subst("$BUILDCACHE_DIR"):
-    if not isdir(env.subst("$BUILDCACHE_DIR")):
-        makedirs(env.subst("$BUILDCACHE_DIR"))
-    env.CacheDir("$BUILDCACHE_DIR")
+env.ConfigureProfiler()
+env.ConfigureBuildCache()
 
 if int(ARGUMENTS.get("ISATTY", 0)):
     # pylint: disable=protected-access
@@ -113,7 +124,8 @@ elif not int(ARGUMENTS.get("PIOVERBOSE", 0)):
     print("Verbose mode can be enabled via `-v, --verbose` option")
 
 env.LoadProjectOptions()
-env.LoadPioPlatform()
+with Profiler().phase("LoadPioPlatform"):
+    env.LoadPioPlatform()
 
 env.SConscriptChdir(0)
 env.SConsignFile(
@@ -123,7 +135,8 @@ env.SConsignFile(
 for item in env.GetExtraScripts("pre"):
     env.SConscript(item, exports="env")
 
-env.SConscript("$BUILD_SCRIPT")
+with Profiler().phase("Build graph"):
+    env.SConscript("$BUILD_SCRIPT")
 
 if "UPLOAD_FLAGS" in env:
     env.Prepend(UPLOADERFLAGS=["$UPLOAD_FLAGS"])
@@ -144,6 +157,15 @@ if env.get("SIZETOOL") and "nobuild" not in COMMAND_LINE_TARGETS:
     Default(_new_targets)
     Default("checkprogsize")
 
+env.ProfileTarget(env.Alias("checkprogsize"), "checkprogsize")
+
+if "sizedata" in COMMAND_LINE_TARGETS and env.get("PIOMAINPROG"):
+    AlwaysBuild(
+        env.Alias(
+            "sizedata", env['PIOMAINPROG'],
+            env.VerboseAction(env.DumpSizeData,
+                              "Generating memory usage data...")))
+
 # Print configured protocols
 env.AddPreAction(["upload", "program"],
                  env.VerboseAction(
@@ -162,6 +184,17 @@ if "envdump" in COMMAND_LINE_TARGETS:
 if "idedata" in COMMAND_LINE_TARGETS:
     Import("projenv")
     print("\n%s\n" % dump_json_to_unicode(
-        env.DumpIDEData(projenv)  # pylint: disable=undefined-variable
+        env.SaveIDEData(projenv)  # pylint: disable=undefined-variable
     ))
     env.Exit(0)
+
+# keep IDE data and compilation database in sync with the build
+if not set(["__test", "debug", "nobuild"]) & set(COMMAND_LINE_TARGETS):
+    try:
+        # is exported by `BuildProgram`, some platforms do not build it
+        Import("projenv")
+    except UserError:
+        pass
+    else:
+        with Profiler().phase("SaveIDEData"):
+            env.SaveIDEData(projenv)  # pylint: disable=undefined-variable
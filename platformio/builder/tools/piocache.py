@@ -0,0 +1,395 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import atexit
+import json
+import os
+import re
+import shutil
+import threading
+from hashlib import md5
+from os.path import dirname, isdir, isfile, join
+from tempfile import mkstemp
+from time import time
+
+from SCons.Action import ActionBase, _null  # pylint: disable=import-error
+from SCons.Script import ARGUMENTS  # pylint: disable=import-error
+
+from platformio import fs
+from platformio.compat import hashlib_encode_data
+from platformio.proc import exec_command, where_is_program
+
+BUILD_CACHE_SIZE_DEFAULT = "5GB"
+BUILD_CACHE_EVICT_RATIO = 0.9  # evict down to 90% of the limit
+# compile cache key format, increase it when the key computation changes
+BUILD_CACHE_KEY_VERSION = 2
+
+
+def parse_filesize(value):
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$", str(value),
+                     re.I)
+    if not match:
+        raise ValueError("Invalid file size `%s`" % value)
+    power = " KMGT".index(match.group(2).upper() or " ")
+    return int(float(match.group(1)) * (1024**power))
+
+
+class CompileCache(object):
+    """Object files storage addressed by a path-independent key.
+
+    A key is computed from the compile command and the content of all
+    dependencies (sources, headers, a size and modification time of
+    the compiler). When the compiler supports `-ffile-prefix-map`, paths
+    of `normalize_paths` are remapped in objects and replaced with
+    placeholders in a key, so projects located in different directories
+    or machines share the same objects. Otherwise, a key contains
+    absolute paths.
+    """
+
+    def __init__(self, cache_dir, max_size, normalize_paths, remote=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.normalize_paths = sorted(
+            [(path, name) for path, name in normalize_paths if path],
+            key=lambda item: len(item[0]),
+            reverse=True)
+        self.remote = remote.rstrip("/") if remote else None
+        self.stats = dict(hits=0, misses=0, remote_hits=0, stored=0)
+        self._stored_size = 0
+        self._tools = {}
+        self._lock = threading.Lock()
+        self._http_session = None
+
+    def normalize(self, text):
+        for path, name in self.normalize_paths:
+            text = text.replace(path, name)
+        return text
+
+    def get_prefix_map_flags(self):
+        # GCC applies the last matching map, a nested path goes last
+        return [
+            "-ffile-prefix-map=%s=%s" % (path, name[1:])
+            for path, name in reversed(self.normalize_paths)
+        ]
+
+    def compute_key(self, command, dependencies, normalize=True):
+        """`dependencies` is a list of (path, content signature)"""
+        _normalize = self.normalize if normalize else (lambda text: text)
+        h = md5()
+        h.update(hashlib_encode_data(str(BUILD_CACHE_KEY_VERSION)))
+        h.update(hashlib_encode_data(_normalize(command)))
+        dependencies = [(_normalize(path), csig)
+                        for path, csig in dependencies]
+        for path, csig in sorted(dependencies):
+            h.update(hashlib_encode_data("%s=%s" % (path, csig)))
+        return h.hexdigest()
+
+    def get_tool(self, name, envpath=None):
+        """Returns a (path, signature, remaps paths) of a compiler"""
+        if name not in self._tools:
+            path = where_is_program(name, envpath) or name
+            try:
+                stat = os.stat(path)
+                signature = "%d:%d" % (stat.st_size, int(stat.st_mtime))
+                remaps = exec_command([
+                    path, "-ffile-prefix-map=%s=." % dirname(path), "-E",
+                    "-x", "c", os.devnull
+                ])['returncode'] == 0
+            except OSError:
+                signature = ""
+                remaps = False
+            self._tools[name] = (path, signature, remaps)
+        return self._tools[name]
+
+    def get_path(self, key):
+        return join(self.cache_dir, key[:2], key)
+
+    def fetch(self, key, dst):
+        path = self.get_path(key)
+        if not isfile(path) and not self._fetch_remote(key, path):
+            self._update_stats("misses")
+            return False
+        try:
+            shutil.copyfile(path, dst)
+            os.utime(path, None)  # least recently used eviction
+        except (IOError, OSError):
+            self._update_stats("misses")
+            return False
+        self._update_stats("hits")
+        return True
+
+    def store(self, key, src):
+        path = self.get_path(key)
+        if not isfile(src):
+            return False
+        try:
+            if not isdir(dirname(path)):
+                os.makedirs(dirname(path))
+            fd, tmp_path = mkstemp(dir=dirname(path), prefix=".tmp-")
+            os.close(fd)
+            shutil.copyfile(src, tmp_path)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            return False
+        self._update_stats("stored", os.path.getsize(path))
+        self._store_remote(key, path)
+        return True
+
+    def _update_stats(self, name, size=0):
+        with self._lock:
+            self.stats[name] += 1
+            self._stored_size += size
+
+    def _get_http_session(self):
+        if not self._http_session:
+            import requests  # pylint: disable=import-outside-toplevel
+            self._http_session = requests.Session()
+        return self._http_session
+
+    def _fetch_remote(self, key, path):
+        if not self.remote:
+            return False
+        try:
+            r = self._get_http_session().get("%s/%s" % (self.remote, key),
+                                             timeout=5)
+            if r.status_code != 200:
+                return False
+            if not isdir(dirname(path)):
+                os.makedirs(dirname(path))
+            fd, tmp_path = mkstemp(dir=dirname(path), prefix=".tmp-")
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(r.content)
+            os.rename(tmp_path, path)
+        except Exception:  # pylint: disable=broad-except
+            self.remote = None  # do not slow down the build anymore
+            return False
+        self._update_stats("remote_hits", len(r.content))
+        return True
+
+    def _store_remote(self, key, path):
+        if not self.remote:
+            return
+        try:
+            with open(path, "rb") as fp:
+                self._get_http_session().put("%s/%s" % (self.remote, key),
+                                             data=fp,
+                                             timeout=5).raise_for_status()
+        except Exception:  # pylint: disable=broad-except
+            self.remote = None
+
+    def evict(self):
+        """Remove the least recently used objects above the size limit"""
+        if not self.max_size or not isdir(self.cache_dir):
+            return 0
+        items = []
+        total_size = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    continue
+                path = join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                total_size += stat.st_size
+                items.append((stat.st_mtime, stat.st_size, path))
+        if total_size <= self.max_size:
+            return total_size
+        for _, size, path in sorted(items):
+            if total_size <= self.max_size * BUILD_CACHE_EVICT_RATIO:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
+        return total_size
+
+    def load_stats(self):
+        path = join(self.cache_dir, "stats.json")
+        try:
+            if isfile(path):
+                return fs.load_json(path)
+        except Exception:  # pylint: disable=broad-except
+            pass
+        return {}
+
+    def save_stats(self, data):
+        for name, value in self.stats.items():
+            data[name] = data.get(name, 0) + value
+        data['updated'] = int(time())
+        try:
+            with open(join(self.cache_dir, "stats.json"), "w") as fp:
+                json.dump(data, fp)
+        except IOError:
+            pass
+
+    def print_summary(self):
+        total = self.stats['hits'] + self.stats['misses']
+        if not total:
+            return
+        data = self.load_stats()
+        # walk the whole cache only when the limit could be exceeded
+        used_size = data.get("size")
+        if used_size is None or (used_size + self._stored_size >
+                                 self.max_size):
+            used_size = self.evict()
+        else:
+            used_size += self._stored_size
+        data['size'] = used_size
+        self.save_stats(data)
+        print("Compile cache: %d hits%s, %d misses (%d%%), %s of %s used" %
+              (self.stats['hits'], " (%d remote)" % self.stats['remote_hits']
+               if self.stats['remote_hits'] else "", self.stats['misses'],
+               self.stats['hits'] * 100 / total,
+               fs.format_filesize(used_size), fs.format_filesize(
+                   self.max_size)))
+
+
+class CompileCacheAction(ActionBase):
+    """Proxy for an object builder action which looks up a compiled object
+    in `CompileCache` and runs the original action only on a miss."""
+
+    def __init__(self, action, cache):
+        self.action = action
+        self.cache = cache
+        self.varlist = getattr(action, "varlist", ())
+        self.targets = getattr(action, "targets", "$TARGETS")
+
+    def _compute_key(self, target, source, env, tool):
+        command = env.subst(self.action.genstring(target, source, env), 0,
+                            target, source)
+        dependencies = [tool[:2]]
+        for node in target[0].children():
+            try:
+                dependencies.append((node.get_abspath(), node.get_csig()))
+            except AttributeError:
+                dependencies.append((str(node), ""))
+        return self.cache.compute_key(command, dependencies, tool[2])
+
+    def __call__(  # pylint: disable=too-many-arguments
+            self,
+            target,
+            source,
+            env,
+            exitstatfunc=_null,
+            presub=_null,
+            show=_null,
+            execute=_null,
+            chdir=_null,
+            executor=None):
+        kwargs = dict(exitstatfunc=exitstatfunc,
+                      presub=presub,
+                      show=show,
+                      execute=execute,
+                      chdir=chdir,
+                      executor=executor)
+        if executor:
+            target = executor.get_all_targets()
+            source = executor.get_all_sources()
+        if len(target) != 1 or execute is False:
+            return self.action(target, source, env, **kwargs)
+        tool = self.cache.get_tool(
+            env.subst(self.action.genstring(target, source, env), 0, target,
+                      source).split(" ")[0], env['ENV'].get("PATH"))
+        if tool[2]:
+            # do not embed paths of this project into shared objects
+            env = env.Override({
+                "CPPFLAGS":
+                env.get("CPPFLAGS", []) + self.cache.get_prefix_map_flags()
+            })
+        key = self._compute_key(target, source, env, tool)
+        dst = target[0].get_abspath()
+        if not isdir(dirname(dst)):
+            os.makedirs(dirname(dst))
+        if self.cache.fetch(key, dst):
+            if int(ARGUMENTS.get("PIOVERBOSE", 0)):
+                print("Retrieved `%s' from compile cache" % target[0])
+            return 0
+        result = self.action(target, source, env, **kwargs)
+        if not result:
+            self.cache.store(key, dst)
+        return result
+
+    def __str__(self):
+        return str(self.action)
+
+    def batch_key(self, env, target, source):
+        return self.action.batch_key(env, target, source)
+
+    def genstring(self, target, source, env, executor=None):
+        return self.action.genstring(target, source, env)
+
+    def get_presig(self, target, source, env, executor=None):
+        return self.action.get_presig(target, source, env)
+
+    def get_implicit_deps(self, target, source, env, executor=None):
+        return self.action.get_implicit_deps(target, source, env)
+
+    def get_varlist(self, target, source, env, executor=None):
+        return self.action.get_varlist(target, source, env, executor)
+
+    def get_targets(self, env, executor):
+        return self.action.get_targets(env, executor)
+
+
+def ConfigureBuildCache(env):
+    cache_dir = env.subst("$BUILDCACHE_DIR")
+    if not cache_dir:
+        return None
+    if not isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    if env.GetProjectGlobalOption("build_cache_mode", "scons") != "compile":
+        env.CacheDir(cache_dir)
+        return None
+
+    try:
+        max_size = parse_filesize(
+            env.GetProjectGlobalOption("build_cache_size",
+                                       BUILD_CACHE_SIZE_DEFAULT))
+    except ValueError as e:
+        print("Warning! %s, use %s" % (e, BUILD_CACHE_SIZE_DEFAULT))
+        max_size = parse_filesize(BUILD_CACHE_SIZE_DEFAULT)
+
+    cache = CompileCache(
+        join(cache_dir, "objects"), max_size, [
+            (env.subst(env[name]), "$" + name)
+            for name in ("BUILD_DIR", "PROJECTBUILD_DIR", "PROJECTLIBDEPS_DIR",
+                         "PROJECTPACKAGES_DIR", "PROJECTCORE_DIR",
+                         "PROJECT_DIR")
+        ], env.GetProjectGlobalOption("build_cache_remote"))
+
+    for name in ("Object", "StaticObject"):
+        builder = env['BUILDERS'].get(name)
+        if not builder or not hasattr(builder, "cmdgen"):
+            continue
+        for suffix, action in list(builder.cmdgen.items()):
+            if not isinstance(action, CompileCacheAction):
+                builder.add_action(suffix, CompileCacheAction(action, cache))
+
+    atexit.register(cache.print_summary)
+    return cache
+
+
+def exists(_):
+    return True
+
+
+def generate(env):
+    env.AddMethod(ConfigureBuildCache)
+    return env
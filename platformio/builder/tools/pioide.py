@@ -14,15 +14,22 @@
 
 from __future__ import absolute_import
 
+import json
 from glob import glob
-from os import environ
-from os.path import abspath, isfile, join
+from os import environ, makedirs
+from os.path import abspath, isdir, isfile, join
 
 from SCons.Defaults import processDefines  # pylint: disable=import-error
 
+from platformio import __version__
 from platformio.compat import glob_escape
 from platformio.managers.core import get_core_package_dir
 from platformio.proc import exec_command, where_is_program
+from platformio.project.helpers import (PROJECT_IDE_DATA_VERSION,
+                                        get_project_ide_data_deps,
+                                        get_project_ide_data_path,
+                                        get_project_options_sysenv,
+                                        load_project_ide_data_cache)
 
 
 def _dump_includes(env, projenv):
@@ -184,10 +191,93 @@ def DumpIDEData(env, projenv):
     return data
 
 
+def DumpCompilationDatabase(env):
+    result = []
+    project_dir = env.Dir("#").get_abspath()
+    for node in env.Flatten(env.get("PIOCOMPILEDB", [])):
+        executor = node.get_executor()
+        if not executor or not node.sources:
+            continue
+        build_env = executor.get_build_env()
+        targets = executor.get_all_targets()
+        sources = executor.get_all_sources()
+        command = " ".join(
+            build_env.subst(action.genstring(targets, sources, build_env), 0,
+                            targets, sources)
+            for action in executor.get_action_list())
+        result.append({
+            "directory": project_dir,
+            "file": node.sources[0].srcnode().get_abspath(),
+            "output": node.get_abspath(),
+            "command": command
+        })
+    return result
+
+
+def _get_ide_data_deps(env):
+    """Paths which affect IDE data but are not covered by project checksum"""
+    paths = [
+        env.subst("$PLATFORM_MANIFEST"),
+        join(env.subst("$PROJECTLIBDEPS_DIR"), env['PIOENV'])
+    ]
+    paths.extend(env.GetLibSourceDirs())
+    paths.extend(env.GetExtraScripts("pre"))
+    paths.extend(env.GetExtraScripts("post"))
+    return get_project_ide_data_deps(paths)
+
+
+def _get_project_checksum(env):
+    path = join(env.subst("$PROJECTBUILD_DIR"), "project.checksum")
+    if not isfile(path):
+        return None
+    with open(path) as fp:
+        return fp.read()
+
+
+def _is_ide_data_cache_valid(env, cache, checksum, sysenv, deps):
+    if not cache or not checksum or cache['checksum'] != checksum:
+        return False
+    return (cache.get("sysenv") == sysenv and cache['deps'] == deps
+            and isfile(join(env.subst("$BUILD_DIR"), "compile_commands.json")))
+
+
+def SaveIDEData(env, projenv):
+    """Store IDE data and "compile_commands.json" along with the build, they
+    are reused by IDE generators and debugger while the project is not
+    changed"""
+    checksum = _get_project_checksum(env)
+    sysenv = get_project_options_sysenv()
+    deps = _get_ide_data_deps(env)
+    build_dir = env.subst("$BUILD_DIR")
+    cache = load_project_ide_data_cache(env.subst("$PROJECTBUILD_DIR"),
+                                        env['PIOENV'])
+    if _is_ide_data_cache_valid(env, cache, checksum, sysenv, deps):
+        return cache['data']
+
+    if not isdir(build_dir):
+        makedirs(build_dir)
+    with open(join(build_dir, "compile_commands.json"), "w") as fp:
+        json.dump(env.DumpCompilationDatabase(), fp, indent=2)
+    data = env.DumpIDEData(projenv)
+    with open(
+            get_project_ide_data_path(env.subst("$PROJECTBUILD_DIR"),
+                                      env['PIOENV']), "w") as fp:
+        json.dump(
+            dict(version=PROJECT_IDE_DATA_VERSION,
+                 pioversion=__version__,
+                 checksum=checksum,
+                 sysenv=sysenv,
+                 deps=deps,
+                 data=data), fp)
+    return data
+
+
 def exists(_):
     return True
 
 
 def generate(env):
     env.AddMethod(DumpIDEData)
+    env.AddMethod(DumpCompilationDatabase)
+    env.AddMethod(SaveIDEData)
     return env
@@ -215,6 +215,10 @@ class LibBuilderBase(object):
     def lib_archive(self):
         return self.env.GetProjectOption("lib_archive", True)
 
+    @property
+    def lib_unity_build(self):
+        return self.env.GetProjectOption("lib_unity_build", False)
+
     @property
     def lib_ldf_mode(self):
         return self.env.GetProjectOption("lib_ldf_mode", self.LDF_MODE_DEFAULT)
@@ -427,6 +431,9 @@ class LibBuilderBase(object):
                 for key in ("CPPPATH", "LIBPATH", "LIBS", "LINKFLAGS"):
                     self.env.PrependUnique(**{key: lb.env.get(key)})
 
+        self.env.ProcessPrecompiledHeader()
+        if self.lib_unity_build:
+            self.env.Replace(PIOUNITYBUILD=True)
         if self.lib_archive:
             libs.append(
                 self.env.BuildLibrary(self.build_dir, self.src_dir,
@@ -740,6 +747,14 @@ class PlatformIOLibBuilder(LibBuilderBase):
         return self._manifest.get("build", {}).get(
             "libArchive", LibBuilderBase.lib_archive.fget(self))
 
+    @property
+    def lib_unity_build(self):
+        global_value = self.env.GetProjectOption("lib_unity_build")
+        if global_value is not None:
+            return global_value
+        return self._manifest.get("build", {}).get(
+            "unityBuild", LibBuilderBase.lib_unity_build.fget(self))
+
     @property
     def lib_ldf_mode(self):
         return self.validate_ldf_mode(
@@ -819,12 +834,15 @@ class ProjectAsLibBuilder(LibBuilderBase):
     def get_search_files(self):
         # project files
         items = LibBuilderBase.get_search_files(self)
-        # test files
+        # sketch converted from "*.ino" files
+        if self.env.get("PIOINO2CPP"):
+            items.append(self.env['PIOINO2CPP'])
+        # files of all test suites, dependencies and build flags are the
+        # same for each suite and the objects are not rebuilt
         if "__test" in COMMAND_LINE_TARGETS:
             items.extend([
-                join("$PROJECTTEST_DIR",
-                     item) for item in self.env.MatchSourceFiles(
-                         "$PROJECTTEST_DIR", "$PIOTEST_SRC_FILTER")
+                join("$PROJECTTEST_DIR", item)
+                for item in self.env.MatchSourceFiles("$PROJECTTEST_DIR")
             ])
         return items
 
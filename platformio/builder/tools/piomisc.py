@@ -14,45 +14,153 @@
 
 from __future__ import absolute_import
 
-import atexit
 import re
 import sys
-from os import environ, remove, walk
+from hashlib import md5
+from os import close, environ, makedirs, remove, stat, walk
 from os.path import basename, isdir, isfile, join, realpath, relpath, sep
+from string import Template
 from tempfile import mkstemp
 
 from SCons.Action import Action  # pylint: disable=import-error
 from SCons.Script import ARGUMENTS  # pylint: disable=import-error
 
 from platformio import fs, util
-from platformio.compat import get_file_contents, glob_escape
+from platformio.compat import (get_file_contents, glob_escape,
+                               hashlib_encode_data)
 from platformio.managers.core import get_core_package_dir
 from platformio.proc import exec_command
 
+TEST_TRANSPORT_OPTIONS = {
+    "arduino": {
+        "include": "#include <Arduino.h>",
+        "object": "",
+        "putchar": "Serial.write(c)",
+        "flush": "Serial.flush()",
+        "begin": "Serial.begin($baudrate)",
+        "end": "Serial.end()"
+    },
+    "mbed": {
+        "include": "#include <mbed.h>",
+        "object": "Serial pc(USBTX, USBRX);",
+        "putchar": "pc.putc(c)",
+        "flush": "",
+        "begin": "pc.baud($baudrate)",
+        "end": ""
+    },
+    "espidf": {
+        "include": "#include <stdio.h>",
+        "object": "",
+        "putchar": "putchar(c)",
+        "flush": "fflush(stdout)",
+        "begin": "",
+        "end": ""
+    },
+    "native": {
+        "include": "#include <stdio.h>",
+        "object": "",
+        "putchar": "putchar(c)",
+        "flush": "fflush(stdout)",
+        "begin": "",
+        "end": ""
+    },
+    "custom": {
+        "include": '#include "unittest_transport.h"',
+        "object": "",
+        "putchar": "unittest_uart_putchar(c)",
+        "flush": "unittest_uart_flush()",
+        "begin": "unittest_uart_begin()",
+        "end": "unittest_uart_end()"
+    }
+}
+
+TEST_OUTPUT_TPL = "\n".join([
+    "$include",
+    "#include <output_export.h>",
+    "",
+    "$object",
+    "",
+    "#ifdef __GNUC__",
+    "void output_start(unsigned int baudrate __attribute__((unused)))",
+    "#else",
+    "void output_start(unsigned int baudrate)",
+    "#endif",
+    "{",
+    "    $begin;",
+    "}",
+    "",
+    "void output_char(int c)",
+    "{",
+    "    $putchar;",
+    "}",
+    "",
+    "void output_flush(void)",
+    "{",
+    "    $flush;",
+    "}",
+    "",
+    "void output_complete(void)",
+    "{",
+    "   $end;",
+    "}"
+])  # yapf: disable
+
 
 class InoToCPPConverter(object):
 
-    PROTOTYPE_RE = re.compile(
-        r"""^(
-        (?:template\<.*\>\s*)?      # template
-        ([a-z_\d\&]+\*?\s+){1,2}    # return type
-        ([a-z_\d]+\s*)              # name of prototype
-        \([a-z_,\.\*\&\[\]\s\d]*\)  # arguments
-        )\s*(\{|;)                  # must end with `{` or `;`
-        """, re.X | re.M | re.I)
+    # increase it when the output of converter changes
+    VERSION = 2
+
     DETECTMAIN_RE = re.compile(r"void\s+(setup|loop)\s*\(", re.M | re.I)
-    PROTOPTRS_TPLRE = r"\([^&\(]*&(%s)[^\)]*\)"
+    LINEMARKER_RE = re.compile(r'^#\s*(?:line\s+)?(\d+)(?:\s+"([^"]*)")?')
+    TOKEN_RE = re.compile(r""""(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|"""
+                          r"[A-Za-z_]\w*|::|->|\S")
+    # inside of blocks only braces and addresses of functions are needed
+    BLOCK_TOKEN_RE = re.compile(
+        r""""(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|[{}]|&\s*([A-Za-z_]\w*)""")
+    NOT_PROTOTYPE_KEYWORDS = frozenset([
+        "if", "else", "while", "for", "do", "switch", "return", "sizeof",
+        "typedef", "using", "namespace", "class", "union", "enum", "new",
+        "delete", "case", "goto", "operator", "decltype", "alignof"
+    ])
 
     def __init__(self, env):
         self.env = env
         self._main_ino = None
+        self._sketch_dir = join(env.subst("$BUILD_DIR"), "sketch")
 
     def is_main_node(self, contents):
         return self.DETECTMAIN_RE.search(contents)
 
     def convert(self, nodes):
         contents = self.merge(nodes)
-        return self.process(contents) if contents else None
+        if not contents:
+            return None
+        out_file = join(self._sketch_dir, basename(self._main_ino) + ".cpp")
+        checksum_file = out_file + ".checksum"
+        checksum = self.compute_checksum(contents)
+        if (isfile(out_file) and isfile(checksum_file)
+                and get_file_contents(checksum_file) == checksum):
+            return out_file
+        self.process(contents, out_file)
+        with open(checksum_file, "w") as fp:
+            fp.write(checksum)
+        return out_file
+
+    def compute_checksum(self, contents):
+        """Checksum of the merged sketch and of the compiler which
+        preprocesses it"""
+        h = md5()
+        h.update(hashlib_encode_data(str(self.VERSION)))
+        h.update(hashlib_encode_data(contents))
+        cxx = self.env.subst("$CXX")
+        h.update(hashlib_encode_data(cxx))
+        cxx_path = self.env.WhereIs(cxx)
+        if cxx_path:
+            info = stat(cxx_path)
+            h.update(hashlib_encode_data("%d-%d" %
+                                         (info.st_size, info.st_mtime)))
+        return h.hexdigest()
 
     def merge(self, nodes):
         assert nodes
@@ -73,8 +181,7 @@ class InoToCPPConverter(object):
 
         return "\n".join(["#include <Arduino.h>"] + lines) if lines else None
 
-    def process(self, contents):
-        out_file = f"{self._main_ino}.cpp"
+    def process(self, contents, out_file):
         assert self._gcc_preprocess(contents, out_file)
         contents = get_file_contents(out_file)
         contents = self._join_multiline_strings(contents)
@@ -83,18 +190,25 @@ class InoToCPPConverter(object):
         return out_file
 
     def _gcc_preprocess(self, contents, out_file):
-        tmp_path = mkstemp()[1]
+        if not isdir(self._sketch_dir):
+            makedirs(self._sketch_dir)
+        if isfile(out_file):
+            remove(out_file)
+        fd, tmp_path = mkstemp(dir=self._sketch_dir, suffix=".cpp")
+        close(fd)
         with open(tmp_path, "w") as fp:
             fp.write(contents)
-        self.env.Execute(
-            self.env.VerboseAction(
-                '$CXX -o "{0}" -x c++ -fpreprocessed -dD -E "{1}"'.format(
-                    out_file, tmp_path
-                ),
-                f"Converting {basename(out_file[:-4])}",
+        try:
+            self.env.Execute(
+                self.env.VerboseAction(
+                    '$CXX -o "{0}" -x c++ -fpreprocessed -dD -E "{1}"'.format(
+                        out_file, tmp_path
+                    ),
+                    f"Converting {basename(out_file[:-4])}",
+                )
             )
-        )
-        atexit.register(_delete_file, tmp_path)
+        finally:
+            remove(tmp_path)
         return isfile(out_file)
 
     def _join_multiline_strings(self, contents):
@@ -136,54 +250,179 @@ class InoToCPPConverter(object):
         tokens = line.split(" ", 3)
         return int(tokens[1]) if len(tokens) > 2 and tokens[1].isdigit() else None
 
-    def _parse_prototypes(self, contents):
+    @staticmethod
+    def _is_sketch_file(path):
+        return path.lower().endswith((".ino", ".pde"))
+
+    def _tokenize_sketch(self, lines):
+        """Yields (line index, column, token) for the code of sketch files,
+        other files and preprocessor directives are skipped"""
+        in_sketch = False
+        in_directive = False
+        depth = 0
+        for index, line in enumerate(lines):
+            if in_directive:
+                in_directive = line.endswith("\\")
+                continue
+            if line.startswith("#"):
+                match = self.LINEMARKER_RE.match(line)
+                if match and match.group(2):
+                    in_sketch = self._is_sketch_file(match.group(2))
+                in_directive = line.endswith("\\")
+                continue
+            if not in_sketch:
+                continue
+            pos = 0
+            while True:
+                match = (self.BLOCK_TOKEN_RE
+                         if depth else self.TOKEN_RE).search(line, pos)
+                if not match:
+                    break
+                pos = match.end()
+                token = match.group(0)
+                if token == "{":
+                    depth += 1
+                elif token == "}":
+                    depth = max(depth - 1, 0)
+                elif depth and token[0] == "&":
+                    yield index, match.start(), "&"
+                    token = match.group(1)
+                yield index, match.start(), token
+
+    def _parse_signature(self, tokens):
+        """Returns a name of function when `tokens` of a top-level statement
+        are a function signature"""
+        items = [token for _, _, token in tokens]
+        pos = 0
+        if items and items[0] == "template":
+            depth = 0
+            for pos, token in enumerate(items[1:], 2):
+                depth += {"<": 1, ">": -1}.get(token, 0)
+                if not depth:
+                    break
+        if "(" not in items[pos:]:
+            return None
+        name_pos = items.index("(", pos) - 1
+        # return type is required, a name can not be qualified
+        if name_pos <= pos or items[name_pos - 1] in ("::", ".", "->"):
+            return None
+        name = items[name_pos]
+        if not (name[0].isalpha() or name[0] == "_"):
+            return None
+        for token in items[pos:name_pos + 1]:
+            if token in self.NOT_PROTOTYPE_KEYWORDS or not (
+                    token[0].isalnum() or token[0] == "_"
+                    or token in ("*", "&", "::", "<", ">", ",")):
+                return None
+        depth = 0
+        end_pos = name_pos
+        for end_pos, token in enumerate(items[name_pos + 1:], name_pos + 1):
+            # skip functions with default arguments
+            if token == "=":
+                return None
+            depth += {"(": 1, ")": -1}.get(token, 0)
+            if not depth:
+                break
+        return name if depth == 0 and end_pos == len(items) - 1 else None
+
+    @staticmethod
+    def _get_statement_text(lines, tokens):
+        start_index, start_col, _ = tokens[0]
+        end_index, end_col, end_token = tokens[-1]
+        if start_index == end_index:
+            text = lines[start_index][start_col:end_col + len(end_token)]
+        else:
+            text = " ".join([lines[start_index][start_col:]] +
+                            lines[start_index + 1:end_index] +
+                            [lines[end_index][:end_col + len(end_token)]])
+        return " ".join(text.split())
+
+    def _add_prototype(self, prototypes, lines, statement, statement_index,
+                       declared):
+        name = statement and self._parse_signature(statement)
+        if name:
+            prototypes.append((self._get_statement_text(lines, statement),
+                               name, statement_index, declared))
+
+    def _parse_prototypes(self, lines):
+        """Scans top-level statements of sketch files and returns
+        a list of function prototypes (text, name, line index, is declared)
+        and a dictionary with a line index of the first top-level statement
+        which takes an address of a function"""
         prototypes = []
-        reserved_keywords = {"if", "else", "while"}
-        prototypes.extend(
-            match
-            for match in self.PROTOTYPE_RE.finditer(contents)
-            if not {match.group(2).strip(), match.group(3).strip()}
-            & reserved_keywords
-        )
-        return prototypes
-
-    def _get_total_lines(self, contents):
-        total = 0
-        if contents.endswith("\n"):
-            contents = contents[:-1]
-        for line in contents.split("\n")[::-1]:
-            linenum = self._parse_preproc_line_num(line)
-            if linenum is not None:
-                return total + linenum
-            total += 1
-        return total
+        references = {}
+        statement = []
+        depth = 0
+        # functions of `extern "C" {}` blocks must not get C++ prototypes
+        linkage_blocks = 0
+        statement_index = None
+        prev_token = None
+        for index, col, token in self._tokenize_sketch(lines):
+            if depth == 0 and not statement:
+                statement_index = index
+            if prev_token == "&" and token not in references:
+                references[token] = statement_index
+            prev_token = token
+            if token == "{":
+                if depth == 0 and [item[2] for item in statement
+                                   ] in (["extern", '"C"'], ["extern", '"C++"']):
+                    linkage_blocks += 1
+                    statement = []
+                    continue
+                if depth == 0:
+                    self._add_prototype(prototypes, lines, statement,
+                                        statement_index, linkage_blocks > 0)
+                depth += 1
+            elif token == "}":
+                if depth == 0:
+                    linkage_blocks = max(linkage_blocks - 1, 0)
+                depth = max(depth - 1, 0)
+                if depth == 0:
+                    statement = []
+            elif depth:
+                continue
+            elif token == ";":
+                self._add_prototype(prototypes, lines, statement,
+                                    statement_index, True)
+                statement = []
+            else:
+                statement.append((index, col, token))
+        return prototypes, references
+
+    def _get_line_location(self, lines, index):
+        """Returns a (line number, file) for a line with `index`"""
+        offset = 0
+        for line in reversed(lines[:index]):
+            if line.startswith("#"):
+                match = self.LINEMARKER_RE.match(line)
+                if match and match.group(2):
+                    return int(match.group(1)) + offset, match.group(2)
+            offset += 1
+        return offset + 1, self._main_ino.replace("\\", "/")
 
     def append_prototypes(self, contents):
-        prototypes = self._parse_prototypes(contents) or []
+        lines = contents.split("\n")
+        prototypes, references = self._parse_prototypes(lines)
 
         # skip already declared prototypes
-        declared = {m.group(1).strip() for m in prototypes if m.group(4) == ";"}
+        declared = {item[0] for item in prototypes if item[3]}
         prototypes = [
-            m for m in prototypes if m.group(1).strip() not in declared
+            item for item in prototypes
+            if not item[3] and item[0] not in declared
         ]
-
         if not prototypes:
             return contents
 
-        prototype_names = {m.group(3).strip() for m in prototypes}
-        split_pos = prototypes[0].start()
-        if match_ptrs := re.search(
-            self.PROTOPTRS_TPLRE % ("|".join(prototype_names)),
-            contents[:split_pos],
-            re.M,
-        ):
-            split_pos = contents.rfind("\n", 0, match_ptrs.start()) + 1
-
-        result = [contents[:split_pos].strip()]
-        result.append("%s;" % ";\n".join([m.group(1) for m in prototypes]))
-        result.append('#line %d "%s"' % (self._get_total_lines(
-            contents[:split_pos]), self._main_ino.replace("\\", "/")))
-        result.append(contents[split_pos:].strip())
+        split_index = prototypes[0][2]
+        for _, name, _, _ in prototypes:
+            if name in references:
+                split_index = min(split_index, references[name])
+
+        result = lines[:split_index]
+        result.extend("%s;" % item[0] for item in prototypes)
+        result.append('#line %d "%s"' %
+                      self._get_line_location(lines, split_index))
+        result.extend(lines[split_index:])
         return "\n".join(result)
 
 
@@ -195,16 +434,8 @@ def ConvertInoToCpp(env):
         return
     c = InoToCPPConverter(env)
     out_file = c.convert(ino_nodes)
-
-    atexit.register(_delete_file, out_file)
-
-
-def _delete_file(path):
-    try:
-        if isfile(path):
-            remove(path)
-    except:  # pylint: disable=bare-except
-        pass
+    if out_file:
+        env.Replace(PIOINO2CPP=out_file)
 
 
 @util.memoized()
@@ -311,10 +542,42 @@ def ProcessTest(env):
                                 get_core_package_dir("tool-unity"))
     env.Prepend(LIBS=[unitylib])
 
-    src_filter = ["+<*.cpp>", "+<*.c>"]
+    # a file generated by the previous versions
+    src_filter = ["+<*.cpp>", "+<*.c>", "-<output_export.cpp>"]
     if "PIOTEST_RUNNING_NAME" in env:
         src_filter.append(f"+<{env['PIOTEST_RUNNING_NAME']}{sep}>")
-    env.Replace(PIOTEST_SRC_FILTER=src_filter)
+    env.Replace(PIOTEST_SRC_FILTER=src_filter,
+                PIOTEST_OUTPUT_EXPORT=GenerateTestOutputExport(env))
+
+
+def GenerateTestOutputExport(env):
+    """Unity output functions for a test transport. The file is located in a
+    build dir of environment and is rewritten only when it changes, so all
+    test suites share the same object"""
+    transport = None
+    if env.get("PIOPLATFORM") == "native":
+        transport = "native"
+    elif env.get("PIOFRAMEWORK"):
+        transport = env['PIOFRAMEWORK'][0]
+    transport = env.GetProjectOption("test_transport", transport)
+    if transport not in TEST_TRANSPORT_OPTIONS:
+        sys.stderr.write("Error: Unknown Unit Test transport `%s`\n" %
+                         transport)
+        env.Exit(1)
+
+    contents = Template(
+        Template(TEST_OUTPUT_TPL).substitute(
+            TEST_TRANSPORT_OPTIONS[transport.lower()])).substitute(
+                baudrate=int(env.GetProjectOption("test_speed", 115200)))
+    output_dir = env.subst(join("$BUILD_DIR", "UnityTestOutput"))
+    output_file = join(output_dir, "output_export.cpp")
+    if isfile(output_file) and get_file_contents(output_file) == contents:
+        return output_file
+    if not isdir(output_dir):
+        makedirs(output_dir)
+    with open(output_file, "w") as fp:
+        fp.write(contents)
+    return output_file
 
 
 def GetExtraScripts(env, scope):
@@ -342,5 +605,6 @@ def generate(env):
     env.AddMethod(PioClean)
     env.AddMethod(ProcessDebug)
     env.AddMethod(ProcessTest)
+    env.AddMethod(GenerateTestOutputExport)
     env.AddMethod(GetExtraScripts)
     return env
@@ -0,0 +1,87 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import atexit
+from os.path import basename
+from time import time
+
+from platformio.profiler import Profiler
+
+
+def _describe_command(args):
+    """Returns (name, category) of a spawned build command"""
+    args = [str(arg).strip('"') for arg in args]
+    if "-c" in args and len(args) > 2:
+        return args[-1], "compile"
+    if "-o" in args and args.index("-o") + 1 < len(args):
+        return args[args.index("-o") + 1], "link"
+    return basename(args[0]) if args else "", "command"
+
+
+def ConfigureProfiler(env):
+    trace_path = env.get("PROFILE_TRACE")
+    if not trace_path:
+        return None
+    profiler = Profiler()
+    profiler.enable()
+
+    spawn = env['SPAWN']
+
+    def _spawn(sh, escape, cmd, args, spawnenv):
+        start = time()
+        try:
+            return spawn(sh, escape, cmd, args, spawnenv)
+        finally:
+            name, category = _describe_command(args)
+            profiler.add_event(name, start, time() - start, category,
+                               dict(env=env['PIOENV']))
+
+    env.Replace(SPAWN=_spawn)
+
+    def _on_exit(start):
+        profiler.add_event("Builder", start, time() - start)
+        profiler.save(trace_path)
+
+    atexit.register(_on_exit, time())
+    return profiler
+
+
+def ProfileTarget(env, target, name=None):
+    """Record the time of target's actions (aliases without commands)"""
+    if not env.get("PROFILE_TRACE"):
+        return
+    state = {}
+
+    def _start(target, source, env):  # pylint: disable=unused-argument
+        state['start'] = time()
+
+    def _stop(target, source, env):  # pylint: disable=unused-argument
+        if "start" in state:
+            Profiler().add_event(name or str(target[0]), state['start'],
+                                 time() - state['start'])
+
+    env.AddPreAction(target, env.Action(_start, None))
+    env.AddPostAction(target, env.Action(_stop, None))
+
+
+def exists(_):
+    return True
+
+
+def generate(env):
+    env.AddMethod(ConfigureProfiler)
+    env.AddMethod(ProfileTarget)
+    return env
@@ -15,18 +15,49 @@
 from __future__ import absolute_import
 
 from platformio.project.config import ProjectConfig, ProjectOptions
+from platformio.project.helpers import load_project_snapshot
 
 
 def GetProjectConfig(env):
     return ProjectConfig.get_instance(env['PROJECT_CONFIG'])
 
 
+def GetProjectSnapshot(env):
+    if not env.get("PROJECT_SNAPSHOT"):
+        return None
+    snapshot = load_project_snapshot(env['PROJECT_SNAPSHOT'])
+    if not snapshot or snapshot['env'] != env['PIOENV']:
+        return None
+    return snapshot
+
+
 def GetProjectOptions(env, as_dict=False):
-    return env.GetProjectConfig().items(env=env['PIOENV'], as_dict=as_dict)
+    snapshot = env.GetProjectSnapshot()
+    if not snapshot:
+        return env.GetProjectConfig().items(env=env['PIOENV'],
+                                            as_dict=as_dict)
+    if as_dict:
+        return dict(snapshot['options'])
+    return list(snapshot['options'].items())
 
 
 def GetProjectOption(env, option, default=None):
-    return env.GetProjectConfig().get("env:" + env['PIOENV'], option, default)
+    snapshot = env.GetProjectSnapshot()
+    if not snapshot:
+        return env.GetProjectConfig().get("env:" + env['PIOENV'], option,
+                                          default)
+    value = snapshot['options'].get(option)
+    if not ProjectOptions.get("env." + option):
+        return value or default
+    return default if value is None else value
+
+
+def GetProjectGlobalOption(env, option, default=None):
+    snapshot = env.GetProjectSnapshot()
+    if not snapshot:
+        return env.GetProjectConfig().get("platformio", option, default)
+    value = snapshot['platformio'].get(option)
+    return default if value is None else value
 
 
 def LoadProjectOptions(env):
@@ -44,7 +75,9 @@ def exists(_):
 
 def generate(env):
     env.AddMethod(GetProjectConfig)
+    env.AddMethod(GetProjectSnapshot)
     env.AddMethod(GetProjectOptions)
     env.AddMethod(GetProjectOption)
+    env.AddMethod(GetProjectGlobalOption)
     env.AddMethod(LoadProjectOptions)
     return env
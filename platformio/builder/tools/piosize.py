@@ -0,0 +1,385 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import json
+import mmap
+import os
+import struct
+from collections import namedtuple
+from contextlib import contextmanager
+from os.path import basename, isfile, join, relpath
+
+from platformio import __version__
+
+SIZEDATA_VERSION = 1
+
+SHT_NULL = 0
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_RELA = 4
+SHT_NOBITS = 8
+SHT_REL = 9
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xFF00
+SHN_XINDEX = 0xFFFF
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_FILE = 4
+
+ELFSection = namedtuple(
+    "ELFSection", ["name", "type", "flags", "address", "offset", "size"])
+ELFSymbol = namedtuple(
+    "ELFSymbol", ["name", "value", "size", "type", "bind", "section"])
+
+
+@contextmanager
+def mmap_file(path):
+    with open(path, "rb") as fp:
+        if not os.fstat(fp.fileno()).st_size:
+            raise ValueError("Empty file %s" % path)
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+class ELFFile(object):
+    """Reads sections and symbols of ELF file directly from a buffer
+    (`mmap`), the contents are never loaded into the memory as a whole"""
+
+    def __init__(self, data, base=0):
+        self.data = data
+        self.base = base
+        if data[base:base + 4] != b"\x7fELF":
+            raise ValueError("Not an ELF file")
+        self.is64 = data[base + 4:base + 5] == b"\x02"
+        self.endian = ">" if data[base + 5:base + 6] == b"\x02" else "<"
+        header = self._unpack(
+            "HHIQQQIHHHHHH" if self.is64 else "HHIIIIIHHHHHH", 16)
+        self.shoff, self.shentsize, self.shnum, self.shstrndx = (
+            header[5], header[10], header[11], header[12])
+        self._sections = None
+        self._links = None
+
+    def _unpack(self, fmt, offset):
+        return struct.unpack_from(self.endian + fmt, self.data,
+                                  self.base + offset)
+
+    def _read_string(self, offset):
+        offset += self.base
+        end = self.data.find(b"\x00", offset)
+        return self.data[offset:end if end >= 0 else len(self.data)].decode(
+            "utf-8", "replace")
+
+    @property
+    def sections(self):
+        if self._sections is not None:
+            return self._sections
+        fmt = "IIQQQQIIQQ" if self.is64 else "IIIIIIIIII"
+        headers = [
+            self._unpack(fmt, self.shoff + i * self.shentsize)
+            for i in range(self._get_sections_num())
+        ]
+        strndx = self.shstrndx
+        if strndx == SHN_XINDEX and headers:
+            strndx = headers[0][6]
+        stroffset = headers[strndx][4] if strndx < len(headers) else None
+        self._sections = [
+            ELFSection(
+                self._read_string(stroffset + h[0])
+                if stroffset is not None else "", h[1], h[2], h[3], h[4],
+                h[5]) for h in headers
+        ]
+        self._links = [h[6] for h in headers]
+        return self._sections
+
+    def _get_sections_num(self):
+        if not self.shoff:
+            return 0
+        if self.shnum:
+            return self.shnum
+        # the real number of sections is stored in the first header
+        return self._unpack("Q" if self.is64 else "I",
+                            self.shoff + (0x20 if self.is64 else 0x14))[0]
+
+    def iter_symbols(self):
+        sections = self.sections
+        fmt = "IBBHQQ" if self.is64 else "IIIBBH"
+        entsize = struct.calcsize(self.endian + fmt)
+        for index, section in enumerate(sections):
+            if section.type != SHT_SYMTAB:
+                continue
+            stroffset = sections[self._links[index]].offset
+            for offset in range(section.offset, section.offset + section.size,
+                                entsize):
+                if self.is64:
+                    name, info, _, shndx, value, size = self._unpack(
+                        fmt, offset)
+                else:
+                    name, value, size, info, _, shndx = self._unpack(
+                        fmt, offset)
+                yield ELFSymbol(
+                    self._read_string(stroffset + name), value, size,
+                    info & 0xF, info >> 4,
+                    shndx if SHN_UNDEF < shndx < SHN_LORESERVE else None)
+
+
+def iter_archive_members(data):
+    """Yields (name, offset) of members of an `ar` archive"""
+    if data[:8] != b"!<arch>\n":
+        return
+    longnames = b""
+    pos = 8
+    while pos + 60 <= len(data):
+        header = data[pos:pos + 60]
+        name = header[:16].decode("utf-8", "replace").strip()
+        size = int(header[48:58].strip() or 0)
+        offset = pos + 60
+        pos = offset + size + size % 2
+        if name in ("/", "/SYM64/", "__.SYMDEF", "__.SYMDEF SORTED"):
+            continue
+        if name == "//":
+            longnames = data[offset:offset + size]
+            continue
+        if name.startswith("#1/"):  # BSD
+            length = int(name[3:])
+            name = data[offset:offset + length].rstrip(b"\x00").decode(
+                "utf-8", "replace")
+            offset += length
+        elif name.startswith("/") and name[1:].isdigit():  # GNU
+            start = int(name[1:])
+            name = longnames[start:longnames.find(b"\n", start)].decode(
+                "utf-8", "replace")
+        yield name.rstrip("/"), offset
+
+
+def _get_object_symbols(paths):
+    """Maps global symbols to the object files where they are defined"""
+    result = {}
+
+    def _process(elf, label):
+        for symbol in elf.iter_symbols():
+            if (symbol.bind == STB_LOCAL or symbol.section is None
+                    or not symbol.name):
+                continue
+            if symbol.name not in result or symbol.bind == STB_GLOBAL:
+                result[symbol.name] = label
+
+    for path in paths:
+        if not isfile(path):
+            continue
+        try:
+            with mmap_file(path) as data:
+                if data[:4] == b"\x7fELF":
+                    _process(ELFFile(data), path)
+                    continue
+                for name, offset in iter_archive_members(data):
+                    if data[offset:offset + 4] == b"\x7fELF":
+                        _process(ELFFile(data, offset),
+                                 "%s(%s)" % (path, name))
+        except (ValueError, struct.error, EnvironmentError):
+            continue
+    return result
+
+
+def get_section_kind(section):
+    """Returns `text` (flash), `data` (flash and RAM), `bss` (RAM) or None
+    for sections which are not loaded, the same as Berkeley `size` does"""
+    if not section.flags & SHF_ALLOC:
+        return None
+    if section.type == SHT_NOBITS:
+        return "bss"
+    if section.flags & SHF_WRITE:
+        return "data"
+    return "text"
+
+
+def format_size_output(path, sysv=False):
+    """Emulates an output of GNU `size -d` tool in Berkeley (default) or
+    System V (`-A`) format"""
+    with mmap_file(path) as data:
+        sections = ELFFile(data).sections
+    if sysv:
+        lines = ["%s  :" % path, "%-20s %10s %10s" % ("section", "size", "addr")]
+        total = 0
+        for section in sections:
+            # the same sections as BFD library exposes
+            if section.type == SHT_NULL or not section.name or (
+                    section.type in (SHT_SYMTAB, SHT_STRTAB, SHT_REL,
+                                     SHT_RELA)
+                    and not section.flags & SHF_ALLOC):
+                continue
+            lines.append("%-20s %10d %10d" %
+                         (section.name, section.size, section.address))
+            total += section.size
+        lines.append("%-20s %10d" % ("Total", total))
+        return "\n".join(lines)
+    sizes = dict(text=0, data=0, bss=0)
+    for section in sections:
+        kind = get_section_kind(section)
+        if kind:
+            sizes[kind] += section.size
+    total = sum(sizes.values())
+    return "\n".join([
+        "%7s\t%7s\t%7s\t%7s\t%7s\tfilename" %
+        ("text", "data", "bss", "dec", "hex"),
+        "%7d\t%7d\t%7d\t%7d\t%7x\t%s" % (sizes['text'], sizes['data'],
+                                         sizes['bss'], total, total, path)
+    ])
+
+
+def emulate_size_tool(cmd, path):
+    """Returns an output of `$SIZETOOL` command (a list of arguments) without
+    running it or None when the command is not supported"""
+    if not cmd or cmd[0] not in ("$SIZETOOL", "${SIZETOOL}"):
+        return None
+    sysv = False
+    for arg in cmd[1:]:
+        if arg in ("-A", "--format=sysv", "--format=SysV"):
+            sysv = True
+        elif arg in ("-B", "--format=berkeley", "-d", "--radix=10",
+                     "$SOURCES", "$SOURCE"):
+            continue
+        else:
+            return None
+    try:
+        return format_size_output(path, sysv)
+    except (ValueError, struct.error, IndexError, EnvironmentError):
+        return None
+
+
+def get_size_data(path, object_paths=None):
+    """Sections, symbols and usage of flash/RAM per object file"""
+    with mmap_file(path) as data:
+        elf = ELFFile(data)
+        sections = elf.sections
+        symbols = list(elf.iter_symbols())
+    object_symbols = _get_object_symbols(object_paths or [])
+
+    result = dict(sections=[], symbols=[], objects=[])
+    sizes = dict(text=0, data=0, bss=0)
+    for section in sections:
+        kind = get_section_kind(section)
+        if not kind:
+            continue
+        sizes[kind] += section.size
+        result['sections'].append(
+            dict(name=section.name,
+                 type=kind,
+                 address=section.address,
+                 size=section.size))
+    result['flash'] = sizes['text'] + sizes['data']
+    result['ram'] = sizes['data'] + sizes['bss']
+
+    objects = {}
+    filename = None
+    known = set()
+    for symbol in symbols:
+        if symbol.type == STT_FILE:
+            filename = symbol.name
+            continue
+        if (symbol.type not in (STT_FUNC, STT_OBJECT) or not symbol.size
+                or symbol.section is None):
+            continue
+        section = sections[symbol.section]
+        kind = get_section_kind(section)
+        # aliases share the same memory
+        key = (symbol.section, symbol.value)
+        if not kind or key in known:
+            continue
+        known.add(key)
+        if symbol.bind == STB_LOCAL:
+            obj = filename
+        else:
+            obj = object_symbols.get(symbol.name)
+        result['symbols'].append(
+            dict(name=symbol.name,
+                 type="function" if symbol.type == STT_FUNC else "object",
+                 section=section.name,
+                 size=symbol.size,
+                 object=obj))
+        item = objects.setdefault(obj, dict(path=obj, flash=0, ram=0))
+        if kind in ("text", "data"):
+            item['flash'] += symbol.size
+        if kind in ("data", "bss"):
+            item['ram'] += symbol.size
+
+    result['symbols'].sort(key=lambda item: (-item['size'], item['name']))
+    result['objects'] = sorted(
+        objects.values(),
+        key=lambda item: (-item['flash'] - item['ram'], item['path'] or ""))
+    return result
+
+
+def _get_program_objects(env):
+    result = []
+    for node in env.Flatten([env.get("PIOBUILDFILES", []),
+                             env.get("LIBS", [])]):
+        if isinstance(node, str):
+            continue
+        path = node.get_abspath()
+        if path.endswith((".o", ".a")):
+            result.append(path)
+    return result
+
+
+def DumpSizeData(_, target, source, env):  # pylint: disable=unused-argument
+    program = source[0].get_abspath()
+    try:
+        data = get_size_data(program, _get_program_objects(env))
+    except (ValueError, struct.error, IndexError) as e:
+        env.Exit("Error: Could not parse %s, %s" % (program, e))
+    # stable paths to compare data between machines
+    project_dir = env.subst("$PROJECT_DIR")
+    for item in data['symbols'] + data['objects']:
+        key = "object" if "object" in item else "path"
+        if project_dir and item[key] and item[key].startswith(project_dir):
+            item[key] = relpath(item[key], project_dir)
+
+    program_size, data_size, _ = env.CalculateProgramSize(source)
+    if program_size > -1:
+        data['flash'] = program_size
+    if data_size > -1:
+        data['ram'] = data_size
+    data.update(
+        version=SIZEDATA_VERSION,
+        pioversion=__version__,
+        env=env['PIOENV'],
+        program=basename(program),
+        maximum_flash=int(env.BoardConfig().get("upload.maximum_size", 0))
+        if "BOARD" in env else 0,
+        maximum_ram=int(env.BoardConfig().get("upload.maximum_ram_size", 0))
+        if "BOARD" in env else 0)
+
+    path = join(env.subst("$BUILD_DIR"), "sizedata.json")
+    with open(path, "w") as fp:
+        json.dump(data, fp, indent=2, sort_keys=True)
+    print("Flash: %d bytes, RAM: %d bytes" % (data['flash'], data['ram']))
+    print("Memory usage data has been saved to %s" % path)
+
+
+def exists(_):
+    return True
+
+
+def generate(env):
+    env.AddMethod(DumpSizeData)
+    return env
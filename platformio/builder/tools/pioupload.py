@@ -26,6 +26,7 @@ from SCons.Script import ARGUMENTS  # pylint: disable=import-error
 from serial import Serial, SerialException
 
 from platformio import exception, fs, util
+from platformio.builder.tools.piosize import emulate_size_tool
 from platformio.compat import WINDOWS
 from platformio.proc import exec_command
 
@@ -182,17 +183,11 @@ def UploadToDisk(_, target, source, env):
           "(Some boards may require manual hard reset)")
 
 
-def CheckUploadSize(_, target, source, env):
-    check_conditions = [
-        env.get("BOARD"),
-        env.get("SIZETOOL") or env.get("SIZECHECKCMD")
-    ]
-    if not all(check_conditions):
-        return
-    program_max_size = int(env.BoardConfig().get("upload.maximum_size", 0))
-    data_max_size = int(env.BoardConfig().get("upload.maximum_ram_size", 0))
-    if program_max_size == 0:
-        return
+def CalculateProgramSize(env, source):
+    """Returns (program size, data size, size tool output), a size is -1
+    when it can not be calculated"""
+    if not env.get("SIZETOOL") and not env.get("SIZECHECKCMD"):
+        return -1, -1, None
 
     def _configure_defaults():
         env.Replace(SIZECHECKCMD="$SIZETOOL -B -d $SOURCES",
@@ -205,6 +200,11 @@ def CheckUploadSize(_, target, source, env):
             return None
         if not isinstance(cmd, list):
             cmd = cmd.split()
+        # read ELF sections in-process instead of running the `size` tool
+        output = emulate_size_tool([arg for arg in cmd if arg],
+                                   str(source[0]))
+        if output is not None:
+            return output
         cmd = [arg.replace("$SOURCES", str(source[0])) for arg in cmd if arg]
         sysenv = environ.copy()
         sysenv['PATH'] = str(env['ENV']['PATH'])
@@ -226,6 +226,25 @@ def CheckUploadSize(_, target, source, env):
             size += sum(int(value) for value in match.groups())
         return size
 
+    if not env.get("SIZECHECKCMD") and not env.get("SIZEPROGREGEXP"):
+        _configure_defaults()
+    output = _get_size_output()
+    return (_calculate_size(output, env.get("SIZEPROGREGEXP")),
+            _calculate_size(output, env.get("SIZEDATAREGEXP")), output)
+
+
+def CheckUploadSize(_, target, source, env):
+    check_conditions = [
+        env.get("BOARD"),
+        env.get("SIZETOOL") or env.get("SIZECHECKCMD")
+    ]
+    if not all(check_conditions):
+        return
+    program_max_size = int(env.BoardConfig().get("upload.maximum_size", 0))
+    data_max_size = int(env.BoardConfig().get("upload.maximum_ram_size", 0))
+    if program_max_size == 0:
+        return
+
     def _format_availale_bytes(value, total):
         percent_raw = float(value) / float(total)
         blocks_per_progress = 10
@@ -234,11 +253,7 @@ def CheckUploadSize(_, target, source, env):
         return "[{:{}}] {: 6.1%} (used {:d} bytes from {:d} bytes)".format(
             "=" * used_blocks, blocks_per_progress, percent_raw, value, total)
 
-    if not env.get("SIZECHECKCMD") and not env.get("SIZEPROGREGEXP"):
-        _configure_defaults()
-    output = _get_size_output()
-    program_size = _calculate_size(output, env.get("SIZEPROGREGEXP"))
-    data_size = _calculate_size(output, env.get("SIZEDATAREGEXP"))
+    program_size, data_size, output = env.CalculateProgramSize(source)
 
     print("Memory Usage -> http://bit.ly/pio-memory-usage")
     if data_max_size and data_size > -1:
@@ -283,6 +298,7 @@ def generate(env):
     env.AddMethod(WaitForNewSerialPort)
     env.AddMethod(AutodetectUploadPort)
     env.AddMethod(UploadToDisk)
+    env.AddMethod(CalculateProgramSize)
     env.AddMethod(CheckUploadSize)
     env.AddMethod(PrintUploadInfo)
     return env
@@ -15,24 +15,42 @@
 from __future__ import absolute_import
 
 import os
+import re
 import sys
-from os.path import basename, dirname, isdir, join, realpath
+from hashlib import md5
+from os.path import basename, dirname, isdir, isfile, join, realpath
 
 from SCons import Builder, Util  # pylint: disable=import-error
 from SCons.Script import COMMAND_LINE_TARGETS  # pylint: disable=import-error
 from SCons.Script import AlwaysBuild  # pylint: disable=import-error
 from SCons.Script import DefaultEnvironment  # pylint: disable=import-error
 from SCons.Script import Export  # pylint: disable=import-error
+from SCons.Script import GetOption  # pylint: disable=import-error
 from SCons.Script import SConscript  # pylint: disable=import-error
 
 from platformio import fs
-from platformio.compat import string_types
+from platformio.compat import (get_file_contents, hashlib_encode_data,
+                               string_types)
+from platformio.profiler import Profiler
 from platformio.util import pioversion_to_intstr
 
 SRC_HEADER_EXT = ["h", "hpp"]
 SRC_C_EXT = ["c", "cc", "cpp"]
 SRC_BUILD_EXT = SRC_C_EXT + ["S", "spp", "SPP", "sx", "s", "asm", "ASM"]
 SRC_FILTER_DEFAULT = ["+<*>", f"-<.git{os.sep}>", f"-<.svn{os.sep}>"]
+PCH_SRC_SUFFIXES = (".cpp", ".cc", ".cxx")
+PCHCOM = "$CXX -o $TARGET -x c++-header -c $CXXFLAGS $CCFLAGS $_CCCOMCOM $SOURCES"
+
+UNITY_SRC_SUFFIXES = {".c": ".c", ".cpp": ".cpp", ".cc": ".cpp", ".cxx": ".cpp"}
+# file scope names which can clash when sources are merged
+UNITY_SYMBOL_RE = re.compile(
+    r"^(?:static\s+(?:[\w:<>,\*&]+\s+)*?\**(\w+)\s*[\(\[=;]"
+    r"|#\s*define\s+(\w+))", re.M)
+UNITY_UNSAFE_RE = re.compile(r"^\s*(?:namespace\s*\{|using\s+namespace\s)",
+                             re.M)
+
+# precompiled header nodes per a set of compiler flags
+_PCH_NODES = {}
 
 
 def scons_patched_match_splitext(path, suffixes=None):
@@ -44,7 +62,8 @@ def scons_patched_match_splitext(path, suffixes=None):
 
 
 def _build_project_deps(env):
-    project_lib_builder = env.ConfigureProjectLibBuilder()
+    with Profiler().phase("ConfigureProjectLibBuilder"):
+        project_lib_builder = env.ConfigureProjectLibBuilder()
 
     # prepend project libs to the beginning of list
     env.Prepend(LIBS=project_lib_builder.build())
@@ -62,14 +81,24 @@ def _build_project_deps(env):
     projenv.PrependUnique(CPPPATH=project_lib_builder.env.get("CPPPATH"))
     # extra build flags from `platformio.ini`
     projenv.ProcessFlags(env.get("SRC_BUILD_FLAGS"))
+    projenv.ProcessPrecompiledHeader()
 
     is_test = "__test" in COMMAND_LINE_TARGETS
     if is_test:
         projenv.BuildSources("$BUILDTEST_DIR", "$PROJECTTEST_DIR",
                              "$PIOTEST_SRC_FILTER")
+        # a custom transport includes "unittest_transport.h" from a test dir
+        outputenv = projenv.Clone()
+        outputenv.Prepend(CPPPATH=["$PROJECTTEST_DIR"])
+        DefaultEnvironment().Append(PIOBUILDFILES=_build_objects(
+            outputenv, [outputenv.File(env['PIOTEST_OUTPUT_EXPORT'])]))
     if not is_test or env.GetProjectOption("test_build_project_src", False):
         projenv.BuildSources("$BUILDSRC_DIR", "$PROJECTSRC_DIR",
                              env.get("SRC_FILTER"))
+        # sketch converted from "*.ino" files is located in a build dir
+        if env.get("PIOINO2CPP"):
+            DefaultEnvironment().Append(PIOBUILDFILES=_build_objects(
+                projenv, [projenv.File(env['PIOINO2CPP'])]))
 
     if not env.get("PIOBUILDFILES") and not COMMAND_LINE_TARGETS:
         sys.stderr.write(
@@ -107,7 +136,8 @@ def BuildProgram(env):
     env.ProcessFlags(env.get("BUILD_FLAGS"))
 
     # process framework scripts
-    env.BuildFrameworks(env.get("PIOFRAMEWORK"))
+    with Profiler().phase("BuildFrameworks"):
+        env.BuildFrameworks(env.get("PIOFRAMEWORK"))
 
     # restore PIO macros if it was deleted by framework
     _append_pio_macros()
@@ -118,6 +148,11 @@ def BuildProgram(env):
     if "__test" in COMMAND_LINE_TARGETS:
         env.ProcessTest()
 
+    if env.get("BUILD_PCH") and env.GetCompilerType() != "gcc":
+        sys.stderr.write("Warning! Precompiled headers are supported only "
+                         "by GCC compiler, `build_pch` option is ignored\n")
+        env.Replace(BUILD_PCH=None)
+
     # build project with dependencies
     _build_project_deps(env)
 
@@ -206,25 +241,52 @@ def ProcessUnFlags(env, flags):
         return
     parsed = env.ParseFlagsExtended(flags)
 
-    # get all flags and copy them to each "*FLAGS" variable
+    # get all flags and apply them to each "*FLAGS" variable
     all_flags = []
     for key, unflags in parsed.items():
         if key.endswith("FLAGS"):
             all_flags.extend(unflags)
+
     for key, unflags in parsed.items():
         if key.endswith("FLAGS"):
-            parsed[key].extend(all_flags)
+            unflags = unflags + all_flags
+        current = env.get(key)
+        if not unflags or not current or not Util.is_List(current):
+            continue
+        matcher = _UnFlagsMatcher(unflags)
+        current[:] = [item for item in current if not matcher.match(item)]
 
-    for key, unflags in parsed.items():
+
+class _UnFlagsMatcher(object):
+    """Index of flags to remove, an item is matched in constant time"""
+
+    def __init__(self, unflags):
+        self.exact = set()
+        self.unhashable = []
+        self.heads = set()
         for unflag in unflags:
-            for current in env.get(key, []):
-                conditions = [
-                    unflag == current,
-                    isinstance(current, (tuple, list))
-                    and unflag[0] == current[0]
-                ]
-                if any(conditions):
-                    env[key].remove(current)
+            try:
+                self.exact.add(unflag)
+            except TypeError:
+                self.unhashable.append(unflag)
+            try:
+                self.heads.add(unflag[0])
+            except (TypeError, IndexError, KeyError):
+                pass
+
+    def match(self, item):
+        try:
+            if item in self.exact:
+                return True
+        except TypeError:
+            if item in self.unhashable:
+                return True
+        if not isinstance(item, (tuple, list)) or not item:
+            return False
+        try:
+            return item[0] in self.heads
+        except TypeError:
+            return False
 
 
 def MatchSourceFiles(env, src_dir, src_filter=None):
@@ -240,7 +302,8 @@ def CollectBuildFiles(env,
                       src_filter=None,
                       duplicate=False):
     sources = []
-    variants = []
+    variants = {}
+    build_exts = tuple(f".{ext}" for ext in SRC_BUILD_EXT)
 
     src_dir = env.subst(src_dir)
     if src_dir.endswith(os.sep):
@@ -248,14 +311,14 @@ def CollectBuildFiles(env,
 
     for item in env.MatchSourceFiles(src_dir, src_filter):
         _reldir = dirname(item)
-        _src_dir = join(src_dir, _reldir) if _reldir else src_dir
-        _var_dir = join(variant_dir, _reldir) if _reldir else variant_dir
-
-        if _var_dir not in variants:
-            variants.append(_var_dir)
+        _var_dir = variants.get(_reldir)
+        if _var_dir is None:
+            _src_dir = join(src_dir, _reldir) if _reldir else src_dir
+            _var_dir = join(variant_dir, _reldir) if _reldir else variant_dir
+            variants[_reldir] = _var_dir
             env.VariantDir(_var_dir, _src_dir, duplicate)
 
-        if fs.path_endswith_ext(item, SRC_BUILD_EXT):
+        if item.endswith(build_exts):
             sources.append(env.File(join(_var_dir, basename(item))))
 
     return sources
@@ -294,17 +357,125 @@ def BuildFrameworks(env, frameworks):
             env.Exit(1)
 
 
+def ProcessPrecompiledHeader(env):
+    """Precompile `build_pch` header once per a set of compiler flags and
+    force including of it into C++ sources of this environment"""
+    header = env.get("BUILD_PCH")
+    if not header or env.get("PIOPCH"):
+        return env.get("PIOPCH")
+
+    # headers included by a precompiled header depend on include paths
+    flags = env.subst("$CXXFLAGS $CCFLAGS $_CPPDEFFLAGS $_CPPINCFLAGS")
+    key = md5(hashlib_encode_data(header + flags)).hexdigest()[:8]
+    if key not in _PCH_NODES:
+        include = "<%s>" % header
+        for path in (join(env.subst("$PROJECT_DIR"), header),
+                     join(env.subst("$PROJECTINCLUDE_DIR"), header)):
+            if isfile(path):
+                include = '"%s"' % realpath(path).replace("\\", "/")
+                break
+        # GCC looks for "<stub>.gch" first and falls back to the stub
+        # itself when the precompiled header is not valid for a source
+        stub = join(env.subst("$BUILD_DIR"), "pch", key, basename(header))
+        contents = "#include %s\n" % include
+        if not isfile(stub) or get_file_contents(stub) != contents:
+            if not isdir(dirname(stub)):
+                os.makedirs(dirname(stub))
+            with open(stub, "w") as fp:
+                fp.write(contents)
+        _PCH_NODES[key] = (stub,
+                           env.Clone().Command(
+                               stub + ".gch", stub,
+                               env.VerboseAction(PCHCOM,
+                                                 "Precompiling $SOURCE")))
+
+    stub, node = _PCH_NODES[key]
+    env.Append(CXXFLAGS=[("-include", stub)])
+    env.Replace(PIOPCH=node)
+    return node
+
+
+def _build_objects(env, nodes):
+    objects = []
+    for node in nodes:
+        obj = env.Object(node)
+        if env.get("PIOPCH") and node.get_suffix() in PCH_SRC_SUFFIXES:
+            env.Depends(obj, env['PIOPCH'])
+        objects.append(obj)
+    # see `DumpCompilationDatabase`
+    DefaultEnvironment().Append(PIOCOMPILEDB=objects)
+    return objects
+
+
+def GroupUnityBuildFiles(env, variant_dir, nodes):
+    """Merge C and C++ sources into a few "unity" translation units, one per
+    a build job. Sources which declare clashing file scope names (static
+    symbols, macros, anonymous namespaces) are compiled separately."""
+    result = []
+    candidates = []
+    names_counter = {}
+    for node in nodes:
+        if node.get_suffix() not in UNITY_SRC_SUFFIXES:
+            result.append(node)
+            continue
+        contents = get_file_contents(node.srcnode().get_abspath())
+        if UNITY_UNSAFE_RE.search(contents):
+            result.append(node)
+            continue
+        names = set(a or b for a, b in UNITY_SYMBOL_RE.findall(contents))
+        for name in names:
+            names_counter[name] = names_counter.get(name, 0) + 1
+        candidates.append((node, names))
+
+    groups = {}
+    for node, names in candidates:
+        if any(names_counter[name] > 1 for name in names):
+            result.append(node)
+        else:
+            groups.setdefault(UNITY_SRC_SUFFIXES[node.get_suffix()],
+                              []).append(node)
+
+    variant_dir = env.subst(variant_dir)
+    unity_dir = join(
+        env.subst("$BUILD_DIR"), "unity", "%s-%s" %
+        (basename(variant_dir),
+         md5(hashlib_encode_data(variant_dir)).hexdigest()[:8]))
+    jobs = max(1, int(GetOption("num_jobs") or 1))
+    for suffix, items in sorted(groups.items()):
+        if len(items) < 2:
+            result.extend(items)
+            continue
+        count = min(jobs, (len(items) + 1) // 2)
+        size = (len(items) + count - 1) // count
+        for i in range(0, len(items), size):
+            path = join(unity_dir, "unity_%d%s" % (i // size, suffix))
+            contents = "".join(
+                '#include "%s"\n' %
+                node.srcnode().get_abspath().replace("\\", "/")
+                for node in items[i:i + size])
+            if not isfile(path) or get_file_contents(path) != contents:
+                if not isdir(unity_dir):
+                    os.makedirs(unity_dir)
+                with open(path, "w") as fp:
+                    fp.write(contents)
+            result.append(env.File(path))
+    return result
+
+
 def BuildLibrary(env, variant_dir, src_dir, src_filter=None):
     env.ProcessUnFlags(env.get("BUILD_UNFLAGS"))
-    return env.StaticLibrary(
-        env.subst(variant_dir),
-        env.CollectBuildFiles(variant_dir, src_dir, src_filter))
+    nodes = env.CollectBuildFiles(variant_dir, src_dir, src_filter)
+    if env.get("PIOUNITYBUILD"):
+        nodes = env.GroupUnityBuildFiles(variant_dir, nodes)
+    return env.StaticLibrary(env.subst(variant_dir),
+                             _build_objects(env, nodes))
 
 
 def BuildSources(env, variant_dir, src_dir, src_filter=None):
     nodes = env.CollectBuildFiles(variant_dir, src_dir, src_filter)
-    DefaultEnvironment().Append(
-        PIOBUILDFILES=[env.Object(node) for node in nodes])
+    if env.get("PIOUNITYBUILD"):
+        nodes = env.GroupUnityBuildFiles(variant_dir, nodes)
+    DefaultEnvironment().Append(PIOBUILDFILES=_build_objects(env, nodes))
 
 
 def exists(_):
@@ -319,6 +490,8 @@ def generate(env):
     env.AddMethod(MatchSourceFiles)
     env.AddMethod(CollectBuildFiles)
     env.AddMethod(BuildFrameworks)
+    env.AddMethod(ProcessPrecompiledHeader)
+    env.AddMethod(GroupUnityBuildFiles)
     env.AddMethod(BuildLibrary)
     env.AddMethod(BuildSources)
     return env
@@ -21,6 +21,7 @@ import click
 class PlatformioCLI(click.MultiCommand):
 
     leftover_args = []
+    _commands = None
 
     @staticmethod
     def in_silence():
@@ -37,6 +38,8 @@ class PlatformioCLI(click.MultiCommand):
         return super(PlatformioCLI, self).invoke(ctx)
 
     def list_commands(self, ctx):
+        if PlatformioCLI._commands is not None:
+            return PlatformioCLI._commands
         cmds = []
         cmds_dir = dirname(__file__)
         for name in os.listdir(cmds_dir):
@@ -47,6 +50,7 @@ class PlatformioCLI(click.MultiCommand):
             elif name.endswith(".py"):
                 cmds.append(name[:-3])
         cmds.sort()
+        PlatformioCLI._commands = cmds
         return cmds
 
     def get_command(self, ctx, cmd_name):
@@ -109,5 +109,6 @@ def cli(port, host, no_open):
 
     click.echo("PIO Home has been started. Press Ctrl+C to shutdown.")
 
+    reactor.addSystemEventTrigger("before", "shutdown", PIOCoreRPC.shutdown)
     reactor.listenTCP(port, site, interface=host)
     reactor.run()
@@ -21,29 +21,40 @@ import requests
 from twisted.internet import defer  # pylint: disable=import-error
 from twisted.internet import reactor  # pylint: disable=import-error
 from twisted.internet import threads  # pylint: disable=import-error
+from twisted.python import threadpool  # pylint: disable=import-error
 
 from platformio import util
 from platformio.proc import where_is_program
 
 
 class AsyncSession(requests.Session):
+    """HTTP session with a pool of `n` connections, requests are processed
+    by own thread pool and return Deferred"""
 
     def __init__(self, n=None, *args, **kwargs):
-        if n:
-            pool = reactor.getThreadPool()
-            pool.adjustPoolsize(0, n)
-
         super(AsyncSession, self).__init__(*args, **kwargs)
+        n = n or 5
+        adapter = requests.adapters.HTTPAdapter(pool_connections=n,
+                                                pool_maxsize=n)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self._threadpool = threadpool.ThreadPool(minthreads=0,
+                                                 maxthreads=n,
+                                                 name="piohome-http")
+        reactor.callWhenRunning(self._threadpool.start)
+        reactor.addSystemEventTrigger("during", "shutdown",
+                                      self._threadpool.stop)
 
     def request(self, *args, **kwargs):
         func = super(AsyncSession, self).request
-        return threads.deferToThread(func, *args, **kwargs)
+        return threads.deferToThreadPool(reactor, self._threadpool, func,
+                                         *args, **kwargs)
 
     def wrap(self, *args, **kwargs):  # pylint: disable=no-self-use
         return defer.ensureDeferred(*args, **kwargs)
 
 
-@util.memoized(expire="60s")
+@util.memoized()
 def requests_session():
     return AsyncSession(n=5)
 
@@ -0,0 +1,164 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os.path import basename, expanduser, getmtime, isdir, join, realpath, sep
+
+from platformio import exception
+from platformio.managers.platform import PlatformManager
+from platformio.project.config import ProjectConfig
+from platformio.project.helpers import (ProjectLayout,
+                                        get_project_platforms_dir,
+                                        is_platformio_project)
+
+
+def _get_mtime(path):
+    try:
+        return getmtime(path)
+    except OSError:
+        return None
+
+
+def _path_to_name(path):
+    return (sep).join(path.split(sep)[-2:])
+
+
+class ProjectIndexer(object):
+    """Summaries of projects for PIO Home.
+
+    A summary is valid while modification times of a project directory,
+    its `platformio.ini`, a "libdeps" directory and installed platforms
+    are not changed. Outdated summaries are refreshed in a thread pool,
+    a project is never processed by two threads at once."""
+
+    def __init__(self, max_workers=4):
+        self._items = {}  # project_dir: (stamps, summary)
+        self._pending = {}  # project_dir: Future
+        self._board_names = {}
+        self._platforms_mtime = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def is_indexed(self, project_dir):
+        return project_dir in self._items
+
+    def is_outdated(self, project_dir):
+        item = self._items.get(project_dir)
+        return not item or any(
+            _get_mtime(path) != mtime for path, mtime in item[0])
+
+    def get_summaries(self, project_dirs):
+        """Indexed summaries in the order of `project_dirs`, not valid
+        projects are skipped"""
+        result = []
+        for project_dir in project_dirs:
+            item = self._items.get(project_dir)
+            if item and item[1]:
+                result.append(item[1])
+        return result
+
+    def refresh(self, project_dir):
+        """Returns a Future with `(summary, changed)`, summary is None for
+        a not valid project"""
+        with self._lock:
+            if project_dir not in self._pending:
+                self._pending[project_dir] = self._executor.submit(
+                    self._refresh, project_dir)
+            return self._pending[project_dir]
+
+    def _refresh(self, project_dir):
+        try:
+            stamps = self._get_stamps(project_dir)
+            try:
+                summary = self.get_summary(project_dir)
+            except (exception.PlatformIOProjectException, OSError):
+                summary = None
+            item = self._items.get(project_dir)
+            self._items[project_dir] = (stamps, summary)
+            return summary, not item or item[1] != summary
+        finally:
+            with self._lock:
+                del self._pending[project_dir]
+
+    def _get_stamps(self, project_dir):
+        platforms_mtime = _get_mtime(get_project_platforms_dir())
+        if platforms_mtime != self._platforms_mtime:
+            self._platforms_mtime = platforms_mtime
+            self._board_names = {}
+        paths = [
+            project_dir,
+            join(project_dir, "platformio.ini"),
+            get_project_platforms_dir()
+        ]
+        try:
+            paths.append(
+                ProjectLayout.get_instance(project_dir).get_dir("libdeps_dir"))
+        except exception.PlatformIOProjectException:
+            pass
+        return [(path, _get_mtime(path)) for path in paths]
+
+    def get_board_name(self, board_id):
+        if board_id not in self._board_names:
+            name = board_id
+            try:
+                name = PlatformManager().board_config(board_id)['name']
+            except exception.PlatformioException:
+                pass
+            self._board_names[board_id] = name
+        return self._board_names[board_id]
+
+    def get_summary(self, project_dir):
+        if not is_platformio_project(project_dir):
+            raise exception.NotPlatformIOProject(project_dir)
+        config = ProjectConfig(join(project_dir, "platformio.ini"))
+        libdeps_dir = ProjectLayout.get_instance(project_dir).get_dir(
+            "libdeps_dir")
+        boards = []
+        env_libdeps_dirs = []
+        lib_extra_dirs = list(config.get("platformio", "lib_extra_dirs", []))
+        for section in config.sections():
+            if not section.startswith("env:"):
+                continue
+            env_libdeps_dirs.append(join(libdeps_dir, section[4:]))
+            if config.has_option(section, "board"):
+                board_id = config.get(section, "board")
+                boards.append({
+                    "id": board_id,
+                    "name": self.get_board_name(board_id)
+                })
+            lib_extra_dirs.extend(config.get(section, "lib_extra_dirs", []))
+
+        def _resolve_dirs(dirs):
+            # skip non existing folders and resolve full path
+            dirs = [
+                expanduser(d) if d.startswith("~") else realpath(
+                    join(project_dir, d)) for d in dirs
+            ]
+            return [d for d in dirs if isdir(d)]
+
+        return {
+            "path": project_dir,
+            "name": _path_to_name(project_dir),
+            "modified": int(getmtime(project_dir)),
+            "boards": boards,
+            "envLibStorages": [{
+                "name": basename(d),
+                "path": d
+            } for d in _resolve_dirs(env_libdeps_dirs)],
+            "extraLibStorages": [{
+                "name": _path_to_name(d),
+                "path": d
+            } for d in _resolve_dirs(lib_extra_dirs)]
+        }
@@ -0,0 +1,237 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import OrderedDict
+from os import listdir
+from os.path import expanduser, getmtime, isdir, join
+from time import time
+
+from platformio import exception
+from platformio.project.helpers import (ProjectLayout,
+                                        get_project_global_lib_dir,
+                                        get_project_packages_dir,
+                                        get_project_platforms_dir,
+                                        is_platformio_project)
+
+# `core.call` commands which do not modify anything
+READONLY_CORE_COMMANDS = ("boards", "platform frameworks", "platform list",
+                          "platform search", "platform show", "lib builtin",
+                          "lib list", "lib search", "lib show", "lib stats")
+
+
+def _get_command(params):
+    words = [a for a in params.get("args") or [] if not a.startswith("-")]
+    return " ".join(words[:2])
+
+
+def _get_packages_paths():
+    return [
+        get_project_platforms_dir(),
+        get_project_packages_dir(),
+        get_project_global_lib_dir()
+    ]
+
+
+def _get_core_call_paths(params, _):
+    cwd = (params.get("options") or {}).get("cwd")
+    paths = _get_packages_paths()
+    # a storage of `lib list -d <dir>` or a project directory
+    paths.extend(a for a in params['args'] if isdir(a))
+    if cwd:
+        paths.append(join(cwd, "platformio.ini"))
+        paths.extend(_get_project_libdeps_dirs(cwd))
+    return paths
+
+
+def _get_project_libdeps_dirs(project_dir):
+    """Storages of a project, libraries could be installed there from
+    a terminal"""
+    if not is_platformio_project(project_dir):
+        return []
+    try:
+        libdeps_dir = ProjectLayout.get_instance(project_dir).get_dir(
+            "libdeps_dir")
+    except exception.PlatformIOProjectException:
+        return []
+    if not isdir(libdeps_dir):
+        return [libdeps_dir]
+    return [libdeps_dir] + [
+        join(libdeps_dir, name) for name in sorted(listdir(libdeps_dir))
+    ]
+
+
+class CachePolicy(object):
+    """A result is valid for `ttl` seconds while modification times of
+    `get_paths(params, result)` are not changed. When `packages` is set, a
+    result is reset by package manager events too."""
+
+    def __init__(self, ttl, get_paths=None, packages=False, when=None):
+        self.ttl = ttl
+        self.get_paths = get_paths
+        self.packages = packages
+        self.when = when
+
+    def matches(self, params):
+        return not self.when or self.when(params)
+
+
+CACHE_POLICIES = {
+    "core.call":
+    CachePolicy(300,
+                _get_core_call_paths,
+                packages=True,
+                when=lambda params: _get_command(params).startswith(
+                    READONLY_CORE_COMMANDS)),
+    "project.get_project_examples":
+    CachePolicy(3600, lambda *_: _get_packages_paths(), packages=True),
+    "os.list_dir":
+    CachePolicy(60, lambda params, _: [expanduser(params['path'])]),
+}
+
+
+def is_packages_event(method, params):
+    """A call which installs, uninstalls or updates packages"""
+    if method != "core.call":
+        return False
+    command = _get_command(params)
+    return command.startswith(("update", "upgrade")) or (
+        command.split(" ")[0] in ("platform", "lib")
+        and command.endswith(("install", "uninstall", "update")))
+
+
+def _get_mtime(path):
+    try:
+        return getmtime(path)
+    except OSError:
+        return None
+
+
+class RPCResultCache(object):
+
+    MAX_ITEMS = 256
+
+    def __init__(self, policies=None):
+        self.policies = CACHE_POLICIES if policies is None else policies
+        self._items = {}
+        self._packages_generation = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_key(self, method, params):
+        """Returns None for a call which should not be cached"""
+        policy = self.policies.get(method)
+        if not policy or not policy.matches(params):
+            return None
+        options = params.get("options")
+        if isinstance(options, dict) and "stream_id" in options:
+            params = dict(params,
+                          options={
+                              k: v
+                              for k, v in options.items() if k != "stream_id"
+                          })
+        return method + json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, key):
+        """Returns `(True, result)` for a valid cached result"""
+        item = self._items.get(key)
+        if not item:
+            return False, None
+        result, expire, stamps, generation = item
+        if (expire < time() or generation not in (
+                None, self._packages_generation) or any(
+                    _get_mtime(path) != mtime for path, mtime in stamps)):
+            del self._items[key]
+            return False, None
+        return True, result
+
+    def set(self, key, method, params, result):
+        policy = self.policies[method]
+        if key not in self._items and len(self._items) >= self.MAX_ITEMS:
+            del self._items[next(iter(self._items))]  # the oldest one
+        paths = policy.get_paths(params, result) if policy.get_paths else []
+        self._items[key] = (result, time() + policy.ttl,
+                            [(path, _get_mtime(path)) for path in paths],
+                            self._packages_generation
+                            if policy.packages else None)
+
+    def reset_packages(self):
+        self._packages_generation += 1
+
+    def clear(self):
+        self._items.clear()
+
+
+class DispatchStats(object):
+    """Latency of RPC methods from a request to a result"""
+
+    def __init__(self):
+        self._items = {}
+
+    def record(self, method, duration, status="called"):
+        """`status` is "called", "cached", "coalesced" or "failed" """
+        item = self._items.setdefault(
+            method,
+            dict(calls=0,
+                 cached=0,
+                 coalesced=0,
+                 failed=0,
+                 total_time=0.0,
+                 max_time=0.0))
+        item['calls'] += 1
+        if status != "called":
+            item[status] += 1
+        item['total_time'] += duration
+        item['max_time'] = max(item['max_time'], duration)
+
+    def as_dict(self):
+        result = {}
+        for method, item in self._items.items():
+            result[method] = dict(item)
+            result[method]['avg_time'] = item['total_time'] / item['calls']
+        return result
+
+
+class LRUCache(object):
+    """In-memory cache of the last used `max_items` values"""
+
+    def __init__(self, max_items=128):
+        self.max_items = max_items
+        self._items = OrderedDict()  # key: (expire, value)
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        item = self._items.get(key)
+        if not item:
+            return default
+        if item[0] < time():
+            del self._items[key]
+            return default
+        self._items.move_to_end(key)
+        return item[1]
+
+    def set(self, key, value, ttl):
+        self._items.pop(key, None)
+        self._items[key] = (time() + ttl, value)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def delete(self, key):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
@@ -17,25 +17,26 @@ import time
 
 from twisted.internet import defer, reactor  # pylint: disable=import-error
 
-from platformio import app
 from platformio.commands.home.rpc.handlers.os import OSRPC
 
 
 class MiscRPC(object):
 
+    @defer.inlineCallbacks
     def load_latest_tweets(self, username):
         cache_key = f"piohome_latest_tweets_{str(username)}"
         cache_valid = "7d"
-        with app.ContentCache() as cc:
-            if cache_data := cc.get(cache_key):
-                cache_data = json.loads(cache_data)
-                # automatically update cache in background every 12 hours
-                if cache_data['time'] < (time.time() - (3600 * 12)):
-                    reactor.callLater(5, self._preload_latest_tweets, username,
-                                      cache_key, cache_valid)
-                return cache_data['result']
-
-        return self._preload_latest_tweets(username, cache_key, cache_valid)
+        if cache_data := (yield OSRPC.load_cached_content(cache_key)):
+            cache_data = json.loads(cache_data)
+            # automatically update cache in background every 12 hours
+            if cache_data['time'] < (time.time() - (3600 * 12)):
+                reactor.callLater(5, self._preload_latest_tweets, username,
+                                  cache_key, cache_valid)
+            defer.returnValue(cache_data['result'])
+
+        result = yield self._preload_latest_tweets(username, cache_key,
+                                                   cache_valid)
+        defer.returnValue(result)
 
     @staticmethod
     @defer.inlineCallbacks
@@ -44,10 +45,10 @@ class MiscRPC(object):
             f"https://api.platformio.org/tweets/{username}"
         )
         result = json.loads(result)
-        with app.ContentCache() as cc:
-            cc.set(cache_key,
-                   json.dumps({
-                       "time": int(time.time()),
-                       "result": result
-                   }), cache_valid)
+        yield OSRPC.save_cached_content(
+            cache_key,
+            json.dumps({
+                "time": int(time.time()),
+                "result": result
+            }), cache_valid)
         defer.returnValue(result)
@@ -18,19 +18,79 @@ import codecs
 import glob
 import os
 import shutil
+import time
 from functools import cmp_to_key
 from os.path import expanduser, isdir, isfile, join
 
 import click
+import requests
 from twisted.internet import defer  # pylint: disable=import-error
+from twisted.internet import threads  # pylint: disable=import-error
 
-from platformio import app, util
+from platformio import app, exception, util
 from platformio.commands.home import helpers
+from platformio.commands.home.rpc.cache import LRUCache
 from platformio.compat import PY2, get_filesystem_encoding
 
 
 class OSRPC(object):
 
+    MEMORY_CACHE_VALID = 300  # seconds, for content loaded from a disk
+    FAILURE_VALID = 30  # seconds, a failed request is not repeated
+    OFFLINE_VALID = 60  # seconds, connectivity is not checked again
+
+    memory_cache = LRUCache(max_items=128)
+    failures = LRUCache(max_items=128)
+    _offline_until = 0
+
+    @staticmethod
+    def load_cached_content(key):
+        """Deferred with content from the memory or `ContentCache`"""
+        result = OSRPC.memory_cache.get(key)
+        if result is not None:
+            return defer.succeed(result)
+
+        def _load():
+            with app.ContentCache() as cc:
+                return cc.get(key), cc.get_expire_time(key)
+
+        def _on_loaded(loaded):
+            result, expire_time = loaded
+            # do not keep content longer than `ContentCache` does
+            valid = min(OSRPC.MEMORY_CACHE_VALID,
+                        (expire_time or 0) - int(time.time()))
+            if result is not None and valid > 0:
+                OSRPC.memory_cache.set(key, result, valid)
+            return result
+
+        d = threads.deferToThread(_load)
+        d.addCallback(_on_loaded)
+        return d
+
+    @staticmethod
+    def save_cached_content(key, data, valid):
+        if not app.get_setting("enable_cache"):
+            return defer.succeed(False)
+        OSRPC.memory_cache.set(key, data, util.parse_duration(valid))
+
+        def _save():
+            with app.ContentCache() as cc:
+                return cc.set(key, data, valid)
+
+        return threads.deferToThread(_save)
+
+    @staticmethod
+    @defer.inlineCallbacks
+    def check_internet():
+        # do not wait for connectivity probes while Home is offline
+        if OSRPC._offline_until > time.time():
+            raise exception.InternetIsOffline()
+        online = yield threads.deferToThread(util.internet_on)
+        if not online:
+            OSRPC._offline_until = time.time() + OSRPC.OFFLINE_VALID
+            raise exception.InternetIsOffline()
+        OSRPC._offline_until = 0
+
     @staticmethod
     @defer.inlineCallbacks
     def fetch_content(uri, data=None, headers=None, cache_valid=None):
@@ -41,28 +101,34 @@ class OSRPC(object):
                  "AppleWebKit/603.3.8 (KHTML, like Gecko) Version/10.1.2 "
                  "Safari/603.3.8")
             }
-        cache_key = (app.ContentCache.key_from_args(uri, data)
-                     if cache_valid else None)
-        with app.ContentCache() as cc:
-            if cache_key:
-                result = cc.get(cache_key)
-                if result is not None:
-                    defer.returnValue(result)
+        cache_key = app.ContentCache.key_from_args(uri, data)
+        if cache_valid:
+            result = yield OSRPC.load_cached_content(cache_key)
+            if result is not None:
+                defer.returnValue(result)
+
+        # a traceback of a raised exception must not be shared between calls
+        error = OSRPC.failures.get(cache_key)
+        if error:
+            raise requests.exceptions.RequestException(error)
 
         # check internet before and resolve issue with 60 seconds timeout
-        util.internet_on(raise_exception=True)
+        yield OSRPC.check_internet()
 
         session = helpers.requests_session()
-        if data:
-            r = yield session.post(uri, data=data, headers=headers)
-        else:
-            r = yield session.get(uri, headers=headers)
+        try:
+            if data:
+                r = yield session.post(uri, data=data, headers=headers)
+            else:
+                r = yield session.get(uri, headers=headers)
+            r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            OSRPC.failures.set(cache_key, str(e), OSRPC.FAILURE_VALID)
+            raise e
 
-        r.raise_for_status()
         result = r.text
         if cache_valid:
-            with app.ContentCache() as cc:
-                cc.set(cache_key, result, cache_valid)
+            yield OSRPC.save_cached_content(cache_key, result, cache_valid)
         defer.returnValue(result)
 
     def request_content(self, uri, data=None, headers=None, cache_valid=None):
@@ -16,8 +16,6 @@ from __future__ import absolute_import
 
 import json
 import os
-import sys
-from io import BytesIO, StringIO
 
 import click
 import jsonrpc  # pylint: disable=import-error
@@ -25,65 +23,40 @@ from twisted.internet import defer  # pylint: disable=import-error
 from twisted.internet import threads  # pylint: disable=import-error
 from twisted.internet import utils  # pylint: disable=import-error
 
-from platformio import __main__, __version__, fs
+from platformio import __version__
 from platformio.commands.home import helpers
-from platformio.compat import (PY2, get_filesystem_encoding, is_bytes,
-                               string_types)
-
-try:
-    from thread import get_ident as thread_get_ident
-except ImportError:
-    from threading import get_ident as thread_get_ident
-
-
-class MultiThreadingStdStream(object):
-
-    def __init__(self, parent_stream):
-        self._buffers = {thread_get_ident(): parent_stream}
-
-    def __getattr__(self, name):
-        thread_id = thread_get_ident()
-        self._ensure_thread_buffer(thread_id)
-        return getattr(self._buffers[thread_id], name)
-
-    def _ensure_thread_buffer(self, thread_id):
-        if thread_id not in self._buffers:
-            self._buffers[thread_id] = BytesIO() if PY2 else StringIO()
-
-    def write(self, value):
-        thread_id = thread_get_ident()
-        self._ensure_thread_buffer(thread_id)
-        return self._buffers[thread_id].write(
-            value.decode() if is_bytes(value) else value)
-
-    def get_value_and_reset(self):
-        result = ""
-        try:
-            result = self.getvalue()
-            self.truncate(0)
-            self.seek(0)
-        except AttributeError:
-            pass
-        return result
+from platformio.commands.home.workers import CoreWorkerError, CoreWorkerPool
+from platformio.compat import PY2, get_filesystem_encoding, string_types
 
 
 class PIOCoreRPC(object):
 
+    factory = None  # see `JSONRPCServerFactory.addHandler`
+    _pool = None
+    _pool_semaphore = None
+
     @staticmethod
     def version():
         return __version__
 
     @staticmethod
-    def setup_multithreading_std_streams():
-        if isinstance(sys.stdout, MultiThreadingStdStream):
-            return
-        PIOCoreRPC.thread_stdout = MultiThreadingStdStream(sys.stdout)
-        PIOCoreRPC.thread_stderr = MultiThreadingStdStream(sys.stderr)
-        sys.stdout = PIOCoreRPC.thread_stdout
-        sys.stderr = PIOCoreRPC.thread_stderr
+    def get_worker_pool():
+        if not PIOCoreRPC._pool:
+            PIOCoreRPC._pool = CoreWorkerPool()
+            PIOCoreRPC._pool_semaphore = defer.DeferredSemaphore(
+                PIOCoreRPC._pool.size)
+        return PIOCoreRPC._pool
+
+    @staticmethod
+    def shutdown():
+        if PIOCoreRPC._pool:
+            PIOCoreRPC._pool.shutdown()
 
     @staticmethod
     def call(args, options=None):
+        """Run PIO Core command. When `options` contain `stream_id`, the
+        output is sent to a client as `core.output` notifications
+        `{"stream_id", "stream": "out|err", "text"}` while it is running"""
         return defer.maybeDeferred(PIOCoreRPC._call_generator, args, options)
 
     @staticmethod
@@ -98,35 +71,40 @@ class PIOCoreRPC(object):
         to_json = "--json-output" in args
 
         try:
-            if args and args[0] in ("account", "remote"):
+            try:
+                result = yield PIOCoreRPC._call_worker(args, options)
+            except CoreWorkerError:
+                result = yield PIOCoreRPC._call_subprocess(args, options)
+            try:
+                defer.returnValue(PIOCoreRPC._process_result(result, to_json))
+            except ValueError:
+                # fall-back to subprocess method
                 result = yield PIOCoreRPC._call_subprocess(args, options)
                 defer.returnValue(PIOCoreRPC._process_result(result, to_json))
-            else:
-                result = yield PIOCoreRPC._call_inline(args, options)
-                try:
-                    defer.returnValue(
-                        PIOCoreRPC._process_result(result, to_json))
-                except ValueError:
-                    # fall-back to subprocess method
-                    result = yield PIOCoreRPC._call_subprocess(args, options)
-                    defer.returnValue(
-                        PIOCoreRPC._process_result(result, to_json))
         except Exception as e:  # pylint: disable=bare-except
             raise jsonrpc.exceptions.JSONRPCDispatchException(
                 code=4003, message="PIO Core Call Error", data=str(e))
 
     @staticmethod
-    def _call_inline(args, options):
-        PIOCoreRPC.setup_multithreading_std_streams()
-        cwd = (options or {}).get("cwd") or os.getcwd()
-
-        def _thread_task():
-            with fs.cd(cwd):
-                exit_code = __main__.main(["-c"] + args)
-            return (PIOCoreRPC.thread_stdout.get_value_and_reset(),
-                    PIOCoreRPC.thread_stderr.get_value_and_reset(), exit_code)
-
-        return threads.deferToThread(_thread_task)
+    def _call_worker(args, options):
+        options = options or {}
+        pool = PIOCoreRPC.get_worker_pool()
+        on_output = None
+        if options.get("stream_id") and PIOCoreRPC.factory:
+            notify = PIOCoreRPC.factory.get_notifier("core.output")
+
+            def _on_output(stream, text):
+                notify(
+                    dict(stream_id=options['stream_id'],
+                         stream=stream,
+                         text=text))
+
+            on_output = _on_output
+
+        # a queued call should not hold a thread of the reactor's pool
+        return PIOCoreRPC._pool_semaphore.run(threads.deferToThread,
+                                              pool.call, args,
+                                              options.get("cwd"), on_output)
 
     @staticmethod
     def _call_subprocess(args, options):
@@ -17,101 +17,68 @@ from __future__ import absolute_import
 import os
 import shutil
 import time
-from os.path import (basename, expanduser, getmtime, isdir, isfile, join,
-                     realpath, sep)
+from functools import partial
+from os.path import basename, isdir, isfile, join, sep
 
 import jsonrpc  # pylint: disable=import-error
+from twisted.internet import defer, reactor  # pylint: disable=import-error
 
 from platformio import exception, fs
+from platformio.commands.home.projects import ProjectIndexer
 from platformio.commands.home.rpc.handlers.app import AppRPC
 from platformio.commands.home.rpc.handlers.piocore import PIOCoreRPC
 from platformio.compat import PY2, get_filesystem_encoding
 from platformio.ide.projectgenerator import ProjectGenerator
 from platformio.managers.platform import PlatformManager
 from platformio.project.config import ProjectConfig
-from platformio.project.helpers import (get_project_libdeps_dir,
-                                        get_project_src_dir,
+from platformio.project.helpers import (get_project_src_dir,
                                         is_platformio_project)
 
 
 class ProjectRPC(object):
 
-    @staticmethod
-    def _get_projects(project_dirs=None):
-
-        def _get_project_data(project_dir):
-            data = {"boards": [], "envLibdepsDirs": [], "libExtraDirs": []}
-            config = ProjectConfig(join(project_dir, "platformio.ini"))
-            libdeps_dir = get_project_libdeps_dir()
-
-            data['libExtraDirs'].extend(
-                config.get("platformio", "lib_extra_dirs", []))
-
-            for section in config.sections():
-                if not section.startswith("env:"):
-                    continue
-                data['envLibdepsDirs'].append(join(libdeps_dir, section[4:]))
-                if config.has_option(section, "board"):
-                    data['boards'].append(config.get(section, "board"))
-                data['libExtraDirs'].extend(
-                    config.get(section, "lib_extra_dirs", []))
-
-            # skip non existing folders and resolve full path
-            for key in ("envLibdepsDirs", "libExtraDirs"):
-                data[key] = [
-                    expanduser(d) if d.startswith("~") else realpath(d)
-                    for d in data[key] if isdir(d)
-                ]
-
-            return data
-
-        def _path_to_name(path):
-            return (sep).join(path.split(sep)[-2:])
+    factory = None  # see `JSONRPCServerFactory.addHandler`
+    indexer = ProjectIndexer()
 
+    def get_projects(self, project_dirs=None):
+        """Indexed projects are returned at once, outdated ones are
+        refreshed in background and changes are sent to a client as
+        `project.updated` notifications (`{"path", "removed": true}` for
+        a removed project)"""
         if not project_dirs:
             project_dirs = AppRPC.load_state()['storage']['recentProjects']
-
-        result = []
-        pm = PlatformManager()
+        notify = (self.factory.get_notifier("project.updated")
+                  if self.factory else None)
+        not_indexed = []
         for project_dir in project_dirs:
-            data = {}
-            boards = []
-            try:
-                with fs.cd(project_dir):
-                    data = _get_project_data(project_dir)
-            except exception.PlatformIOProjectException:
+            if not self.indexer.is_outdated(project_dir):
                 continue
+            future = self.indexer.refresh(project_dir)
+            if not self.indexer.is_indexed(project_dir):
+                not_indexed.append(self._future_to_deferred(future))
+            elif notify:
+                future.add_done_callback(
+                    partial(self._on_project_refreshed, notify, project_dir))
+        if not not_indexed:
+            return self.indexer.get_summaries(project_dirs)
+        d = defer.DeferredList(not_indexed)
+        d.addCallback(lambda _: self.indexer.get_summaries(project_dirs))
+        return d
 
-            for board_id in data.get("boards", []):
-                name = board_id
-                try:
-                    name = pm.board_config(board_id)['name']
-                except exception.PlatformioException:
-                    pass
-                boards.append({"id": board_id, "name": name})
-
-            result.append({
-                "path":
-                project_dir,
-                "name":
-                _path_to_name(project_dir),
-                "modified":
-                int(getmtime(project_dir)),
-                "boards":
-                boards,
-                "envLibStorages": [{
-                    "name": basename(d),
-                    "path": d
-                } for d in data.get("envLibdepsDirs", [])],
-                "extraLibStorages": [{
-                    "name": _path_to_name(d),
-                    "path": d
-                } for d in data.get("libExtraDirs", [])]
-            })
-        return result
+    @staticmethod
+    def _future_to_deferred(future):
+        d = defer.Deferred()
+        future.add_done_callback(
+            lambda _: reactor.callFromThread(d.callback, None))
+        return d
 
-    def get_projects(self, project_dirs=None):
-        return self._get_projects(project_dirs)
+    @staticmethod
+    def _on_project_refreshed(notify, project_dir, future):
+        if future.exception():
+            return
+        summary, changed = future.result()
+        if changed:
+            notify(summary or {"path": project_dir, "removed": True})
 
     @staticmethod
     def get_project_examples():
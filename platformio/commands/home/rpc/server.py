@@ -14,22 +14,45 @@
 
 # pylint: disable=import-error
 
+import inspect
+from functools import wraps
+from time import time
+
 import click
 import jsonrpc
 from autobahn.twisted.websocket import (WebSocketServerFactory,
                                         WebSocketServerProtocol)
 from jsonrpc.exceptions import JSONRPCDispatchException
-from twisted.internet import defer
-
+from twisted.internet import defer, reactor, threads
+from twisted.python.failure import Failure
+
+from platformio.commands.home.rpc.cache import (DispatchStats,
+                                                RPCResultCache,
+                                                is_packages_event)
+from platformio.commands.home.rpc.streaming import (get_page,
+                                                    is_large_result,
+                                                    split_chunks)
 from platformio.compat import PY2, dump_json_to_unicode, is_bytes
 
 
 class JSONRPCServerProtocol(WebSocketServerProtocol):
 
+    chunk_size = None  # see `JSONRPCServerFactory.set_chunk_size`
+
+    def onOpen(self):
+        self.factory.connections.add(self)
+
+    def onClose(self, wasClean, code, reason):  # pylint: disable=W0613
+        self.factory.connections.discard(self)
+
     def onMessage(self, payload, isBinary):  # pylint: disable=unused-argument
         # click.echo("> %s" % payload)
-        response = jsonrpc.JSONRPCResponseManager.handle(
-            payload, self.factory.dispatcher).data
+        self.factory.active_connection = self
+        try:
+            response = jsonrpc.JSONRPCResponseManager.handle(
+                payload, self.factory.dispatcher).data
+        finally:
+            self.factory.active_connection = None
         # if error
         if "result" not in response:
             self.sendJSONResponse(response)
@@ -55,14 +78,43 @@ class JSONRPCServerProtocol(WebSocketServerProtocol):
         response['error'] = e.error._data  # pylint: disable=protected-access
         self.sendJSONResponse(response)
 
+    def sendJSONNotification(self, method, params):
+        if self not in self.factory.connections:
+            return
+        self.sendJSONResponse(
+            dict(jsonrpc="2.0", method=method, params=params))
+
     def sendJSONResponse(self, response):
         # click.echo("< %s" % response)
         if "error" in response:
             click.secho(f"Error: {response['error']}", fg="red", err=True)
-        response = dump_json_to_unicode(response)
-        if not PY2 and not is_bytes(response):
-            response = response.encode("utf-8")
-        self.sendMessage(response)
+        # do not block the reactor while encoding a large result
+        if is_large_result(response.get("result")):
+            d = threads.deferToThread(dump_json_to_unicode, response)
+            d.addCallback(self._send_encoded, response.get("id"))
+            return d
+        return self._send_encoded(dump_json_to_unicode(response),
+                                  response.get("id"))
+
+    def _send_encoded(self, payload, request_id):
+        if self not in self.factory.connections:
+            return None
+        if (self.chunk_size and request_id is not None
+                and len(payload) > self.chunk_size):
+            chunks = split_chunks(payload, self.chunk_size)
+            for index, data in enumerate(chunks):
+                self._send_encoded(
+                    dump_json_to_unicode(
+                        dict(jsonrpc="2.0",
+                             method="server.response_chunk",
+                             params=dict(id=request_id,
+                                         index=index,
+                                         count=len(chunks),
+                                         data=data))), None)
+            return None
+        if not PY2 and not is_bytes(payload):
+            payload = payload.encode("utf-8")
+        return self.sendMessage(payload)
 
 
 class JSONRPCServerFactory(WebSocketServerFactory):
@@ -72,6 +124,120 @@ class JSONRPCServerFactory(WebSocketServerFactory):
     def __init__(self):
         super(JSONRPCServerFactory, self).__init__()
         self.dispatcher = jsonrpc.Dispatcher()
+        self.dispatcher["server.get_stats"] = self.get_stats
+        self.dispatcher["server.set_chunk_size"] = self.set_chunk_size
+        self.dispatcher["server.call_paged"] = self.call_paged
+        self.connections = set()
+        self.active_connection = None
+        self.cache = RPCResultCache()
+        self.stats = DispatchStats()
+        self._inflight = {}
 
     def addHandler(self, handler, namespace):
-        self.dispatcher.build_method_map(handler, prefix=f"{namespace}.")
+        if hasattr(handler, "factory"):
+            handler.factory = self
+        methods = jsonrpc.Dispatcher()
+        methods.build_method_map(handler, prefix=f"{namespace}.")
+        for name, method in methods.items():
+            self.dispatcher[name] = self._wrap_method(name, method)
+
+    def get_stats(self):
+        return {"methods": self.stats.as_dict(), "cached": len(self.cache)}
+
+    def set_chunk_size(self, size=None):
+        """Responses longer than `size` characters are sent to the calling
+        client in chunks, `None` disables chunking"""
+        self.active_connection.chunk_size = int(size) if size else None
+        return True
+
+    def call_paged(self, method, params=None, offset=0, limit=100):
+        """A page of a list result of `method` (results of read-only
+        methods are cached, so next pages do not call it again)"""
+        if method not in self.dispatcher or method.startswith("server."):
+            raise JSONRPCDispatchException(code=4006,
+                                           message=f"Unknown method {method}")
+        params = params or []
+        d = (defer.maybeDeferred(self.dispatcher[method], **params)
+             if isinstance(params, dict) else defer.maybeDeferred(
+                 self.dispatcher[method], *params))
+        d.addCallback(self._get_page, offset, limit)
+        return d
+
+    @staticmethod
+    def _get_page(result, offset, limit):
+        try:
+            return get_page(result, offset, limit)
+        except ValueError as e:
+            raise JSONRPCDispatchException(code=4006, message=str(e))
+
+    def _wrap_method(self, name, method):
+        """Serve cached results, coalesce identical calls which are in
+        progress and measure latency of a method"""
+
+        @wraps(method)
+        def _dispatch(*args, **kwargs):
+            started = time()
+            try:
+                params = dict(
+                    inspect.signature(method).bind(*args,
+                                                   **kwargs).arguments)
+            except TypeError:
+                return method(*args, **kwargs)  # invalid params
+            key = self.cache.get_key(name, params)
+            if key:
+                hit, result = self.cache.get(key)
+                if hit:
+                    self.stats.record(name, time() - started, "cached")
+                    return result
+                if key in self._inflight:
+                    d = defer.Deferred()
+                    self._inflight[key].append(d)
+                    d.addBoth(self._on_done, name, started, "coalesced")
+                    return d
+
+            try:
+                result = method(*args, **kwargs)
+            except Exception:  # pylint: disable=broad-except
+                self.stats.record(name, time() - started, "failed")
+                raise
+            if not isinstance(result, defer.Deferred):
+                self._on_call_done(result, name, params, key)
+                return self._on_done(result, name, started)
+            if key:
+                self._inflight[key] = []
+            result.addBoth(self._on_call_done, name, params, key)
+            result.addBoth(self._on_done, name, started)
+            return result
+
+        return _dispatch
+
+    def _on_call_done(self, result, name, params, key):
+        failed = isinstance(result, Failure)
+        if not failed and is_packages_event(name, params):
+            self.cache.reset_packages()
+        if key and not failed:
+            self.cache.set(key, name, params, result)
+        for d in self._inflight.pop(key, []):
+            if failed:
+                d.errback(result)
+            else:
+                d.callback(result)
+        return result
+
+    def _on_done(self, result, name, started, status="called"):
+        if isinstance(result, Failure):
+            status = "failed"
+        self.stats.record(name, time() - started, status)
+        return result
+
+    def get_notifier(self, method):
+        """Returns a function which sends `method` notifications to a client
+        whose request is being dispatched, it can be called from any thread"""
+        connection = self.active_connection
+
+        def _notify(params):
+            if connection:
+                reactor.callFromThread(connection.sendJSONNotification,
+                                       method, params)
+
+        return _notify
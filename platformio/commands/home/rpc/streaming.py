@@ -0,0 +1,58 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Delivery of large RPC results. A client which calls
+# `server.set_chunk_size(size)` receives a response longer than `size`
+# characters as `server.response_chunk` notifications
+# `{"id", "index", "count", "data"}`, joined `data` is a JSON-RPC response
+
+from platformio.compat import string_types
+
+LARGE_RESULT_SIZE = 1000  # JSON values, encoded in a thread
+LARGE_RESULT_LENGTH = 64 * 1024  # characters of a string result
+
+
+def get_result_size(result, depth=2):
+    """A rough number of JSON values, nested containers are counted up to
+    `depth` levels"""
+    if isinstance(result, dict):
+        result = list(result.values())
+    if not isinstance(result, list):
+        return 1
+    if depth <= 1:
+        return len(result)
+    return sum(get_result_size(item, depth - 1) for item in result)
+
+
+def is_large_result(result):
+    if isinstance(result, string_types):
+        return len(result) > LARGE_RESULT_LENGTH
+    return get_result_size(result) > LARGE_RESULT_SIZE
+
+
+def split_chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def get_page(result, offset=0, limit=100):
+    if not isinstance(result, list):
+        raise ValueError("Only a list can be paged")
+    offset = max(0, int(offset))
+    limit = max(1, int(limit))
+    return {
+        "items": result[offset:offset + limit],
+        "total": len(result),
+        "offset": offset,
+        "limit": limit
+    }
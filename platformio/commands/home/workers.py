@@ -0,0 +1,319 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Warm PIO Core processes for PIO Home. A worker imports commands and
+# package managers once and then runs CLI commands sent over its stdin,
+# the output of a command (including output of its subprocesses) is
+# streamed back over its stdout as JSON lines:
+#
+#   > {"id": 1, "args": ["platform", "list", "--json-output"], "cwd": "/"}
+#   < {"id": 1, "stream": "out", "text": "[...]"}
+#   < {"id": 1, "exit_code": 0}
+
+import codecs
+import json
+import os
+import subprocess
+import sys
+import threading
+import traceback
+from multiprocessing import cpu_count
+from os.path import getmtime, isdir
+
+from platformio import proc
+
+WORKER_MAX_CALLS = 100  # restart a worker to release leaked memory
+
+
+class CoreWorkerError(Exception):
+    pass
+
+
+class CoreWorker(object):
+
+    def __init__(self):
+        self.calls = 0
+        self._last_id = 0
+        proc.copy_pythonpath_to_osenv()
+        self._process = subprocess.Popen(
+            [
+                proc.get_pythonexe_path(), "-c",
+                "from platformio.commands.home.workers import run_worker; "
+                "run_worker()"
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=dict(os.environ, PLATFORMIO_HOME_WORKER="true"))
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def call(self, args, cwd=None, on_output=None):
+        """Returns `(stdout, stderr, exit_code)`, `on_output(stream, text)`
+        is called for each chunk of output while a command is running"""
+        self.calls += 1
+        self._last_id += 1
+        request = dict(id=self._last_id,
+                       args=args,
+                       cwd=cwd or os.getcwd())
+        output = {"out": [], "err": []}
+        try:
+            self._process.stdin.write(
+                (json.dumps(request) + "\n").encode("utf8"))
+            self._process.stdin.flush()
+            for line in iter(self._process.stdout.readline, b""):
+                message = json.loads(line.decode("utf8"))
+                if message.get("id") != request['id']:
+                    continue  # output of a background subprocess
+                if "exit_code" in message:
+                    return ("".join(output['out']), "".join(output['err']),
+                            message['exit_code'])
+                output[message['stream']].append(message['text'])
+                if on_output:
+                    on_output(message['stream'], message['text'])
+        except (IOError, OSError, ValueError) as e:
+            raise CoreWorkerError(str(e))
+        raise CoreWorkerError("PIO Core worker has been terminated")
+
+    def stop(self):
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=5)
+        except (IOError, OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+
+
+class CoreWorkerPool(object):
+    """Up to `size` workers are started on demand. A caller must limit
+    the number of concurrent calls to `size`, otherwise `call` blocks until
+    a worker is released."""
+
+    def __init__(self, size=None, max_calls=WORKER_MAX_CALLS):
+        self.size = size or max(1, min(4, cpu_count()))
+        self.max_calls = max_calls
+        self._idle = []
+        self._started = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def call(self, args, cwd=None, on_output=None):
+        worker = self._acquire()
+        try:
+            return worker.call(args, cwd, on_output)
+        finally:
+            self._release(worker)
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise CoreWorkerError("PIO Core worker pool is closed")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.is_alive():
+                        return worker
+                    self._started -= 1
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                self._cond.wait()
+        try:
+            return CoreWorker()
+        except OSError as e:
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            raise CoreWorkerError(str(e))
+
+    def _release(self, worker):
+        with self._cond:
+            if (not self._closed and worker.is_alive()
+                    and worker.calls < self.max_calls):
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._started -= 1
+            self._cond.notify()
+        worker.stop()
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            workers, self._idle = self._idle, []
+            self._started -= len(workers)
+            self._cond.notify_all()
+        for worker in workers:
+            worker.stop()
+
+
+class _OutputStream(object):
+    """Redirects a file descriptor to a pipe and forwards its content"""
+
+    SENTINEL = b"\x00piocore-end\x00"
+
+    def __init__(self, fd, name, send):
+        self.name = name
+        self.send = send
+        self.call_id = None
+        self.finished = threading.Event()
+        read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, fd)
+        os.close(write_fd)
+        self._fd = fd
+        self._read_fd = read_fd
+        self._decoder = codecs.getincrementaldecoder("utf8")("replace")
+        thread = threading.Thread(target=self._drain)
+        thread.daemon = True
+        thread.start()
+
+    def mark_end(self):
+        self.finished.clear()
+        os.write(self._fd, self.SENTINEL)
+
+    def _forward(self, data):
+        text = self._decoder.decode(data)
+        if text:
+            self.send(dict(id=self.call_id, stream=self.name, text=text))
+
+    def _drain(self):
+        buf = b""
+        while True:
+            data = os.read(self._read_fd, 4096)
+            if not data:
+                break
+            buf += data
+            while self.SENTINEL in buf:
+                data, buf = buf.split(self.SENTINEL, 1)
+                self._forward(data)
+                self.finished.set()
+            # keep a possible beginning of a sentinel
+            tail = 0
+            for size in range(min(len(buf), len(self.SENTINEL) - 1), 0, -1):
+                if buf.endswith(self.SENTINEL[:size]):
+                    tail = size
+                    break
+            self._forward(buf[:len(buf) - tail])
+            buf = buf[len(buf) - tail:]
+
+
+def _get_packages_state():
+    # pylint: disable=import-outside-toplevel
+    from platformio.project.helpers import (get_project_global_lib_dir,
+                                            get_project_packages_dir,
+                                            get_project_platforms_dir)
+    return [
+        getmtime(d) if isdir(d) else None
+        for d in (get_project_platforms_dir(), get_project_packages_dir(),
+                  get_project_global_lib_dir())
+    ]
+
+
+def _warm_up():
+    # pylint: disable=import-outside-toplevel, unused-import
+    from platformio import __main__
+    from platformio.commands import (boards, lib, platform, settings,
+                                     update)
+    from platformio.managers.platform import PlatformManager
+    try:
+        PlatformManager().get_installed_boards()
+    except Exception:  # pylint: disable=broad-except
+        pass
+
+
+def _reset_packages_cache():
+    # pylint: disable=import-outside-toplevel
+    from platformio.managers.package import PkgInstallerMixin
+    from platformio.managers.platform import PlatformManager
+    PkgInstallerMixin.MEMORY_CACHE.clear()
+    PlatformManager.get_installed_boards.reset()
+
+
+def _run_command(args):
+    """Invokes a command without `__main__.main`, maintenance hooks are
+    skipped in a worker, see `__main__.is_home_worker`"""
+    # pylint: disable=import-outside-toplevel
+    import click
+    from platformio import __main__, exception
+    try:
+        result = __main__.cli.main(args=args,
+                                   prog_name="platformio",
+                                   standalone_mode=False)
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        click.secho("Aborted!", fg="red", err=True)
+        return 1
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else int(bool(e.code))
+    except exception.ReturnErrorCode as e:
+        return int(str(e)) if str(e).isdigit() else 1
+    except Exception as e:  # pylint: disable=broad-except
+        click.secho("Error: %s" % (e if isinstance(
+            e, exception.PlatformioException) else traceback.format_exc()),
+                    fg="red",
+                    err=True)
+        return 1
+    # a code of `ctx.exit()`, click returns it when not in standalone mode
+    return result if isinstance(result, int) else 0
+
+
+def run_worker():
+    # pylint: disable=import-outside-toplevel
+    from platformio import __main__, fs
+
+    lock = threading.Lock()
+    requests = os.fdopen(os.dup(0), "rb")
+    responses = os.fdopen(os.dup(1), "wb")
+
+    def _send(message):
+        with lock:
+            responses.write((json.dumps(message) + "\n").encode("utf8"))
+            responses.flush()
+
+    with open(os.devnull, "rb") as devnull:
+        os.dup2(devnull.fileno(), 0)
+    streams = [_OutputStream(1, "out", _send), _OutputStream(2, "err", _send)]
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.reconfigure(line_buffering=True)
+        except AttributeError:
+            pass
+
+    __main__.configure()
+    _warm_up()
+    packages_state = _get_packages_state()
+
+    for line in iter(requests.readline, b""):
+        request = json.loads(line.decode("utf8"))
+        # packages could be changed by a previous command or other process
+        state = _get_packages_state()
+        if state != packages_state:
+            _reset_packages_cache()
+            packages_state = state
+        for stream in streams:
+            stream.call_id = request['id']
+        try:
+            with fs.cd(request['cwd']):
+                exit_code = _run_command(request['args'])
+        except OSError as e:  # invalid working directory
+            sys.stderr.write("Error: %s\n" % e)
+            exit_code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for stream in streams:
+            stream.mark_end()
+        for stream in streams:
+            stream.finished.wait()
+        _send(dict(id=request['id'], exit_code=exit_code))
@@ -26,6 +26,8 @@ from platformio.commands.run.helpers import (clean_build_dir,
                                              handle_legacy_libdeps)
 from platformio.commands.run.processor import EnvironmentProcessor
 from platformio.commands.test.processor import CTX_META_TEST_IS_RUNNING
+from platformio.profiler import (Profiler, get_phase_durations,
+                                 get_slowest_events)
 from platformio.project.config import ProjectConfig
 from platformio.project.helpers import (find_project_dir_above,
                                         get_project_build_dir)
@@ -67,24 +69,32 @@ except NotImplementedError:
 @click.option("-s", "--silent", is_flag=True)
 @click.option("-v", "--verbose", is_flag=True)
 @click.option("--disable-auto-clean", is_flag=True)
+@click.option("--profile",
+              is_flag=True,
+              help="Measure build phases and save a timeline in Chrome Trace "
+              "Event Format to the build directory")
 @click.pass_context
 def cli(ctx, environment, target, upload_port, project_dir, project_conf, jobs,
-        silent, verbose, disable_auto_clean):
+        silent, verbose, disable_auto_clean, profile):
     # find project directory on upper level
     if isfile(project_dir):
         project_dir = find_project_dir_above(project_dir)
 
     is_test_running = CTX_META_TEST_IS_RUNNING in ctx.meta
+    if profile:
+        Profiler().enable()
 
     with fs.cd(project_dir):
-        config = ProjectConfig.get_instance(
-            project_conf or join(project_dir, "platformio.ini"))
-        config.validate(environment)
+        with Profiler().phase("Project configuration"):
+            config = ProjectConfig.get_instance(
+                project_conf or join(project_dir, "platformio.ini"))
+            config.validate(environment)
 
         # clean obsolete build dir
         if not disable_auto_clean:
             try:
-                clean_build_dir(get_project_build_dir(), config)
+                with Profiler().phase("Clean obsolete build dir"):
+                    clean_build_dir(get_project_build_dir(), config)
             except:  # pylint: disable=bare-except
                 click.secho(
                     "Can not remove temporary directory `%s`. Please remove "
@@ -132,9 +142,17 @@ def process_env(ctx, name, config, environments, targets, upload_port, silent,
 
     ep = EnvironmentProcessor(ctx, name, config, targets, upload_port, silent,
                               verbose, jobs)
+    profile_offset = len(Profiler().get_events())
     result = {"env": name, "duration": time(), "succeeded": ep.process()}
     result['duration'] = time() - result['duration']
 
+    if Profiler().enabled:
+        events = Profiler().get_events()[profile_offset:]
+        print_profile_report(
+            events,
+            Profiler().save(
+                join(get_project_build_dir(), name, "profile.json"), events))
+
     # print footer on error or when is not unit testing
     if not is_test_running and (not silent or not result['succeeded']):
         print_processing_footer(result)
@@ -168,6 +186,29 @@ def print_processing_footer(result):
         is_error=is_failed)
 
 
+def print_profile_report(events, trace_path, limit=10):
+    click.echo()
+    click.echo(
+        tabulate(sorted(get_phase_durations(events).items(),
+                        key=lambda item: item[1],
+                        reverse=True),
+                 headers=[
+                     click.style(s, bold=True) for s in ("Phase", "Seconds")
+                 ],
+                 floatfmt=".3f"))
+    slowest = get_slowest_events(events, "compile", limit)
+    if slowest:
+        click.echo()
+        click.echo(
+            tabulate([(e['name'], e['dur'] / 1000000.0) for e in slowest],
+                     headers=[
+                         click.style(s, bold=True)
+                         for s in ("Slowest files", "Seconds")
+                     ],
+                     floatfmt=".3f"))
+    click.echo("\nBuild timeline has been saved to %s" % trace_path)
+
+
 def print_processing_summary(results):
     tabular_data = []
     succeeded_nums = 0
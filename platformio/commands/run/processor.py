@@ -12,11 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from os import remove
+from os.path import isfile, join
+
 from platformio import exception, telemetry
 from platformio.commands.platform import \
     platform_install as cmd_platform_install
 from platformio.commands.test.processor import CTX_META_TEST_RUNNING_NAME
 from platformio.managers.platform import PlatformFactory
+from platformio.profiler import Profiler, load_trace_events
+from platformio.project.helpers import get_project_build_dir
 
 # pylint: disable=too-many-instance-attributes
 
@@ -46,6 +51,10 @@ class EnvironmentProcessor(object):
         if self.upload_port:
             # override upload port with a custom from CLI
             variables['upload_port'] = self.upload_port
+
+        if Profiler().enabled:
+            variables['profile_trace'] = join(get_project_build_dir(),
+                                              self.name, "profile-scons.json")
         return variables
 
     def get_build_targets(self):
@@ -66,14 +75,19 @@ class EnvironmentProcessor(object):
         if "monitor" in build_targets:
             build_targets.remove("monitor")
 
-        try:
-            p = PlatformFactory.newPlatform(self.options['platform'])
-        except exception.UnknownPlatform:
-            self.cmd_ctx.invoke(cmd_platform_install,
-                                platforms=[self.options['platform']],
-                                skip_default_package=True)
-            p = PlatformFactory.newPlatform(self.options['platform'])
+        with Profiler().phase("Platform"):
+            try:
+                p = PlatformFactory.newPlatform(self.options['platform'])
+            except exception.UnknownPlatform:
+                self.cmd_ctx.invoke(cmd_platform_install,
+                                    platforms=[self.options['platform']],
+                                    skip_default_package=True)
+                p = PlatformFactory.newPlatform(self.options['platform'])
 
+        if isfile(build_vars.get("profile_trace", "")):
+            remove(build_vars['profile_trace'])
         result = p.run(build_vars, build_targets, self.silent, self.verbose,
                        self.jobs)
+        if "profile_trace" in build_vars:
+            Profiler().extend(load_trace_events(build_vars['profile_trace']))
         return result['returncode'] == 0
@@ -15,7 +15,7 @@
 # pylint: disable=too-many-arguments, too-many-locals, too-many-branches
 
 from fnmatch import fnmatch
-from os import getcwd, listdir
+from os import getcwd, getenv, listdir
 from os.path import isdir, join
 from time import time
 
@@ -25,8 +25,12 @@ from tabulate import tabulate
 from platformio import exception, fs, util
 from platformio.commands.test.embedded import EmbeddedTestProcessor
 from platformio.commands.test.native import NativeTestProcessor
+from platformio.commands.test.reports import JsonLinesSink, JUnitSink
+from platformio.commands.test.scheduler import (TEST_JOB_ENVVAR, TestJob,
+                                                get_job_resources, run_jobs)
 from platformio.project.config import ProjectConfig
-from platformio.project.helpers import get_project_test_dir
+from platformio.project.helpers import (get_project_build_dir,
+                                        get_project_test_dir)
 
 
 @click.command("test", short_help="Unit Testing")
@@ -70,12 +74,28 @@ from platformio.project.helpers import get_project_test_dir
               default=None,
               type=click.IntRange(0, 1),
               help="Set initial DTR line state for Serial Monitor")
+@click.option("-j",
+              "--jobs",
+              type=click.IntRange(1),
+              default=1,
+              help="Process N tests at once. Tests with the same serial port "
+              "are not processed in parallel")
+@click.option("--junit-output-path",
+              type=click.Path(dir_okay=False, writable=True,
+                              resolve_path=True),
+              help="Save results in JUnit XML format")
+@click.option("--json-output-path",
+              type=click.Path(dir_okay=False, writable=True,
+                              resolve_path=True),
+              help="Save test events in JSON Lines format")
 @click.option("--verbose", "-v", is_flag=True)
 @click.pass_context
 def cli(  # pylint: disable=redefined-builtin
         ctx, environment, ignore, filter, upload_port, test_port, project_dir,
         project_conf, without_building, without_uploading, without_testing,
-        no_reset, monitor_rts, monitor_dtr, verbose):
+        no_reset, monitor_rts, monitor_dtr, jobs, junit_output_path,
+        json_output_path, verbose):
+    is_job = str(getenv(TEST_JOB_ENVVAR, "")).lower() == "true"
     with fs.cd(project_dir):
         test_dir = get_project_test_dir()
         if not isdir(test_dir):
@@ -86,68 +106,56 @@ def cli(  # pylint: disable=redefined-builtin
             project_conf or join(project_dir, "platformio.ini"))
         config.validate(envs=environment)
 
-        click.echo("Verbose mode can be enabled via `-v, --verbose` option")
-        click.secho("Collected %d items" % len(test_names), bold=True)
+        if not is_job:
+            click.echo(
+                "Verbose mode can be enabled via `-v, --verbose` option")
+            click.secho("Collected %d items" % len(test_names), bold=True)
+
+        sinks = create_sinks(junit_output_path, json_output_path)
+        options = dict(project_config=config,
+                       project_dir=project_dir,
+                       upload_port=upload_port,
+                       test_port=test_port,
+                       without_building=without_building,
+                       without_uploading=without_uploading,
+                       without_testing=without_testing,
+                       no_reset=no_reset,
+                       monitor_rts=monitor_rts,
+                       monitor_dtr=monitor_dtr,
+                       verbose=verbose,
+                       sinks=sinks)
 
         results = []
-        default_envs = config.default_envs()
+        scheduled = []
         for testname in test_names:
-
             for envname in config.envs():
-                section = f"env:{envname}"
-
-                # filter and ignore patterns
-                patterns = dict(filter=list(filter), ignore=list(ignore))
-                for key in patterns:
-                    patterns[key].extend(config.get(section, f"test_{key}", []))
-
-                skip_conditions = [
-                    environment and envname not in environment,
-                    not environment
-                    and default_envs
-                    and envname not in default_envs,
-                    testname != "*"
-                    and patterns['filter']
-                    and not any(
-                        fnmatch(testname, p) for p in patterns['filter']
-                    ),
-                    testname != "*"
-                    and any(fnmatch(testname, p) for p in patterns['ignore']),
-                ]
-                if any(skip_conditions):
-                    results.append({"env": envname, "test": testname})
+                results.append({"env": envname, "test": testname})
+                if is_test_skipped(config, testname, envname, environment,
+                                   filter, ignore):
+                    continue
+                if jobs > 1:
+                    scheduled.append(len(results) - 1)
                     continue
 
-                click.echo()
-                print_processing_header(testname, envname)
-
-                cls = (NativeTestProcessor
-                       if config.get(section, "platform") == "native" else
-                       EmbeddedTestProcessor)
-                tp = cls(
-                    ctx, testname, envname,
-                    dict(project_config=config,
-                         project_dir=project_dir,
-                         upload_port=upload_port,
-                         test_port=test_port,
-                         without_building=without_building,
-                         without_uploading=without_uploading,
-                         without_testing=without_testing,
-                         no_reset=no_reset,
-                         monitor_rts=monitor_rts,
-                         monitor_dtr=monitor_dtr,
-                         verbose=verbose))
-                result = {
-                    "env": envname,
-                    "test": testname,
-                    "duration": time(),
-                    "succeeded": tp.process()
-                }
-                result['duration'] = time() - result['duration']
-                results.append(result)
+                if not is_job:
+                    click.echo()
+                    print_processing_header(testname, envname)
 
+                result = process_test(ctx, results[-1], options)
+                if is_job:
+                    close_sinks(sinks)
+                    if result['succeeded'] is False:
+                        raise exception.ReturnErrorCode(1)
+                    return
                 print_processing_footer(result)
 
+        if scheduled:
+            process_jobs(config, results, scheduled, jobs, options,
+                         project_conf)
+
+    emit_suite_ends(sinks, results)
+    close_sinks(sinks)
+
     if without_testing:
         return
 
@@ -158,6 +166,116 @@ def cli(  # pylint: disable=redefined-builtin
         raise exception.ReturnErrorCode(1)
 
 
+def create_sinks(junit_output_path, json_output_path):
+    sinks = []
+    if junit_output_path:
+        sinks.append(JUnitSink(junit_output_path))
+    if json_output_path:
+        sinks.append(JsonLinesSink(json_output_path))
+    return sinks
+
+
+def is_test_skipped(  # pylint: disable=redefined-builtin
+        config, testname, envname, environment, filter, ignore):
+    section = f"env:{envname}"
+    default_envs = config.default_envs()
+
+    # filter and ignore patterns
+    patterns = dict(filter=list(filter), ignore=list(ignore))
+    for key in patterns:
+        patterns[key].extend(config.get(section, f"test_{key}", []))
+
+    skip_conditions = [
+        environment and envname not in environment,
+        not environment
+        and default_envs
+        and envname not in default_envs,
+        testname != "*"
+        and patterns['filter']
+        and not any(
+            fnmatch(testname, p) for p in patterns['filter']
+        ),
+        testname != "*"
+        and any(fnmatch(testname, p) for p in patterns['ignore']),
+    ]
+    return any(skip_conditions)
+
+
+def process_test(ctx, result, options):
+    """Process a test in the current process and update its `result`"""
+    section = f"env:{result['env']}"
+    cls = (NativeTestProcessor
+           if options['project_config'].get(section, "platform") == "native"
+           else EmbeddedTestProcessor)
+    tp = cls(ctx, result['test'], result['env'], options)
+    result['duration'] = time()
+    result['succeeded'] = tp.process()
+    result['duration'] = time() - result['duration']
+    return result
+
+
+def process_jobs(config, results, scheduled, nums, options, project_conf):
+    """Process tests from `results` with `scheduled` indexes in child
+    `pio test` processes"""
+    args = ["-d", options['project_dir']]
+    if project_conf:
+        args.extend(["-c", project_conf])
+    for name in ("upload_port", "test_port", "monitor_rts", "monitor_dtr"):
+        if options[name] is not None:
+            args.extend(["--%s" % name.replace("_", "-"), str(options[name])])
+    for name in ("without_building", "without_uploading", "without_testing",
+                 "no_reset", "verbose"):
+        if options[name]:
+            args.append("--%s" % name.replace("_", "-"))
+
+    jobs = {}
+    for index in scheduled:
+        result = results[index]
+        job_args = args + ["-e", result['env']]
+        if result['test'] != "*":
+            job_args.extend(["-f", result['test']])
+        job = TestJob(
+            result['test'], result['env'],
+            get_job_resources(config.items(env=result['env'], as_dict=True),
+                              options),
+            job_args)
+        jobs[job] = index
+
+    def _on_result(job, result):
+        # test events from a child process
+        for event in result.pop("events"):
+            if event['type'] != "suite_end":
+                emit_event(options['sinks'], event)
+        results[jobs[job]] = result
+        click.echo()
+        print_processing_header(job.test_name, job.env_name)
+        if result['output']:
+            click.echo(result['output'])
+        print_processing_footer(result)
+
+    click.secho("Processing %d tests in %d jobs" % (len(jobs), nums),
+                bold=True)
+    run_jobs(list(jobs), nums, _on_result, get_project_build_dir())
+
+
+def emit_suite_ends(sinks, results):
+    for result in results:
+        event = dict(type="suite_end", **result)
+        if event.get("output"):
+            event['output'] = click.unstyle(event['output'])
+        emit_event(sinks, event)
+
+
+def emit_event(sinks, event):
+    for sink in sinks:
+        sink(event)
+
+
+def close_sinks(sinks):
+    for sink in sinks:
+        sink.close()
+
+
 def get_test_names(test_dir):
     return [
         item
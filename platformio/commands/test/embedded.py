@@ -24,7 +24,8 @@ from platformio.managers.platform import PlatformFactory
 
 class EmbeddedTestProcessor(TestProcessorBase):
 
-    SERIAL_TIMEOUT = 600
+    # a timeout of a single read, see `get_timeout()` for a test timeout
+    SERIAL_TIMEOUT = 1
 
     def process(self):
         if not self.options['without_building']:
@@ -56,6 +57,7 @@ class EmbeddedTestProcessor(TestProcessorBase):
                    "please reset board (press reset button)")
         click.echo()
 
+        parser = self.create_parser()
         try:
             ser = serial.Serial(baudrate=self.get_baudrate(),
                                 timeout=self.SERIAL_TIMEOUT)
@@ -76,26 +78,14 @@ class EmbeddedTestProcessor(TestProcessorBase):
             ser.setRTS(True)
             sleep(0.1)
 
-        while True:
-            line = ser.readline().strip()
-
-            # fix non-ascii output from device
-            for i, c in enumerate(line[::-1]):
-                if not isinstance(c, int):
-                    c = ord(c)
-                if c > 127:
-                    line = line[-i:]
-                    break
-
-            if not line:
-                continue
-            if isinstance(line, bytes):
-                line = line.decode("utf8")
-            self.on_run_out(line)
-            if all(l in line for l in ("Tests", "Failures", "Ignored")):
-                break
+        while not parser.finished:
+            data = ser.read(ser.in_waiting or 1)
+            if data:
+                parser.feed(data)
+            elif parser.is_timed_out():
+                parser.on_timeout()
         ser.close()
-        return not self._run_failed
+        return not parser.failed
 
     def get_test_port(self):
         # if test port is specified manually or in config
@@ -12,11 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import subprocess
 from os.path import join
+from threading import Thread
 
-from platformio import fs, proc
+from platformio import exception, fs
 from platformio.commands.test.processor import TestProcessorBase
-from platformio.proc import LineBufferedAsyncPipe
 from platformio.project.helpers import get_project_build_dir
 
 
@@ -35,9 +37,30 @@ class NativeTestProcessor(TestProcessorBase):
     def run(self):
         with fs.cd(self.options['project_dir']):
             build_dir = get_project_build_dir()
-        result = proc.exec_command(
-            [join(build_dir, self.env_name, "program")],
-            stdout=LineBufferedAsyncPipe(self.on_run_out),
-            stderr=LineBufferedAsyncPipe(self.on_run_out))
-        assert "returncode" in result
-        return result['returncode'] == 0 and not self._run_failed
+        parser = self.create_parser()
+        p = subprocess.Popen([join(build_dir, self.env_name, "program")],
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT)
+        reader = Thread(target=self._read_output, args=(p.stdout, parser))
+        reader.daemon = True
+        reader.start()
+        try:
+            while reader.is_alive():
+                reader.join(0.1)
+                if parser.is_timed_out():
+                    p.kill()
+                    parser.on_timeout()
+                    break
+            returncode = p.wait()
+        except KeyboardInterrupt:
+            p.kill()
+            raise exception.AbortedByUser()
+        reader.join(1)
+        parser.close()
+        return returncode == 0 and not parser.failed
+
+    @staticmethod
+    def _read_output(stream, parser):
+        for data in iter(lambda: os.read(stream.fileno(), 4096), b""):
+            parser.feed(data)
+        stream.close()
@@ -0,0 +1,131 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from time import time
+
+
+class UnityParser(object):
+    """Incremental parser of Unity test runner output.
+
+    Output is fed in chunks of any size (serial port reads, pipe reads).
+    Each complete line is converted to an event and passed to sinks:
+
+    * ``{"type": "case", "name", "file", "line", "status", "message",
+      "duration"}`` where status is "PASSED", "FAILED" or "IGNORED"
+    * ``{"type": "summary", "tests", "failures", "ignored"}``
+    * ``{"type": "output", "text"}`` for other lines
+
+    Unity prints a result after a test case is finished, so a duration is a
+    time since the previous result (or Unity's own time when it is enabled
+    via UNITY_INCLUDE_EXEC_TIME). When `timeout` is set and no output is
+    received within it, `is_timed_out()` returns True."""
+
+    CASE_RE = re.compile(r"^(?P<file>(?:[A-Za-z]:)?[^:]+):(?P<line>\d+):"
+                         r"(?P<name>[^:\s]+):(?P<status>PASS|FAIL|IGNORE)"
+                         r"(?::\s*(?P<message>.*?))?"
+                         r"(?:\s+\((?P<duration>\d+) ms\))?$")
+    SUMMARY_RE = re.compile(
+        r"^(?P<tests>\d+) Tests (?P<failures>\d+) Failures "
+        r"(?P<ignored>\d+) Ignored")
+
+    STATUSES = {"PASS": "PASSED", "FAIL": "FAILED", "IGNORE": "IGNORED"}
+
+    def __init__(self, sinks, timeout=None, context=None):
+        self.sinks = sinks
+        self.timeout = timeout
+        self.context = context or {}
+        self.failed = False
+        self.finished = False
+        self.cases = []
+        self._buffer = b""
+        self._last_activity = time()
+        self._last_result = time()
+
+    def feed(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode("utf8")
+        if not data:
+            return
+        self._last_activity = time()
+        lines = (self._buffer + data).split(b"\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+
+    def close(self):
+        if self._buffer:
+            self.feed_line(self._buffer)
+            self._buffer = b""
+
+    def feed_line(self, line):
+        if isinstance(line, bytes):
+            line = line.decode("utf8", "replace")
+        if not self.cases:
+            # a garbage from bootloader or a board reset before results
+            line = line[line.rfind(u"\ufffd") + 1:]
+        line = line.strip()
+        if not line:
+            return None
+
+        match = self.CASE_RE.match(line)
+        if match:
+            return self.on_case(match)
+        match = self.SUMMARY_RE.match(line)
+        if match:
+            self.finished = True
+            return self.emit(
+                dict(type="summary",
+                     **{k: int(v) for k, v in match.groupdict().items()}))
+        return self.emit(dict(type="output", text=line))
+
+    def on_case(self, match):
+        now = time()
+        duration = match.group("duration")
+        event = dict(type="case",
+                     name=match.group("name"),
+                     file=match.group("file"),
+                     line=int(match.group("line")),
+                     status=self.STATUSES[match.group("status")],
+                     message=match.group("message") or None,
+                     duration=(int(duration) / 1000.0
+                               if duration else now - self._last_result))
+        self._last_result = now
+        self.cases.append(event)
+        if event['status'] == "FAILED":
+            self.failed = True
+        return self.emit(event)
+
+    def is_timed_out(self):
+        return bool(self.timeout and not self.finished
+                    and time() - self._last_activity > self.timeout)
+
+    def on_timeout(self):
+        self.failed = True
+        self.finished = True
+        event = dict(type="case",
+                     name="timeout",
+                     file=None,
+                     line=None,
+                     status="FAILED",
+                     message="No output within %d seconds" % self.timeout,
+                     duration=time() - self._last_result)
+        self.cases.append(event)
+        return self.emit(event)
+
+    def emit(self, event):
+        event.update(self.context)
+        for sink in self.sinks:
+            sink(event)
+        return event
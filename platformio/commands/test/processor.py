@@ -12,58 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import atexit
-from os import remove
-from os.path import isdir, isfile, join
-from string import Template
-
 import click
 
 from platformio import exception
-from platformio.project.helpers import get_project_test_dir
-
-TRANSPORT_OPTIONS = {
-    "arduino": {
-        "include": "#include <Arduino.h>",
-        "object": "",
-        "putchar": "Serial.write(c)",
-        "flush": "Serial.flush()",
-        "begin": "Serial.begin($baudrate)",
-        "end": "Serial.end()"
-    },
-    "mbed": {
-        "include": "#include <mbed.h>",
-        "object": "Serial pc(USBTX, USBRX);",
-        "putchar": "pc.putc(c)",
-        "flush": "",
-        "begin": "pc.baud($baudrate)",
-        "end": ""
-    },
-    "espidf": {
-        "include": "#include <stdio.h>",
-        "object": "",
-        "putchar": "putchar(c)",
-        "flush": "fflush(stdout)",
-        "begin": "",
-        "end": ""
-    },
-    "native": {
-        "include": "#include <stdio.h>",
-        "object": "",
-        "putchar": "putchar(c)",
-        "flush": "fflush(stdout)",
-        "begin": "",
-        "end": ""
-    },
-    "custom": {
-        "include": '#include "unittest_transport.h"',
-        "object": "",
-        "putchar": "unittest_uart_putchar(c)",
-        "flush": "unittest_uart_flush()",
-        "begin": "unittest_uart_begin()",
-        "end": "unittest_uart_end()"
-    }
-}
+from platformio.commands.test.parser import UnityParser
+from platformio.commands.test.reports import ConsoleSink
 
 CTX_META_TEST_IS_RUNNING = f"{__name__}.test_running"
 CTX_META_TEST_RUNNING_NAME = f"{__name__}.test_running_name"
@@ -72,6 +25,7 @@ CTX_META_TEST_RUNNING_NAME = f"{__name__}.test_running_name"
 class TestProcessorBase(object):
 
     DEFAULT_BAUDRATE = 115200
+    DEFAULT_TIMEOUT = 60  # in seconds, without output from a test runner
 
     def __init__(self, cmd_ctx, testname, envname, options):
         self.cmd_ctx = cmd_ctx
@@ -81,33 +35,23 @@ class TestProcessorBase(object):
         self.env_name = envname
         self.env_options = options['project_config'].items(env=envname,
                                                            as_dict=True)
-        self._run_failed = False
-        self._outputcpp_generated = False
-
-    def get_transport(self):
-        if self.env_options.get("platform") == "native":
-            transport = "native"
-        elif "framework" in self.env_options:
-            transport = self.env_options.get("framework")[0]
-        if "test_transport" in self.env_options:
-            transport = self.env_options['test_transport']
-        if transport not in TRANSPORT_OPTIONS:
-            raise exception.PlatformioException(
-                f"Unknown Unit Test transport `{transport}`"
-            )
-        return transport.lower()
 
     def get_baudrate(self):
         return int(self.env_options.get("test_speed", self.DEFAULT_BAUDRATE))
 
+    def get_timeout(self):
+        return int(self.env_options.get("test_timeout", self.DEFAULT_TIMEOUT))
+
+    def create_parser(self):
+        return UnityParser([ConsoleSink()] + self.options.get("sinks", []),
+                           timeout=self.get_timeout(),
+                           context=dict(env=self.env_name,
+                                        test=self.test_name))
+
     def print_progress(self, text):
         click.secho(text, bold=self.options.get("verbose"))
 
     def build_or_upload(self, target):
-        if not self._outputcpp_generated:
-            self.generate_outputcpp(get_project_test_dir())
-            self._outputcpp_generated = True
-
         if self.test_name != "*":
             self.cmd_ctx.meta[CTX_META_TEST_RUNNING_NAME] = self.test_name
 
@@ -128,68 +72,3 @@ class TestProcessorBase(object):
 
     def run(self):
         raise NotImplementedError
-
-    def on_run_out(self, line):
-        line = line.strip()
-        if line.endswith(":PASS"):
-            click.echo("%s\t[%s]" %
-                       (line[:-5], click.style("PASSED", fg="green")))
-        elif ":FAIL" in line:
-            self._run_failed = True
-            click.echo("%s\t[%s]" % (line, click.style("FAILED", fg="red")))
-        else:
-            click.echo(line)
-
-    def generate_outputcpp(self, test_dir):
-        assert isdir(test_dir)
-
-        cpp_tpl = "\n".join([
-            "$include",
-            "#include <output_export.h>",
-            "",
-            "$object",
-            "",
-            "#ifdef __GNUC__",
-            "void output_start(unsigned int baudrate __attribute__((unused)))",
-            "#else",
-            "void output_start(unsigned int baudrate)",
-            "#endif",
-            "{",
-            "    $begin;",
-            "}",
-            "",
-            "void output_char(int c)",
-            "{",
-            "    $putchar;",
-            "}",
-            "",
-            "void output_flush(void)",
-            "{",
-            "    $flush;",
-            "}",
-            "",
-            "void output_complete(void)",
-            "{",
-            "   $end;",
-            "}"
-        ])  # yapf: disable
-
-        def delete_tmptest_file(file_):
-            try:
-                remove(file_)
-            except:  # pylint: disable=bare-except
-                if isfile(file_):
-                    click.secho(
-                        "Warning: Could not remove temporary file '%s'. "
-                        "Please remove it manually." % file_,
-                        fg="yellow")
-
-        tpl = Template(cpp_tpl).substitute(
-            TRANSPORT_OPTIONS[self.get_transport()])
-        data = Template(tpl).substitute(baudrate=self.get_baudrate())
-
-        tmp_file = join(test_dir, "output_export.cpp")
-        with open(tmp_file, "w") as f:
-            f.write(data)
-
-        atexit.register(delete_tmptest_file, tmp_file)
@@ -0,0 +1,163 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Sinks of test events, see `UnityParser`. The command adds
+# `{"type": "suite_end", "env", "test", "succeeded", "duration"}` event
+# when a test is processed or skipped
+
+import json
+from os.path import isfile
+from xml.etree import ElementTree
+
+import click
+
+
+class ConsoleSink(object):
+
+    def __call__(self, event):
+        if event['type'] == "output":
+            click.echo(event['text'])
+        elif event['type'] == "summary":
+            click.echo("%d Tests %d Failures %d Ignored" %
+                       (event['tests'], event['failures'], event['ignored']))
+        elif event['type'] == "case":
+            location = event['name']
+            if event['file']:
+                location = "%s:%d:%s" % (event['file'], event['line'],
+                                         event['name'])
+            message = ": %s" % event['message'] if event['message'] else ""
+            if event['status'] == "PASSED":
+                click.echo("%s\t[%s]" %
+                           (location, click.style("PASSED", fg="green")))
+            elif event['status'] == "FAILED":
+                click.echo("%s:FAIL%s\t[%s]" %
+                           (location, message, click.style("FAILED",
+                                                           fg="red")))
+            else:
+                click.echo("%s:IGNORE%s" % (location, message))
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._fp = open(path, "w")
+
+    def __call__(self, event):
+        self._fp.write(json.dumps(event) + "\n")
+        self._fp.flush()
+
+    def close(self):
+        self._fp.close()
+
+
+def read_json_lines(path):
+    events = []
+    if not isfile(path):
+        return events
+    with open(path) as fp:
+        for line in fp:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                pass
+    return events
+
+
+class JUnitSink(object):
+    """A test suite per test and environment, a test case per Unity test"""
+
+    def __init__(self, path):
+        self.path = path
+        self._suites = {}
+
+    def _get_suite(self, event):
+        key = (event['env'], event['test'])
+        if key not in self._suites:
+            self._suites[key] = dict(env=event['env'],
+                                     test=event['test'],
+                                     cases=[],
+                                     output=[],
+                                     succeeded=None,
+                                     duration=0)
+        return self._suites[key]
+
+    def __call__(self, event):
+        suite = self._get_suite(event)
+        if event['type'] == "case":
+            suite['cases'].append(event)
+        elif event['type'] == "output":
+            suite['output'].append(event['text'])
+        elif event['type'] == "suite_end":
+            suite['succeeded'] = event.get("succeeded")
+            suite['duration'] = event.get("duration") or 0
+            # output of a child process of `pio test --jobs`
+            if not suite['output'] and event.get("output"):
+                suite['output'].append(event['output'])
+
+    def close(self):
+        root = ElementTree.Element("testsuites")
+        for key in sorted(self._suites):
+            self._append_suite(root, self._suites[key])
+        ElementTree.ElementTree(root).write(self.path,
+                                            encoding="utf-8",
+                                            xml_declaration=True)
+
+    @staticmethod
+    def _append_suite(root, suite):
+        cases = suite['cases']
+        status = {True: "PASSED", False: "FAILED", None: "IGNORED"}
+        # nothing was tested (skipped test, failed build) or a test runner
+        # failed without failed test cases
+        if not cases or (suite['succeeded'] is False and
+                         all(c['status'] != "FAILED" for c in cases)):
+            cases = cases + [
+                dict(name=suite['test'],
+                     file=None,
+                     status=status[suite['succeeded']],
+                     message=None,
+                     duration=suite['duration'])
+            ]
+        element = ElementTree.SubElement(
+            root,
+            "testsuite",
+            name="%s:%s" % (suite['env'], suite['test']),
+            tests=str(len(cases)),
+            failures=str(len([c for c in cases
+                              if c['status'] == "FAILED"])),
+            skipped=str(len([c for c in cases
+                             if c['status'] == "IGNORED"])),
+            time="%.3f" % suite['duration'])
+        for case in cases:
+            attrs = dict(name=case['name'],
+                         classname="%s.%s" % (suite['env'], suite['test']),
+                         time="%.3f" % (case['duration'] or 0))
+            if case['file']:
+                attrs.update(file=case['file'], line=str(case['line']))
+            case_element = ElementTree.SubElement(element, "testcase",
+                                                  **attrs)
+            if case['status'] == "FAILED":
+                ElementTree.SubElement(case_element,
+                                       "failure",
+                                       message=case['message'] or "FAILED")
+            elif case['status'] == "IGNORED":
+                ElementTree.SubElement(case_element,
+                                       "skipped",
+                                       message=case['message'] or "")
+        if suite['output']:
+            ElementTree.SubElement(element, "system-out").text = "\n".join(
+                suite['output'])
@@ -0,0 +1,115 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from tempfile import mkstemp
+from time import time
+
+from platformio import proc
+from platformio.commands.test.reports import read_json_lines
+
+# A child process of `pio test --jobs` processes a single test and prints
+# only the output of a test processor, the parent prints a summary
+TEST_JOB_ENVVAR = "PLATFORMIO_TEST_JOB"
+
+
+class TestJob(object):
+    """A pair of test and environment processed by a child `pio test`.
+
+    Jobs which share a resource (a serial port of a board) never run at
+    the same time. Each running job has own build directory, so tests of
+    the same environment are built at once."""
+
+    def __init__(self, testname, envname, resources, args):
+        self.test_name = testname
+        self.env_name = envname
+        self.resources = set(resources)
+        self.args = args
+        self.output = None
+
+    def run(self, build_dir=None):
+        env = os.environ.copy()
+        env[TEST_JOB_ENVVAR] = "true"
+        env['PLATFORMIO_FORCE_COLOR'] = "true"
+        if build_dir:
+            env['PLATFORMIO_BUILD_DIR'] = build_dir
+        fd, events_path = mkstemp(prefix="pio-test-", suffix=".jsonl")
+        os.close(fd)
+        start = time()
+        try:
+            result = proc.exec_command(
+                [proc.get_pythonexe_path(), "-m", "platformio", "test"] +
+                self.args + ["--json-output-path", events_path],
+                stderr=subprocess.STDOUT,
+                env=env)
+            events = read_json_lines(events_path)
+        finally:
+            os.remove(events_path)
+        self.output = result['out']
+        return {
+            "env": self.env_name,
+            "test": self.test_name,
+            "duration": time() - start,
+            "succeeded": result['returncode'] == 0,
+            "output": self.output,
+            "events": events
+        }
+
+
+def get_job_resources(env_options, options):
+    resources = []
+    if env_options.get("platform") == "native":
+        return resources
+    if not options['without_uploading']:
+        resources.append("port:%s" % (options['upload_port']
+                                      or env_options.get("upload_port")
+                                      or "auto"))
+    if not options['without_testing']:
+        resources.append("port:%s" % (options['test_port']
+                                      or env_options.get("test_port")
+                                      or "auto"))
+    return resources
+
+
+def run_jobs(jobs, nums, on_result, build_dir=None):
+    """Run jobs in `nums` threads keeping the order of submission when
+    resources allow. `on_result` is called in the caller's thread.
+
+    A job of the first slot uses the project `build_dir`, other slots
+    reuse their own "<build_dir>-job<N>" directories between runs."""
+    pending = list(jobs)
+    running = {}
+    busy = set()
+    slots = list(range(nums))
+    with ThreadPoolExecutor(max_workers=nums) as executor:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= nums:
+                    break
+                if job.resources & busy:
+                    continue
+                pending.remove(job)
+                busy |= job.resources
+                slot = slots.pop(0)
+                job_build_dir = ("%s-job%d" % (build_dir, slot)
+                                 if build_dir and slot else None)
+                running[executor.submit(job.run, job_build_dir)] = (job, slot)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, slot = running.pop(future)
+                busy -= job.resources
+                slots.append(slot)
+                on_result(job, future.result())
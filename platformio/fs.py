@@ -18,6 +18,7 @@ import re
 import shutil
 import stat
 import sys
+from fnmatch import fnmatch
 from glob import glob
 
 import click
@@ -116,20 +117,156 @@ def path_endswith_ext(path, extensions):
     return any(path.endswith(f".{ext}") for ext in extensions)
 
 
-def match_src_files(src_dir, src_filter=None, src_exts=None):
+class SrcFilter(object):
+    """Compiled `+<pattern> -<pattern>` source filter.
+
+    Every pattern keeps `glob` semantics (a matched directory contributes all
+    files below it, magic components skip hidden entries), but the source
+    tree is walked once and subtrees whose result is already known are not
+    listed at all, e.g. `.git` for the default `-<.git/>` filter.
+    """
+
+    PATTERN_RE = re.compile(r"(\+|\-)<([^>]+)>")
+
+    # pattern state for a directory
+    NONE = 0  # can not match anything below
+    FULL = 1  # matches the directory itself, so everything below
+    PARTIAL = 2  # can match something below
+
+    _cache = {}
+
+    def __init__(self, src_filter):
+        self.patterns = []
+        self.supported = True
+        for (action, pattern) in self.PATTERN_RE.findall(src_filter):
+            parts = [p for p in pattern.split(os.sep) if p]
+            # relative to the parent or current directory, leave it to glob
+            if not parts or os.path.isabs(pattern) or set(parts) & {".", ".."}:
+                self.supported = False
+            self.patterns.append(
+                dict(include=action == "+",
+                     parts=[(p, glob_has_magic(p)) for p in parts],
+                     dir_only=pattern.endswith(os.sep)))
+
+    @staticmethod
+    def _match_part(name, part):
+        pattern, magic = part
+        if not magic:
+            return os.path.normcase(name) == os.path.normcase(pattern)
+        if name.startswith(".") and not pattern.startswith("."):
+            return False
+        return fnmatch(name, pattern)
+
+    def _pattern_state(self, pattern, relparts, isdir):
+        parts = pattern['parts']
+        if not parts or len(relparts) > len(parts):
+            return self.NONE
+        for name, part in zip(relparts, parts):
+            if not self._match_part(name, part):
+                return self.NONE
+        if len(relparts) < len(parts):
+            return self.PARTIAL if isdir else self.NONE
+        if pattern['dir_only'] and not isdir:
+            return self.NONE
+        return self.FULL
+
+    def _next_states(self, states, relparts, isdir):
+        return [
+            state if state != self.PARTIAL else self._pattern_state(
+                pattern, relparts, isdir)
+            for state, pattern in zip(states, self.patterns)
+        ]
+
+    def _resolve(self, states):
+        """Result for a whole subtree or None when it is not known yet"""
+        result = False
+        for state, pattern in zip(states, self.patterns):
+            if state == self.PARTIAL:
+                return None
+            if state == self.FULL:
+                result = pattern['include']
+        return result
+
+    def match(self, src_dir, src_exts=None):
+        key = (src_dir, tuple(
+            (p['include'], tuple(p['parts']), p['dir_only'])
+            for p in self.patterns), tuple(src_exts or []))
+        cached = SrcFilter._cache.get(key)
+        if cached and all(
+                os.path.isdir(path) and os.path.getmtime(path) == mtime
+                for path, mtime in cached['dirs'].items()):
+            return list(cached['items'])
+
+        dirs = {}
+        items = []
+        self._walk(src_dir, [], [self.PARTIAL] * len(self.patterns), src_exts,
+                   dirs, items)
+        items.sort()
+        SrcFilter._cache[key] = dict(dirs=dirs, items=items)
+        return list(items)
+
+    def _walk(  # pylint: disable=too-many-arguments
+            self, path, relparts, states, src_exts, dirs, items):
+        try:
+            dirs[path] = os.path.getmtime(path)
+            entries = sorted(os.listdir(path))
+        except OSError:
+            return
+        for name in entries:
+            item_path = os.path.join(path, name)
+            item_relparts = relparts + [name]
+            isdir = os.path.isdir(item_path)
+            item_states = self._next_states(states, item_relparts, isdir)
+            result = self._resolve(item_states)
+            if isdir:
+                if result is False:
+                    continue  # prune excluded subtree
+                if result is True:
+                    self._walk_all(
+                        item_path,
+                        len(item_path) - len(os.sep.join(item_relparts)),
+                        src_exts, dirs, items)
+                else:
+                    self._walk(item_path, item_relparts, item_states,
+                               src_exts, dirs, items)
+            elif result and (not src_exts
+                             or path_endswith_ext(name, src_exts)):
+                items.append(os.sep.join(item_relparts))
+
+    @staticmethod
+    def _walk_all(path, prefix_len, src_exts, dirs, items):
+        for root, _, files in os.walk(path, followlinks=True):
+            dirs[root] = os.path.getmtime(root)
+            for f in files:
+                if not src_exts or path_endswith_ext(f, src_exts):
+                    items.append(os.path.join(root, f)[prefix_len:])
+
+
+def glob_has_magic(pattern):
+    return any(c in pattern for c in "*?[")
 
-    def _append_build_item(items, item, src_dir):
-        if not src_exts or path_endswith_ext(item, src_exts):
-            items.add(item.replace(src_dir + os.sep, ""))
 
+def match_src_files(src_dir, src_filter=None, src_exts=None):
     src_filter = src_filter or ""
     if isinstance(src_filter, (list, tuple)):
         src_filter = " ".join(src_filter)
 
-    matches = set()
     # correct fs directory separator
     src_filter = src_filter.replace("/", os.sep).replace("\\", os.sep)
-    for (action, pattern) in re.findall(r"(\+|\-)<([^>]+)>", src_filter):
+    compiled = SrcFilter(src_filter)
+    if compiled.supported and os.path.isdir(src_dir):
+        return compiled.match(src_dir, src_exts)
+    return _match_src_files_glob(src_dir, src_filter, src_exts)
+
+
+def _match_src_files_glob(src_dir, src_filter, src_exts=None):
+
+    def _append_build_item(items, item, src_dir):
+        if not src_exts or path_endswith_ext(item, src_exts):
+            items.add(item.replace(src_dir + os.sep, ""))
+
+    matches = set()
+    for (action, pattern) in SrcFilter.PATTERN_RE.findall(src_filter):
         items = set()
         for item in glob(os.path.join(glob_escape(src_dir), pattern)):
             if os.path.isdir(item):
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import threading
 from os import remove
 from os.path import abspath, exists, getmtime
 from time import sleep, time
@@ -34,18 +36,84 @@ except ImportError:
     except ImportError:
         LOCKFILE_CURRENT_INTERFACE = None
 
+# contention statistics per lock path, see `get_contention_stats()`
+CONTENTION_STATS = {}
+
+
+def get_contention_stats(path=None):
+    if path:
+        return CONTENTION_STATS.get(f"{abspath(path)}.lock")
+    return CONTENTION_STATS
+
 
 class LockFileExists(Exception):
     pass
 
 
 class LockFile(object):
+    """Inter-process lock based on `flock` (or `msvcrt.locking` on Windows).
 
-    def __init__(self, path, timeout=LOCKFILE_TIMEOUT, delay=LOCKFILE_DELAY):
+    With `fcntl` the waiting is done by the kernel: a helper thread blocks in
+    `flock` and the caller waits for it with a timeout, so the lock is taken
+    as soon as it is released. Shared (`shared=True`) locks may be held by
+    many readers at the same time. Nested locks of the same path within a
+    thread are re-entrant, a shared lock is upgraded to an exclusive one for
+    a nested exclusive lock.
+    """
+
+    # {(lock_path, thread_id): [fp, shared, counter]} held by this process
+    _held = {}
+    _held_lock = threading.Lock()
+
+    def __init__(self,
+                 path,
+                 timeout=LOCKFILE_TIMEOUT,
+                 delay=LOCKFILE_DELAY,
+                 shared=False):
         self.timeout = timeout
         self.delay = delay
+        self.shared = shared
         self._lock_path = f"{abspath(path)}.lock"
         self._fp = None
+        self._nested = False
+        self._upgraded = False
+        self._key = None
+        self.wait_time = 0
+        self.holder_pid = None
+
+    @property
+    def _flock_operation(self):
+        return fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+
+    def _open(self):
+        # do not truncate a file which can be held by another process
+        return open(self._lock_path, "a+")
+
+    def _is_actual(self, fp):
+        # the holder could remove the lock file while we were waiting for it
+        try:
+            return os.fstat(fp.fileno()).st_ino == os.stat(
+                self._lock_path).st_ino
+        except OSError:
+            return False
+
+    def _read_holder_pid(self):
+        try:
+            with open(self._lock_path) as fp:
+                return int(fp.read().strip() or 0) or None
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_holder_pid(self):
+        if self.shared or LOCKFILE_CURRENT_INTERFACE is None:
+            return
+        try:
+            self._fp.seek(0)
+            self._fp.truncate()
+            self._fp.write(str(os.getpid()))
+            self._fp.flush()
+        except (IOError, OSError):
+            pass
 
     def _lock(self):
         if not LOCKFILE_CURRENT_INTERFACE and exists(self._lock_path):
@@ -56,40 +124,192 @@ class LockFile(object):
                 remove(self._lock_path)
             except:  # pylint: disable=bare-except
                 pass
-        self._fp = open(self._lock_path, "w")
+        fp = self._open()
         try:
             if LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_FCNTL:
-                fcntl.flock(self._fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(fp.fileno(), self._flock_operation | fcntl.LOCK_NB)
             elif LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_MSVCRT:
-                msvcrt.locking(self._fp.fileno(), msvcrt.LK_NBLCK, 1)
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_NBLCK, 1)
         except IOError:
-            self._fp = None
+            fp.close()
+            raise LockFileExists
+        if (LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_FCNTL
+                and not self._is_actual(fp)):
+            fp.close()
+            raise LockFileExists
+        self._fp = fp
+        return True
+
+    def _lock_blocking(self, timeout):
+        """Wait for `flock` in a helper thread, the calling thread is woken
+        up as soon as the lock is granted or `timeout` expires."""
+        state = {"fp": None, "abandoned": False, "error": None}
+        state_lock = threading.Lock()
+        fp = self._open()
+
+        def _waiter():
+            try:
+                fcntl.flock(fp.fileno(), self._flock_operation)
+            except (IOError, OSError) as e:
+                state['error'] = e
+            with state_lock:
+                if state['abandoned'] or state['error']:
+                    fp.close()  # closing the descriptor releases the lock
+                else:
+                    state['fp'] = fp
+
+        thread = threading.Thread(target=_waiter)
+        thread.daemon = True
+        thread.start()
+        thread.join(timeout)
+        with state_lock:
+            if not state['fp']:
+                state['abandoned'] = True
+                raise LockFileExists
+        if not self._is_actual(fp):
+            fp.close()
             raise LockFileExists
+        self._fp = fp
         return True
 
     def _unlock(self):
         if not self._fp:
-            return
+            return False
+        is_last = True
         if LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_FCNTL:
+            # remove the lock file only when nobody else holds it
+            try:
+                fcntl.flock(self._fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                is_last = False
+            if is_last and exists(self._lock_path):
+                try:
+                    remove(self._lock_path)
+                except:  # pylint: disable=bare-except
+                    pass
             fcntl.flock(self._fp.fileno(), fcntl.LOCK_UN)
         elif LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_MSVCRT:
+            self._fp.seek(0)
             msvcrt.locking(self._fp.fileno(), msvcrt.LK_UNLCK, 1)
         self._fp.close()
         self._fp = None
+        return is_last
+
+    @property
+    def _held_key(self):
+        return (self._lock_path, threading.current_thread().ident)
+
+    def _acquire_nested(self):
+        with LockFile._held_lock:
+            self._key = self._held_key
+            item = LockFile._held.get(self._key)
+            if not item:
+                return False
+            # exclusive lock covers a nested shared one, a shared lock is
+            # upgraded for a nested exclusive one
+            upgrade = item[1] and not self.shared
+        if upgrade and LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_FCNTL:
+            self._convert(item[0], fcntl.LOCK_EX)
+        with LockFile._held_lock:
+            if upgrade:
+                item[1] = False
+                self._upgraded = True
+            item[2] += 1
+            self._nested = True
+            return True
+
+    def _convert(self, fp, operation):
+        # a failed non-blocking conversion may drop the held lock, so it is
+        # retried until the timeout and a shared lock is restored on failure
+        start = time()
+        while True:
+            try:
+                fcntl.flock(fp.fileno(), operation | fcntl.LOCK_NB)
+                return
+            except IOError:
+                pass
+            if time() - start > self.timeout:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_SH)
+                raise exception.LockFileTimeoutError()
+            sleep(self.delay)
+
+    def _register_held(self):
+        with LockFile._held_lock:
+            self._key = self._held_key
+            LockFile._held[self._key] = [self._fp, self.shared, 1]
 
     def acquire(self):
-        elapsed = 0
-        while elapsed < self.timeout:
+        if self._fp or self._nested:
+            return True
+        if self._acquire_nested():
+            return True
+
+        start = time()
+        contended = False
+        while True:
             try:
-                return self._lock()
+                self._lock()
+                break
             except LockFileExists:
-                sleep(self.delay)
-                elapsed += self.delay
+                pass
+            if not contended:
+                contended = True
+                self.holder_pid = self._read_holder_pid()
+            remaining = self.timeout - (time() - start)
+            if remaining <= 0:
+                self._update_stats(contended, time() - start)
+                raise exception.LockFileTimeoutError()
+            if LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_FCNTL:
+                try:
+                    self._lock_blocking(remaining)
+                    break
+                except LockFileExists:
+                    continue
+            sleep(self.delay)
+
+        self.wait_time = time() - start
+        self._update_stats(contended, self.wait_time)
+        self._write_holder_pid()
+        self._register_held()
+        return True
 
-        raise exception.LockFileTimeoutError()
+    def _update_stats(self, contended, wait_time):
+        stats = CONTENTION_STATS.setdefault(
+            self._lock_path,
+            dict(acquisitions=0, contended=0, wait_time=0, max_wait_time=0,
+                 last_holder_pid=None))
+        stats['acquisitions'] += 1
+        if not contended:
+            return
+        stats['contended'] += 1
+        stats['wait_time'] += wait_time
+        stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+        stats['last_holder_pid'] = self.holder_pid
 
     def release(self):
-        self._unlock()
+        if self._nested:
+            with LockFile._held_lock:
+                item = LockFile._held.get(self._key)
+                if item:
+                    item[2] -= 1
+                    if self._upgraded:
+                        item[1] = True
+                        if (LOCKFILE_CURRENT_INTERFACE ==
+                                LOCKFILE_INTERFACE_FCNTL):
+                            fcntl.flock(item[0].fileno(), fcntl.LOCK_SH)
+            self._nested = False
+            self._upgraded = False
+            return
+        if not self._fp:
+            return
+        with LockFile._held_lock:
+            item = LockFile._held.get(self._key)
+            if item and item[0] is self._fp:
+                del LockFile._held[self._key]
+        if (not self._unlock()
+                or LOCKFILE_CURRENT_INTERFACE == LOCKFILE_INTERFACE_FCNTL):
+            return
         if exists(self._lock_path):
             try:
                 remove(self._lock_path)
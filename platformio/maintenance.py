@@ -17,18 +17,28 @@ from os.path import join
 from time import time
 
 import click
-import semantic_version
 
 from platformio import __version__, app, exception, fs, telemetry, util
 from platformio.commands import PlatformioCLI
-from platformio.commands.lib import CTX_META_STORAGE_DIRS_KEY
-from platformio.commands.lib import lib_update as cmd_lib_update
-from platformio.commands.platform import platform_update as cmd_platform_update
-from platformio.commands.upgrade import get_latest_version
-from platformio.managers.core import update_core_packages
-from platformio.managers.lib import LibraryManager
-from platformio.managers.platform import PlatformFactory, PlatformManager
-from platformio.proc import is_ci, is_container
+from platformio.proc import (copy_pythonpath_to_osenv, get_pythonexe_path,
+                             is_ci, is_container, spawn_detached_process)
+
+# Package managers, commands and `semantic_version` are imported inside of
+# the functions which use them, the checks run rarely and most of the
+# commands do not need these modules
+
+# Checks for upgrades and updates run in a detached process, the results
+# are saved to the state and shown by the next command
+UPDATE_CHECKS = (
+    ("platformio", "platformio_upgrade"),
+    ("platforms", "platforms_update"),
+    ("libraries", "libraries_update"),
+)
+
+
+def _parse_version(version):
+    import semantic_version  # pylint: disable=import-outside-toplevel
+    return semantic_version.Version.coerce(util.pepver_to_semver(version))
 
 
 def on_platformio_start(ctx, force, caller):
@@ -46,15 +56,13 @@ def on_platformio_end(ctx, result):  # pylint: disable=unused-argument
         return
 
     try:
-        check_platformio_upgrade()
-        check_internal_updates(ctx, "platforms")
-        check_internal_updates(ctx, "libraries")
-    except (exception.InternetIsOffline, exception.GetLatestVersionError,
-            exception.APIRequestError):
+        show_update_notices(ctx)
+    except (exception.InternetIsOffline, exception.APIRequestError):
         click.secho(
-            "Failed to check for PlatformIO upgrades. "
+            "Failed to update PlatformIO packages. "
             "Please check your Internet connection.",
             fg="red")
+    start_update_checker()
 
 
 def on_platformio_exception(e):
@@ -80,12 +88,10 @@ def set_caller(caller=None):
 class Upgrader(object):
 
     def __init__(self, from_version, to_version):
-        self.from_version = semantic_version.Version.coerce(
-            util.pepver_to_semver(from_version))
-        self.to_version = semantic_version.Version.coerce(
-            util.pepver_to_semver(to_version))
+        self.from_version = _parse_version(from_version)
+        self.to_version = _parse_version(to_version)
 
-        self._upgraders = [(semantic_version.Version("3.5.0-a.2"),
+        self._upgraders = [(_parse_version("3.5.0-a.2"),
                             self._update_dev_platforms)]
 
     def run(self, ctx):
@@ -102,6 +108,9 @@ class Upgrader(object):
 
     @staticmethod
     def _update_dev_platforms(ctx):
+        # pylint: disable=import-outside-toplevel
+        from platformio.commands.platform import \
+            platform_update as cmd_platform_update
         ctx.invoke(cmd_platform_update)
         return True
 
@@ -114,9 +123,7 @@ def after_upgrade(ctx):
 
     if last_version == "0.0.0":
         app.set_state_item("last_version", __version__)
-    elif semantic_version.Version.coerce(util.pepver_to_semver(
-            last_version)) > semantic_version.Version.coerce(
-                util.pepver_to_semver(__version__)):
+    elif _parse_version(last_version) > _parse_version(__version__):
         click.secho("*" * terminal_width, fg="yellow")
         click.secho(
             f"Obsolete PIO Core v{__version__} is used (previous was {last_version})",
@@ -131,6 +138,9 @@ def after_upgrade(ctx):
         click.secho("*" * terminal_width, fg="yellow")
         return
     else:
+        # pylint: disable=import-outside-toplevel
+        from platformio.managers.core import update_core_packages
+
         click.secho("Please wait while upgrading PlatformIO...", fg="yellow")
         app.clean_cache()
 
@@ -178,26 +188,113 @@ def after_upgrade(ctx):
     click.echo("")
 
 
-def check_platformio_upgrade():
+def get_due_update_checks():
     last_check = app.get_state_item("last_check", {})
-    interval = int(app.get_setting("check_platformio_interval")) * 3600 * 24
-    if (time() - interval) < last_check.get("platformio_upgrade", 0):
-        return
+    result = []
+    for what, key in UPDATE_CHECKS:
+        interval = int(app.get_setting(f"check_{what}_interval")) * 3600 * 24
+        if time() - interval >= last_check.get(key, 0):
+            result.append(what)
+    return result
 
-    last_check['platformio_upgrade'] = int(time())
+
+def start_update_checker():
+    checks = get_due_update_checks()
+    if not checks:
+        return None
+
+    # mark checks as done before spawning, so parallel commands do not
+    # start the same checks again
+    last_check = app.get_state_item("last_check", {})
+    for what, key in UPDATE_CHECKS:
+        if what in checks:
+            last_check[key] = int(time())
     app.set_state_item("last_check", last_check)
 
-    util.internet_on(raise_exception=True)
+    copy_pythonpath_to_osenv()
+    return spawn_detached_process([
+        get_pythonexe_path(), "-c",
+        "from platformio.maintenance import check_updates; "
+        "check_updates(%r)" % checks
+    ])
 
-    # Update PlatformIO's Core packages
-    update_core_packages(silent=True)
 
-    latest_version = get_latest_version()
-    if semantic_version.Version.coerce(util.pepver_to_semver(
-            latest_version)) <= semantic_version.Version.coerce(
-                util.pepver_to_semver(__version__)):
+def check_updates(checks):
+    """Run the checks and save found updates to the state. It is called by
+    a background process, a command never waits for the network."""
+    notices = {}
+    try:
+        util.internet_on(raise_exception=True)
+        if "platformio" in checks:
+            notices['core_packages'] = check_core_packages()
+            notices['platformio'] = check_platformio_upgrade()
+        for what in ("platforms", "libraries"):
+            if what in checks:
+                notices[what] = check_internal_updates(what)
+    except (exception.InternetIsOffline, exception.GetLatestVersionError,
+            exception.APIRequestError):
+        notices['failed'] = True
+
+    notices = {k: v for k, v in notices.items() if v}
+    if notices:
+        # fresh results override not shown notices of a previous check
+        app.update_state_item("update_notices",
+                              lambda stored: dict(stored or {}, **notices))
+    return notices
+
+
+def show_update_notices(ctx):
+    notices = app.get_state_item("update_notices")
+    if not notices:
         return
+    app.delete_state_item("update_notices")
 
+    if notices.get("failed"):
+        click.secho(
+            "Failed to check for PlatformIO upgrades. "
+            "Please check your Internet connection.",
+            fg="red")
+    if notices.get("core_packages"):
+        # pylint: disable=import-outside-toplevel
+        from platformio.managers.core import update_core_packages
+        update_core_packages(silent=True)
+    latest_version = notices.get("platformio")
+    if latest_version and (_parse_version(latest_version) > _parse_version(
+            __version__)):
+        show_upgrade_notice(latest_version)
+    for what in ("platforms", "libraries"):
+        if notices.get(what):
+            show_internal_updates(ctx, what, notices[what])
+
+
+def check_core_packages():
+    """Returns names of outdated core packages. They are used by commands
+    which could run at the same time, so a background process does not
+    update them"""
+    # pylint: disable=import-outside-toplevel
+    from platformio.managers.core import CORE_PACKAGES, CorePackageManager
+
+    pm = CorePackageManager()
+    outdated_items = []
+    for name, requirements in CORE_PACKAGES.items():
+        pkg_dir = pm.get_package_dir(name)
+        if pkg_dir and pm.outdated(pkg_dir, requirements):
+            outdated_items.append(name)
+    return outdated_items
+
+
+def check_platformio_upgrade():
+    """Returns the latest version if it is newer than the current one"""
+    # pylint: disable=import-outside-toplevel
+    from platformio.commands.upgrade import get_latest_version
+
+    latest_version = get_latest_version()
+    if _parse_version(latest_version) <= _parse_version(__version__):
+        return None
+    return latest_version
+
+
+def show_upgrade_notice(latest_version):
     terminal_width, _ = click.get_terminal_size()
 
     click.echo("")
@@ -226,16 +323,11 @@ def check_platformio_upgrade():
     click.echo("")
 
 
-def check_internal_updates(ctx, what):
-    last_check = app.get_state_item("last_check", {})
-    interval = int(app.get_setting(f"check_{what}_interval")) * 3600 * 24
-    if time() - interval < last_check.get(f"{what}_update", 0):
-        return
-
-    last_check[f'{what}_update'] = int(time())
-    app.set_state_item("last_check", last_check)
-
-    util.internet_on(raise_exception=True)
+def check_internal_updates(what):
+    """Returns names of outdated platforms or libraries"""
+    # pylint: disable=import-outside-toplevel
+    from platformio.managers.lib import LibraryManager
+    from platformio.managers.platform import PlatformFactory, PlatformManager
 
     pm = PlatformManager() if what == "platforms" else LibraryManager()
     outdated_items = []
@@ -249,9 +341,16 @@ def check_internal_updates(ctx, what):
         ]
         if any(conds):
             outdated_items.append(manifest['name'])
+    return outdated_items
 
-    if not outdated_items:
-        return
+
+def show_internal_updates(ctx, what, outdated_items):
+    # pylint: disable=import-outside-toplevel
+    from platformio.commands.lib import CTX_META_STORAGE_DIRS_KEY
+    from platformio.commands.lib import lib_update as cmd_lib_update
+    from platformio.commands.platform import \
+        platform_update as cmd_platform_update
+    from platformio.managers.lib import LibraryManager
 
     terminal_width, _ = click.get_terminal_size()
 
@@ -286,7 +385,9 @@ def check_internal_updates(ctx, what):
         if what == "platforms":
             ctx.invoke(cmd_platform_update, platforms=outdated_items)
         elif what == "libraries":
-            ctx.meta[CTX_META_STORAGE_DIRS_KEY] = [pm.package_dir]
+            ctx.meta[CTX_META_STORAGE_DIRS_KEY] = [
+                LibraryManager().package_dir
+            ]
             ctx.invoke(cmd_lib_update, libraries=outdated_items)
         click.echo()
 
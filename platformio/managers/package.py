@@ -365,15 +365,27 @@ class PkgInstallerMixin(object):
         return manifest
 
     def get_installed(self):
+        if not isdir(self.package_dir):
+            return []
         items = []
-        for pkg_dir in self.read_dirs(self.package_dir):
-            if self.TMP_FOLDER_PREFIX in pkg_dir:
-                continue
-            manifest = self.load_manifest(pkg_dir)
-            if not manifest:
-                continue
-            assert "name" in manifest
-            items.append(manifest)
+        # allow concurrent readers, wait only for install/uninstall
+        lock = LockFile(self.package_dir, shared=True)
+        try:
+            lock.acquire()
+        except (IOError, OSError):
+            lock = None  # a lock file can not be created in read-only storage
+        try:
+            for pkg_dir in self.read_dirs(self.package_dir):
+                if self.TMP_FOLDER_PREFIX in pkg_dir:
+                    continue
+                manifest = self.load_manifest(pkg_dir)
+                if not manifest:
+                    continue
+                assert "name" in manifest
+                items.append(manifest)
+        finally:
+            if lock:
+                lock.release()
         return items
 
     def get_package(self, name, requirements=None, url=None):
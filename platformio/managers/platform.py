@@ -28,11 +28,14 @@ from platformio.managers.core import get_core_package_dir
 from platformio.managers.package import BasePkgManager, PackageManager
 from platformio.proc import (BuildAsyncPipe, copy_pythonpath_to_osenv,
                              exec_command, get_pythonexe_path)
+from platformio.profiler import Profiler
 from platformio.project.config import ProjectConfig
 from platformio.project.helpers import (get_project_boards_dir,
+                                        get_project_build_dir,
                                         get_project_core_dir,
                                         get_project_packages_dir,
-                                        get_project_platforms_dir)
+                                        get_project_platforms_dir,
+                                        save_project_snapshot)
 
 try:
     from urllib.parse import quote
@@ -368,8 +371,9 @@ class PlatformRunMixin(object):
         if "framework" in options:
             # support PIO Core 3.0 dev/platforms
             options['pioframework'] = options['framework']
-        self.configure_default_packages(options, targets)
-        self.install_packages(silent=True)
+        with Profiler().phase("Install packages"):
+            self.configure_default_packages(options, targets)
+            self.install_packages(silent=True)
 
         self.silent = silent
         self.verbose = verbose or app.get_setting("force_verbose")
@@ -384,7 +388,14 @@ class PlatformRunMixin(object):
         if not isfile(variables['build_script']):
             raise exception.BuildScriptNotFound(variables['build_script'])
 
-        result = self._run_scons(variables, targets, jobs)
+        # pass resolved configuration to the build process
+        variables['project_snapshot'] = save_project_snapshot(
+            config, variables['pioenv'],
+            join(get_project_build_dir(), variables['pioenv'],
+                 "project.json"))
+
+        with Profiler().phase("SCons"):
+            result = self._run_scons(variables, targets, jobs)
         assert "returncode" in result
 
         return result
@@ -133,6 +133,26 @@ def exec_command(*args, **kwargs):
     return result
 
 
+def spawn_detached_process(args, **kwargs):
+    """Start a process which outlives the current one and does not share
+    its console, the caller never waits for it."""
+    if WINDOWS:
+        # DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP
+        kwargs['creationflags'] = 0x00000008 | 0x00000200
+    else:
+        kwargs['preexec_fn'] = os.setsid
+    with open(os.devnull, "r+") as devnull:
+        try:
+            return subprocess.Popen(args,
+                                    stdin=devnull,
+                                    stdout=devnull,
+                                    stderr=devnull,
+                                    close_fds=not WINDOWS,
+                                    **kwargs)
+        except OSError:
+            return None
+
+
 def is_ci():
     return os.getenv("CI", "").lower() == "true"
 
@@ -0,0 +1,124 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from os.path import dirname, isdir, isfile
+from time import time
+
+from platformio import util
+
+
+@util.singleton
+class Profiler(object):
+    """Collects timings of build phases and commands as events of
+    Chrome Trace Event Format ("chrome://tracing", Perfetto, Speedscope).
+
+    Both `pio run` and the SCons process record events. Timestamps are
+    absolute, so the timelines of different processes can be merged."""
+
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._events = []
+
+    def add_event(  # pylint: disable=too-many-arguments
+            self,
+            name,
+            start,
+            duration,
+            category="phase",
+            args=None):
+        if not self.enabled:
+            return None
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1000000),
+            "dur": int(duration * 1000000),
+            "pid": os.getpid(),
+            "tid": threading.current_thread().ident,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+        return event
+
+    @contextmanager
+    def phase(self, name, category="phase", args=None):
+        start = time()
+        try:
+            yield
+        finally:
+            self.add_event(name, start, time() - start, category, args)
+
+    def get_events(self):
+        with self._lock:
+            return list(self._events)
+
+    def extend(self, events):
+        with self._lock:
+            self._events.extend(events)
+
+    def save(self, path, events=None):
+        if not isdir(dirname(path)):
+            os.makedirs(dirname(path))
+        with open(path, "w") as fp:
+            json.dump({
+                "traceEvents":
+                self.get_events() if events is None else events,
+                "displayTimeUnit": "ms"
+            }, fp)
+        return path
+
+
+def load_trace_events(path):
+    if not isfile(path):
+        return []
+    try:
+        with open(path) as fp:
+            return json.load(fp).get("traceEvents", [])
+    except ValueError:
+        return []
+
+
+def get_slowest_events(events, category, limit=10):
+    return sorted([e for e in events if e.get("cat") == category],
+                  key=lambda e: e['dur'],
+                  reverse=True)[:limit]
+
+
+def get_phase_durations(events):
+    """Total duration per phase name in seconds"""
+    result = {}
+    for event in events:
+        if event.get("cat") != "phase":
+            continue
+        result[event['name']] = result.get(event['name'],
+                                           0) + event['dur'] / 1000000.0
+    return result
@@ -16,14 +16,12 @@ import json
 import os
 from hashlib import sha1
 from os import walk
-from os.path import (basename, dirname, expanduser, isdir, isfile, join,
-                     realpath, splitdrive)
+from os.path import (basename, dirname, expanduser, getmtime, isdir, isfile,
+                     join, realpath, splitdrive)
 
-from click.testing import CliRunner
-
-from platformio import __version__, exception
+from platformio import __version__, exception, fs
 from platformio.compat import WINDOWS, hashlib_encode_data
-from platformio.project.config import ProjectConfig
+from platformio.project.config import ProjectConfig, ProjectOptions
 
 
 def get_project_dir():
@@ -44,77 +42,190 @@ def find_project_dir_above(path):
     return find_project_dir_above(dirname(path)) if isdir(dirname(path)) else None
 
 
-def get_project_optional_dir(name, default=None):
-    project_dir = get_project_dir()
-    config = ProjectConfig.get_instance(join(project_dir, "platformio.ini"))
-    optional_dir = config.get("platformio", name)
+class ProjectLayout(object):
+    """Project directories resolved once per process.
+
+    An instance is bound to the project directory, the modification time of
+    its `platformio.ini` and the `PLATFORMIO_*` system environment variables,
+    so a change to any of them produces a new layout.
+    """
+
+    DIRS = ("core_dir", "globallib_dir", "platforms_dir", "packages_dir",
+            "cache_dir", "build_cache_dir", "workspace_dir", "build_dir",
+            "libdeps_dir", "lib_dir", "include_dir", "src_dir", "test_dir",
+            "boards_dir", "data_dir", "shared_dir")
+
+    _instances = {}
+
+    @staticmethod
+    def get_instance(project_dir=None):
+        project_dir = project_dir or get_project_dir()
+        config_path = join(project_dir, "platformio.ini")
+        key = (project_dir, getmtime(config_path) if isfile(config_path) else
+               0, tuple(
+                   sorted((name, value)
+                          for name, value in os.environ.items()
+                          if name.startswith("PLATFORMIO_"))))
+        instance = ProjectLayout._instances.get(project_dir)
+        if not instance or instance[0] != key:
+            instance = (key, ProjectLayout(project_dir))
+            ProjectLayout._instances[project_dir] = instance
+        return instance[1]
+
+    @staticmethod
+    def reset_instances():
+        ProjectLayout._instances = {}
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.config = ProjectConfig.get_instance(
+            join(project_dir, "platformio.ini"))
+        self._cache = {}
+
+    def get_optional_dir(self, name, default=None):
+        key = (name, default)
+        if key not in self._cache:
+            self._cache[key] = self._resolve_optional_dir(name, default)
+        return self._cache[key]
+
+    def _resolve_optional_dir(self, name, default=None):
+        optional_dir = self.config.get("platformio", name)
+
+        if not optional_dir:
+            return default
+
+        if "$PROJECT_HASH" in optional_dir:
+            optional_dir = optional_dir.replace(
+                "$PROJECT_HASH", "%s-%s" %
+                (basename(self.project_dir),
+                 sha1(hashlib_encode_data(
+                     self.project_dir)).hexdigest()[:10]))
+
+        if optional_dir.startswith("~"):
+            optional_dir = expanduser(optional_dir)
+
+        return realpath(join(self.project_dir, optional_dir))
+
+    def get_dir(self, name):
+        if name not in self._cache:
+            self._cache[name] = getattr(self, "_resolve_%s" % name)()
+        return self._cache[name]
+
+    def as_dict(self):
+        result = {name: self.get_dir(name) for name in self.DIRS}
+        result['project_dir'] = self.project_dir
+        return result
+
+    def _resolve_core_dir(self):
+        default = join(expanduser("~"), ".platformio")
+        core_dir = self.get_optional_dir(
+            "core_dir", self.get_optional_dir("home_dir", default))
+        win_core_dir = None
+        if WINDOWS and core_dir == default:
+            win_core_dir = splitdrive(core_dir)[0] + "\\.platformio"
+            if isdir(win_core_dir):
+                core_dir = win_core_dir
+
+        if not isdir(core_dir):
+            try:
+                os.makedirs(core_dir)
+            except OSError as e:
+                if not win_core_dir:
+                    raise e
+
+                os.makedirs(win_core_dir)
+                core_dir = win_core_dir
+        assert isdir(core_dir)
+        return core_dir
+
+    def _resolve_globallib_dir(self):
+        return self.get_optional_dir("globallib_dir",
+                                     join(self.get_dir("core_dir"), "lib"))
+
+    def _resolve_platforms_dir(self):
+        return self.get_optional_dir(
+            "platforms_dir", join(self.get_dir("core_dir"), "platforms"))
+
+    def _resolve_packages_dir(self):
+        return self.get_optional_dir(
+            "packages_dir", join(self.get_dir("core_dir"), "packages"))
+
+    def _resolve_cache_dir(self):
+        return self.get_optional_dir("cache_dir",
+                                     join(self.get_dir("core_dir"), ".cache"))
+
+    def _resolve_build_cache_dir(self):
+        return self.get_optional_dir("build_cache_dir")
+
+    def _resolve_workspace_dir(self):
+        return self.get_optional_dir("workspace_dir",
+                                     join(self.project_dir, ".pio"))
+
+    def _resolve_build_dir(self):
+        return self.get_optional_dir(
+            "build_dir", join(self.get_dir("workspace_dir"), "build"))
+
+    def _resolve_libdeps_dir(self):
+        return self.get_optional_dir(
+            "libdeps_dir", join(self.get_dir("workspace_dir"), "libdeps"))
+
+    def _resolve_lib_dir(self):
+        return self.get_optional_dir("lib_dir", join(self.project_dir, "lib"))
+
+    def _resolve_include_dir(self):
+        return self.get_optional_dir("include_dir",
+                                     join(self.project_dir, "include"))
+
+    def _resolve_src_dir(self):
+        return self.get_optional_dir("src_dir", join(self.project_dir, "src"))
+
+    def _resolve_test_dir(self):
+        return self.get_optional_dir("test_dir",
+                                     join(self.project_dir, "test"))
+
+    def _resolve_boards_dir(self):
+        return self.get_optional_dir("boards_dir",
+                                     join(self.project_dir, "boards"))
 
-    if not optional_dir:
-        return default
+    def _resolve_data_dir(self):
+        return self.get_optional_dir("data_dir",
+                                     join(self.project_dir, "data"))
 
-    if "$PROJECT_HASH" in optional_dir:
-        optional_dir = optional_dir.replace(
-            "$PROJECT_HASH", "%s-%s" %
-            (basename(project_dir), sha1(
-                hashlib_encode_data(project_dir)).hexdigest()[:10]))
+    def _resolve_shared_dir(self):
+        return self.get_optional_dir("shared_dir",
+                                     join(self.project_dir, "shared"))
 
-    if optional_dir.startswith("~"):
-        optional_dir = expanduser(optional_dir)
 
-    return realpath(optional_dir)
+def get_project_optional_dir(name, default=None):
+    return ProjectLayout.get_instance().get_optional_dir(name, default)
 
 
 def get_project_core_dir():
-    default = join(expanduser("~"), ".platformio")
-    core_dir = get_project_optional_dir(
-        "core_dir", get_project_optional_dir("home_dir", default))
-    win_core_dir = None
-    if WINDOWS and core_dir == default:
-        win_core_dir = splitdrive(core_dir)[0] + "\\.platformio"
-        if isdir(win_core_dir):
-            core_dir = win_core_dir
-
-    if not isdir(core_dir):
-        try:
-            os.makedirs(core_dir)
-        except OSError as e:
-            if not win_core_dir:
-                raise e
-
-            os.makedirs(win_core_dir)
-            core_dir = win_core_dir
-    assert isdir(core_dir)
-    return core_dir
+    return ProjectLayout.get_instance().get_dir("core_dir")
 
 
 def get_project_global_lib_dir():
-    return get_project_optional_dir("globallib_dir",
-                                    join(get_project_core_dir(), "lib"))
+    return ProjectLayout.get_instance().get_dir("globallib_dir")
 
 
 def get_project_platforms_dir():
-    return get_project_optional_dir("platforms_dir",
-                                    join(get_project_core_dir(), "platforms"))
+    return ProjectLayout.get_instance().get_dir("platforms_dir")
 
 
 def get_project_packages_dir():
-    return get_project_optional_dir("packages_dir",
-                                    join(get_project_core_dir(), "packages"))
+    return ProjectLayout.get_instance().get_dir("packages_dir")
 
 
 def get_project_cache_dir():
-    return get_project_optional_dir("cache_dir",
-                                    join(get_project_core_dir(), ".cache"))
+    return ProjectLayout.get_instance().get_dir("cache_dir")
 
 
 def get_project_workspace_dir():
-    return get_project_optional_dir("workspace_dir",
-                                    join(get_project_dir(), ".pio"))
+    return ProjectLayout.get_instance().get_dir("workspace_dir")
 
 
 def get_project_build_dir(force=False):
-    path = get_project_optional_dir("build_dir",
-                                    join(get_project_workspace_dir(), "build"))
+    path = ProjectLayout.get_instance().get_dir("build_dir")
     try:
         if not isdir(path):
             os.makedirs(path)
@@ -125,41 +236,84 @@ def get_project_build_dir(force=False):
 
 
 def get_project_libdeps_dir():
-    return get_project_optional_dir(
-        "libdeps_dir", join(get_project_workspace_dir(), "libdeps"))
+    return ProjectLayout.get_instance().get_dir("libdeps_dir")
 
 
 def get_project_lib_dir():
-    return get_project_optional_dir("lib_dir", join(get_project_dir(), "lib"))
+    return ProjectLayout.get_instance().get_dir("lib_dir")
 
 
 def get_project_include_dir():
-    return get_project_optional_dir("include_dir",
-                                    join(get_project_dir(), "include"))
+    return ProjectLayout.get_instance().get_dir("include_dir")
 
 
 def get_project_src_dir():
-    return get_project_optional_dir("src_dir", join(get_project_dir(), "src"))
+    return ProjectLayout.get_instance().get_dir("src_dir")
 
 
 def get_project_test_dir():
-    return get_project_optional_dir("test_dir", join(get_project_dir(),
-                                                     "test"))
+    return ProjectLayout.get_instance().get_dir("test_dir")
 
 
 def get_project_boards_dir():
-    return get_project_optional_dir("boards_dir",
-                                    join(get_project_dir(), "boards"))
+    return ProjectLayout.get_instance().get_dir("boards_dir")
 
 
 def get_project_data_dir():
-    return get_project_optional_dir("data_dir", join(get_project_dir(),
-                                                     "data"))
+    return ProjectLayout.get_instance().get_dir("data_dir")
 
 
 def get_project_shared_dir():
-    return get_project_optional_dir("shared_dir",
-                                    join(get_project_dir(), "shared"))
+    return ProjectLayout.get_instance().get_dir("shared_dir")
+
+
+def get_project_dirs():
+    get_project_build_dir()
+    return ProjectLayout.get_instance().as_dict()
+
+
+PROJECT_SNAPSHOT_VERSION = 2
+_PROJECT_SNAPSHOTS = {}
+
+
+def save_project_snapshot(config, env, path):
+    """Resolve `env` options and project layout once and store them as JSON,
+    so the build process does not have to parse the configuration again."""
+    data = dict(version=PROJECT_SNAPSHOT_VERSION,
+                pioversion=__version__,
+                config_path=config.path,
+                env=env,
+                options=config.items(env=env, as_dict=True),
+                platformio={
+                    option.name: config.get("platformio", option.name)
+                    for option in ProjectOptions.values()
+                    if option.scope == "platformio"
+                },
+                dirs=get_project_dirs())
+    if not isdir(dirname(path)):
+        os.makedirs(dirname(path))
+    with open(path, "w") as fp:
+        json.dump(data, fp)
+    return path
+
+
+def load_project_snapshot(path):
+    if not isfile(path):
+        return None
+    mtime = getmtime(path)
+    item = _PROJECT_SNAPSHOTS.get(path)
+    if item and item['mtime'] == mtime:
+        return item['data']
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+    except ValueError:
+        return None
+    if (data.get("version") != PROJECT_SNAPSHOT_VERSION
+            or data.get("pioversion") != __version__):
+        return None
+    _PROJECT_SNAPSHOTS[path] = dict(mtime=mtime, data=data)
+    return data
 
 
 def compute_project_checksum(config):
@@ -191,12 +345,104 @@ def compute_project_checksum(config):
     return checksum.hexdigest()
 
 
+PROJECT_IDE_DATA_VERSION = 2
+
+
+def get_project_ide_data_path(build_dir, env):
+    return join(build_dir, env, "idedata.json")
+
+
+def load_project_ide_data_cache(build_dir, env):
+    path = get_project_ide_data_path(build_dir, env)
+    if not isfile(path):
+        return None
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+    except ValueError:
+        return None
+    if (data.get("version") != PROJECT_IDE_DATA_VERSION
+            or data.get("pioversion") != __version__):
+        return None
+    return data
+
+
+def get_project_options_sysenv():
+    """Values of system environment variables which override options"""
+    result = {}
+    for option in ProjectOptions.values():
+        if option.sysenvvar and os.getenv(option.sysenvvar):
+            result[option.sysenvvar] = os.getenv(option.sysenvvar)
+    return result
+
+
+def _get_ide_data_dep_stamp(path):
+    """A state of a file or of all files in a directory, a library manifest
+    or a header could be changed without changing a directory itself"""
+    if isfile(path):
+        return getmtime(path)
+    if not isdir(path):
+        return None
+    checksum = sha1()
+    for root, dirs, files in walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            try:
+                stat = os.stat(join(root, name))
+            except OSError:
+                continue
+            checksum.update(
+                hashlib_encode_data("%s:%s:%d" %
+                                    (join(root, name), stat.st_mtime,
+                                     stat.st_size)))
+    return checksum.hexdigest()
+
+
+def get_project_ide_data_deps(paths):
+    return {path: _get_ide_data_dep_stamp(path) for path in paths}
+
+
+def _is_ide_data_deps_actual(deps):
+    return get_project_ide_data_deps(list(deps)) == deps
+
+
+def _load_fresh_project_ide_data(project_dir, envs):
+    """IDE data stored by the last build of the environment if the project
+    was not modified since then"""
+    result = {}
+    with fs.cd(project_dir):
+        config = ProjectConfig.get_instance(join(project_dir,
+                                                 "platformio.ini"))
+        checksum = None
+        for env in envs:
+            cache = load_project_ide_data_cache(get_project_build_dir(), env)
+            if (not cache or not cache.get("checksum")
+                    or cache.get("sysenv") != get_project_options_sysenv()):
+                continue
+            if not _is_ide_data_deps_actual(cache['deps']):
+                continue
+            checksum = checksum or compute_project_checksum(config)
+            if cache['checksum'] == checksum:
+                result[env] = cache['data']
+    return result
+
+
 def load_project_ide_data(project_dir, env_or_envs):
+    # pylint: disable=import-outside-toplevel
+    from click.testing import CliRunner
     from platformio.commands.run import cli as cmd_run
     assert env_or_envs
     envs = env_or_envs
     if not isinstance(envs, list):
         envs = [envs]
+
+    data = _load_fresh_project_ide_data(project_dir, envs)
+    envs = [env for env in envs if env not in data]
+    if not envs:
+        if not isinstance(env_or_envs, list):
+            return data[env_or_envs]
+        return data
+
     args = ["--project-dir", project_dir, "--target", "idedata"]
     for env in envs:
         args.extend(["-e", env])
@@ -207,7 +453,6 @@ def load_project_ide_data(project_dir, env_or_envs):
     if '"includes":' not in result.output:
         raise exception.PlatformioException(result.output)
 
-    data = {}
     for line in result.output.split("\n"):
         line = line.strip()
         if (line.startswith('{"') and line.endswith("}")
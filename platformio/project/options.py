@@ -78,6 +78,18 @@ ProjectOptions = OrderedDict(
             ConfigPlatformioOption(
                 name="build_cache_dir", sysenvvar="PLATFORMIO_BUILD_CACHE_DIR"
             ),
+            ConfigPlatformioOption(
+                name="build_cache_mode",
+                type=click.Choice(["scons", "compile"]),
+                sysenvvar="PLATFORMIO_BUILD_CACHE_MODE",
+            ),
+            ConfigPlatformioOption(
+                name="build_cache_size", sysenvvar="PLATFORMIO_BUILD_CACHE_SIZE"
+            ),
+            ConfigPlatformioOption(
+                name="build_cache_remote",
+                sysenvvar="PLATFORMIO_BUILD_CACHE_REMOTE",
+            ),
             ConfigPlatformioOption(
                 name="workspace_dir", sysenvvar="PLATFORMIO_WORKSPACE_DIR"
             ),
@@ -167,6 +179,11 @@ ProjectOptions = OrderedDict(
                 sysenvvar="PLATFORMIO_SRC_FILTER",
                 buildenvvar="SRC_FILTER",
             ),
+            ConfigEnvOption(
+                name="build_pch",
+                sysenvvar="PLATFORMIO_BUILD_PCH",
+                buildenvvar="BUILD_PCH",
+            ),
             ConfigEnvOption(name="targets", multiple=True),
             # Upload
             ConfigEnvOption(
@@ -217,12 +234,14 @@ ProjectOptions = OrderedDict(
                 type=click.Choice(["off", "soft", "strict"]),
             ),
             ConfigEnvOption(name="lib_archive", type=click.BOOL),
+            ConfigEnvOption(name="lib_unity_build", type=click.BOOL),
             # Test
             ConfigEnvOption(name="test_filter", multiple=True),
             ConfigEnvOption(name="test_ignore", multiple=True),
             ConfigEnvOption(name="test_port"),
             ConfigEnvOption(name="test_speed", type=click.INT),
             ConfigEnvOption(name="test_transport"),
+            ConfigEnvOption(name="test_timeout", type=click.INT),
             ConfigEnvOption(name="test_build_project_src", type=click.BOOL),
             # Debug
             ConfigEnvOption(name="debug_tool"),
@@ -13,28 +13,36 @@
 # limitations under the License.
 
 import atexit
+import json
 import platform
 import re
 import sys
 import threading
-from collections import deque
-from os import getenv, sep
-from os.path import join
-from time import sleep, time
+from os import getenv, remove, sep
+from os.path import getmtime, isfile, join
+from time import time
 from traceback import format_exc
 
 import click
-import requests
 
 from platformio import __version__, app, exception, util
 from platformio.commands import PlatformioCLI
 from platformio.compat import string_types
-from platformio.proc import is_ci, is_container
+from platformio.lockfile import LockFile
+from platformio.proc import (copy_pythonpath_to_osenv, get_pythonexe_path,
+                             is_ci, is_container, spawn_detached_process)
+from platformio.project.helpers import get_project_core_dir
 
 try:
-    import queue
+    from urllib.parse import urlencode
 except ImportError:
-    import Queue as queue
+    from urllib import urlencode
+
+MP_BATCH_URL = "https://www.google-analytics.com/batch"
+SPOOL_BATCH_SIZE = 20  # Measurement Protocol limit per batch request
+SPOOL_MAX_ITEMS = 100
+SPOOL_LOCK_TIMEOUT = 5  # in seconds
+SPOOL_RETRY_INTERVAL = 300  # in seconds, after a failed attempt
 
 
 class TelemetryBase(object):
@@ -180,96 +188,149 @@ class MeasurementProtocol(TelemetryBase):
         if self._ignore_hit():
             return
         self['t'] = hittype
-        # correct queue time
-        if "qt" in self._params and isinstance(self['qt'], float):
-            self['qt'] = int((time() - self['qt']) * 1000)
         MPDataPusher().push(self._params)
 
 
 @util.singleton
 class MPDataPusher(object):
+    """Collect hits in memory and hand them over to the spool file.
 
-    MAX_WORKERS = 5
+    Nothing is sent from the command process: the spool is flushed by a
+    detached sender process (see `flush_spool()`) in batches, so a command
+    never waits for the network on exit.
+    """
 
     def __init__(self):
-        self._queue = queue.LifoQueue()
-        self._failedque = deque()
-        self._http_session = requests.Session()
-        self._http_offline = False
-        self._workers = []
+        self._items = []
+        self._lock = threading.Lock()
 
     def push(self, item):
-        # if network is off-line
-        if self._http_offline:
-            if "qt" not in item:
-                item['qt'] = time()
-            self._failedque.append(item)
-            return
-
-        self._queue.put(item)
-        self._tune_workers()
+        # keep absolute time, it is converted to "queue time" when sending
+        if "qt" not in item:
+            item['qt'] = time()
+        elif not isinstance(item['qt'], float):
+            item['qt'] = time() - (item['qt'] / 1000)
+        with self._lock:
+            self._items.append(item)
+            if len(self._items) < SPOOL_BATCH_SIZE:
+                return
+        # long living processes (PIO Home) do not wait for exit
+        self.flush()
 
     def in_wait(self):
-        return self._queue.unfinished_tasks
+        return len(self._items)
 
     def get_items(self):
-        items = list(self._failedque)
-        try:
-            while True:
-                items.append(self._queue.get_nowait())
-        except queue.Empty:
-            pass
+        with self._lock:
+            items, self._items = self._items, []
         return items
 
-    def _tune_workers(self):
-        for i, w in enumerate(self._workers):
-            if not w.is_alive():
-                del self._workers[i]
+    def flush(self, start_sender=True):
+        items = self.get_items()
+        if items:
+            append_to_spool(items)
+        if start_sender:
+            start_spool_sender()
 
-        need_nums = min(self._queue.qsize(), self.MAX_WORKERS)
-        active_nums = len(self._workers)
-        if need_nums <= active_nums:
-            return
 
-        for _ in range(need_nums - active_nums):
-            t = threading.Thread(target=self._worker)
-            t.daemon = True
-            t.start()
-            self._workers.append(t)
+def get_spool_path():
+    return join(get_project_core_dir(), "telemetry.spool")
 
-    def _worker(self):
-        while True:
+
+def read_spool(path):
+    items = []
+    if not isfile(path):
+        return items
+    with open(path) as fp:
+        for line in fp:
             try:
-                item = self._queue.get()
-                _item = item.copy()
-                if "qt" not in _item:
-                    _item['qt'] = time()
-                self._failedque.append(_item)
-                if self._send_data(item):
-                    self._failedque.remove(_item)
-                self._queue.task_done()
-            except:  # pylint: disable=W0702
+                items.append(json.loads(line))
+            except ValueError:
                 pass
+    return items
+
 
-    def _send_data(self, data):
-        if self._http_offline:
+def append_to_spool(items, path=None):
+    path = path or get_spool_path()
+    try:
+        with LockFile(path, timeout=SPOOL_LOCK_TIMEOUT):
+            items = (read_spool(path) + items)[SPOOL_MAX_ITEMS * -1:]
+            with open(path, "w") as fp:
+                for item in items:
+                    fp.write(json.dumps(item) + "\n")
+    except (IOError, OSError, exception.LockFileTimeoutError):
+        return False
+    return True
+
+
+def start_spool_sender(path=None):
+    path = path or get_spool_path()
+    if not isfile(path):
+        return None
+    offline_marker = f"{path}.offline"
+    if (isfile(offline_marker)
+            and time() - getmtime(offline_marker) < SPOOL_RETRY_INTERVAL):
+        return None
+    copy_pythonpath_to_osenv()
+    return spawn_detached_process([
+        get_pythonexe_path(), "-c",
+        "from platformio.telemetry import flush_spool; flush_spool(%r)" % path
+    ])
+
+
+def flush_spool(path=None):
+    """Send spooled hits using Measurement Protocol batch requests. Only one
+    sender works at a time, hits that were not sent return to the spool."""
+    path = path or get_spool_path()
+    try:
+        sender_lock = LockFile(f"{path}.sender", timeout=0)
+        sender_lock.acquire()
+    except (IOError, OSError, exception.LockFileTimeoutError):
+        return False
+
+    try:
+        with LockFile(path, timeout=SPOOL_LOCK_TIMEOUT):
+            items = read_spool(path)
+            if isfile(path):
+                remove(path)
+
+        import requests  # pylint: disable=import-outside-toplevel
+        session = requests.Session()
+        for i in range(0, len(items), SPOOL_BATCH_SIZE):
+            if _send_batch(session, items[i:i + SPOOL_BATCH_SIZE]):
+                continue
+            append_to_spool(items[i:], path)
+            with open(f"{path}.offline", "w") as fp:
+                fp.write(str(time()))
             return False
-        try:
-            r = self._http_session.post(
-                "https://ssl.google-analytics.com/collect",
-                data=data,
-                headers=util.get_request_defheaders(),
-                timeout=1)
-            r.raise_for_status()
+        if isfile(f"{path}.offline"):
+            remove(f"{path}.offline")
+    finally:
+        sender_lock.release()
+    return True
+
+
+def _send_batch(session, items):
+    import requests  # pylint: disable=import-outside-toplevel
+    lines = []
+    for item in items:
+        item = item.copy()
+        item['qt'] = max(0, int((time() - item.get("qt", time())) * 1000))
+        lines.append(urlencode(item))
+    try:
+        r = session.post(getenv("PLATFORMIO_TELEMETRY_URL", MP_BATCH_URL),
+                         data="\n".join(lines),
+                         headers=util.get_request_defheaders(),
+                         timeout=5)
+        r.raise_for_status()
+        return True
+    except requests.exceptions.HTTPError as e:
+        # skip Bad Request
+        if 400 <= e.response.status_code < 500:
             return True
-        except requests.exceptions.HTTPError as e:
-            # skip Bad Request
-            if 400 >= e.response.status_code < 500:
-                return True
-        except:  # pylint: disable=W0702
-            pass
-        self._http_offline = True
-        return False
+    except:  # pylint: disable=W0702
+        pass
+    return False
 
 
 def on_command():
@@ -353,56 +414,18 @@ def on_exception(e):
 
 @atexit.register
 def _finalize():
-    timeout = 1000  # msec
-    elapsed = 0
     try:
-        while elapsed < timeout and MPDataPusher().in_wait():
-            sleep(0.2)
-            elapsed += 200
-        backup_reports(MPDataPusher().get_items())
+        MPDataPusher().flush()
     except KeyboardInterrupt:
         pass
 
 
-def backup_reports(items):
-    if not items:
-        return
-
-    KEEP_MAX_REPORTS = 100
-    tm = app.get_state_item("telemetry", {})
-    if "backup" not in tm:
-        tm['backup'] = []
-
-    for params in items:
-        # skip static options
-        for key in list(params.keys()):
-            if key in ("v", "tid", "cid", "cd1", "cd2", "sr", "an"):
-                del params[key]
-
-        # store time in UNIX format
-        if "qt" not in params:
-            params['qt'] = time()
-        elif not isinstance(params['qt'], float):
-            params['qt'] = time() - (params['qt'] / 1000)
-
-        tm['backup'].append(params)
-
-    tm['backup'] = tm['backup'][KEEP_MAX_REPORTS * -1:]
-    app.set_state_item("telemetry", tm)
-
-
 def resend_backuped_reports():
+    """Move reports stored in app state by previous versions to the spool"""
     tm = app.get_state_item("telemetry", {})
     if "backup" not in tm or not tm['backup']:
         return False
-
-    for report in tm['backup']:
-        mp = MeasurementProtocol()
-        for key, value in report.items():
-            mp[key] = value
-        mp.send(report['t'])
-
-    # clean
-    tm['backup'] = []
+    append_to_spool(tm['backup'])
+    del tm['backup']
     app.set_state_item("telemetry", tm)
     return True
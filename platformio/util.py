@@ -25,7 +25,6 @@ from functools import wraps
 from glob import glob
 
 import click
-import requests
 
 from platformio import __apiurl__, __version__, exception
 from platformio.commands import PlatformioCLI
@@ -39,15 +38,20 @@ from platformio.proc import is_ci  # pylint: disable=unused-import
 # KEEP unused imports for backward compatibility with PIO Core 3.0 API
 
 
+def parse_duration(value):
+    """Seconds of a duration with a unit suffix, such as "30s" or "7d" """
+    tdmap = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    assert value.endswith(tuple(tdmap))
+    return int(tdmap[value[-1]] * int(value[:-1]))
+
+
 class memoized(object):
 
     def __init__(self, expire=0):
         expire = str(expire)
         if expire.isdigit():
             expire = f"{int(expire) // 1000}s"
-        tdmap = {"s": 1, "m": 60, "h": 3600, "d": 86400}
-        assert expire.endswith(tuple(tdmap))
-        self.expire = int(tdmap[expire[-1]] * int(expire[:-1]))
+        self.expire = parse_duration(expire)
         self.cache = {}
 
     def __call__(self, func):
@@ -278,12 +282,14 @@ def get_mdns_services():
 
 
 def get_request_defheaders():
+    import requests  # pylint: disable=import-outside-toplevel
     data = (__version__, int(is_ci()), requests.utils.default_user_agent())
     return {"User-Agent": "PlatformIO/%s CI/%d %s" % data}
 
 
 @memoized(expire="60s")
 def _api_request_session():
+    import requests  # pylint: disable=import-outside-toplevel
     return requests.Session()
 
 
@@ -293,6 +299,7 @@ def _get_api_result(
         params=None,
         data=None,
         auth=None):
+    import requests  # pylint: disable=import-outside-toplevel
     from platformio.app import get_setting
 
     result = {}
@@ -337,6 +344,7 @@ def _get_api_result(
 
 
 def get_api_result(url, params=None, data=None, auth=None, cache_valid=None):
+    import requests  # pylint: disable=import-outside-toplevel
     from platformio.app import ContentCache
     total = 0
     max_retries = 5
@@ -386,6 +394,7 @@ def _internet_on():
     for ip in PING_INTERNET_IPS:
         try:
             if os.getenv("HTTP_PROXY", os.getenv("HTTPS_PROXY")):
+                import requests  # pylint: disable=import-outside-toplevel
                 requests.get(f"http://{ip}", allow_redirects=False, timeout=timeout)
             else:
                 socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect(
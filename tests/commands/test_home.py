@@ -0,0 +1,203 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+
+import pytest
+
+from platformio import __version__
+from platformio.commands.home.projects import ProjectIndexer
+from platformio.commands.home.rpc import streaming
+from platformio.commands.home.rpc.cache import (DispatchStats, LRUCache,
+                                                RPCResultCache,
+                                                is_packages_event)
+from platformio.commands.home.workers import CoreWorkerPool
+
+
+def test_core_worker_pool(isolated_pio_home, tmpdir):
+    pool = CoreWorkerPool(size=2, max_calls=3)
+    try:
+        chunks = []
+        out, err, exit_code = pool.call(
+            ["--version"], on_output=lambda *args: chunks.append(args))
+        assert exit_code == 0 and not err
+        assert __version__ in out
+        assert chunks == [("out", out)]
+
+        # a working directory of a call
+        assert pool.call(["init"], cwd=str(tmpdir))[2] == 0
+        assert tmpdir.join("platformio.ini").isfile()
+        out, err, exit_code = pool.call(["run"], cwd=str(tmpdir.join("nope")))
+        assert exit_code == 1 and "No such file" in err
+
+        # settings are shared between workers
+        assert pool.call(["settings", "set", "enable_telemetry", "No"])[2] == 0
+
+        # concurrent calls, workers are restarted after `max_calls`
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                pool.call(["settings", "get", "enable_telemetry"])))
+            for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 6
+        assert all(r[2] == 0 and "enable_telemetry  No" in r[0]
+                   for r in results)
+        assert pool._started <= 2  # pylint: disable=protected-access
+    finally:
+        pool.shutdown()
+
+
+def test_rpc_result_cache(isolated_pio_home, tmpdir):
+    cache = RPCResultCache()
+    stats = DispatchStats()
+
+    # a directory listing is valid while the directory is not changed
+    params = {"path": str(tmpdir)}
+    key = cache.get_key("os.list_dir", params)
+    assert key and cache.get(key) == (False, None)
+    cache.set(key, "os.list_dir", params, [])
+    assert cache.get(key) == (True, [])
+    tmpdir.mkdir("new")
+    os.utime(str(tmpdir), (0, 0))
+    assert cache.get(key) == (False, None)
+
+    # read-only commands are cached until packages are changed
+    assert not cache.get_key("os.is_file", {"path": str(tmpdir)})
+    assert not cache.get_key("core.call",
+                             {"args": ["lib", "-g", "install", "ArduinoJson"]})
+    params = {"args": ["boards", "--json-output"], "options": {"cwd": "/"}}
+    key = cache.get_key("core.call", params)
+    assert key == cache.get_key(
+        "core.call",
+        dict(params, options={
+            "cwd": "/",
+            "stream_id": 1
+        }))
+    cache.set(key, "core.call", params, [{"id": "uno"}])
+    assert cache.get(key) == (True, [{"id": "uno"}])
+    assert is_packages_event("core.call",
+                             {"args": ["platform", "install", "atmelavr"]})
+    assert not is_packages_event("core.call", params)
+    cache.reset_packages()
+    assert cache.get(key) == (False, None)
+
+    # libraries of a project are installed from a terminal
+    project_dir = tmpdir.mkdir("project")
+    project_dir.join("platformio.ini").write("[env:uno]\nplatform = native\n")
+    libdeps_dir = project_dir.mkdir(".pio").mkdir("libdeps").mkdir("uno")
+    params = {"args": ["lib", "list"], "options": {"cwd": str(project_dir)}}
+    key = cache.get_key("core.call", params)
+    cache.set(key, "core.call", params, [])
+    assert cache.get(key) == (True, [])
+    libdeps_dir.mkdir("ArduinoJson")
+    os.utime(str(libdeps_dir), (0, 0))
+    assert cache.get(key) == (False, None)
+
+    for status in ("called", "cached", "failed"):
+        stats.record("os.list_dir", 0.5, status)
+    assert stats.as_dict()["os.list_dir"] == dict(calls=3,
+                                                  cached=1,
+                                                  coalesced=0,
+                                                  failed=1,
+                                                  total_time=1.5,
+                                                  max_time=0.5,
+                                                  avg_time=0.5)
+
+
+def test_project_indexer(isolated_pio_home, tmpdir):
+    project_dir = tmpdir.mkdir("project")
+    project_dir.mkdir("extra_libs")
+    config = project_dir.join("platformio.ini")
+    config.write("""
+[platformio]
+lib_extra_dirs = extra_libs, not_existing
+
+[env:native]
+platform = native
+""")
+    indexer = ProjectIndexer(max_workers=2)
+    assert indexer.is_outdated(str(project_dir))
+    summary, changed = indexer.refresh(str(project_dir)).result()
+    assert changed and not indexer.is_outdated(str(project_dir))
+    assert summary['path'] == str(project_dir)
+    assert summary['boards'] == [] and summary['envLibStorages'] == []
+    assert summary['extraLibStorages'] == [{
+        "name": "project%sextra_libs" % os.sep,
+        "path": str(project_dir.join("extra_libs"))
+    }]
+    assert indexer.get_summaries([str(tmpdir), str(project_dir)]) == [summary]
+
+    # not changed project
+    os.utime(str(config), (0, 0))
+    assert indexer.is_outdated(str(project_dir))
+    assert indexer.refresh(str(project_dir)).result() == (summary, False)
+
+    # libdeps of environment
+    project_dir.join(".pio", "libdeps", "native").ensure(dir=True)
+    assert indexer.is_outdated(str(project_dir))
+    summary, changed = indexer.refresh(str(project_dir)).result()
+    assert changed and summary['envLibStorages'][0]['name'] == "native"
+
+    # removed project
+    config.remove()
+    assert indexer.refresh(str(project_dir)).result() == (None, True)
+    assert indexer.get_summaries([str(project_dir)]) == []
+
+
+def test_rpc_streaming_helpers():
+    boards = [{"id": "board%d" % i, "name": "Board", "mcu": "x"}
+              for i in range(500)]
+    assert streaming.get_result_size(boards) == 1500
+    assert streaming.is_large_result(boards)
+    assert not streaming.is_large_result(boards[:10])
+    assert not streaming.is_large_result("text")
+    assert not streaming.is_large_result(None)
+
+    payload = json.dumps({"id": 1, "result": boards})
+    chunks = streaming.split_chunks(payload, 1000)
+    assert len(chunks) == -(-len(payload) // 1000)
+    assert "".join(chunks) == payload
+    assert streaming.split_chunks("", 10) == [""]
+
+    page = streaming.get_page(boards, offset=490, limit=20)
+    assert page['total'] == 500 and page['offset'] == 490
+    assert [item['id'] for item in page['items']] == [
+        "board%d" % i for i in range(490, 500)
+    ]
+    with pytest.raises(ValueError):
+        streaming.get_page({"items": []})
+
+
+def test_content_lru_cache():
+    cache = LRUCache(max_items=2)
+    cache.set("a", "content a", 60)
+    cache.set("b", "content b", 60)
+    assert cache.get("a") == "content a"
+    # "b" is the least recently used item now
+    cache.set("c", "content c", 60)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("c") == "content c"
+
+    # expired items
+    cache.set("a", "content a", -1)
+    assert cache.get("a", "default") == "default"
+    assert len(cache) == 1
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
 from platformio import app
 from platformio.commands.settings import cli
 
@@ -22,3 +24,49 @@ def test_settings_check(clirunner, validate_cliresult):
     assert result.output
     for item in app.DEFAULT_SETTINGS.items():
         assert item[0] in result.output
+
+
+def test_state_database(tmpdir):
+    tmpdir.join("appstate.json").write('{"last_version": "3.6.7"}')
+    db = app.StateDatabase(tmpdir.join("appstate.db").strpath)
+    # legacy JSON state is imported on the first access
+    assert db.get("last_version") == "3.6.7"
+    assert db.get("unknown", 13) == 13
+    db.set("last_check", {"platformio_upgrade": 1})
+    db.set("last_check", {"platformio_upgrade": 2})
+    assert db.get("last_check") == {"platformio_upgrade": 2}
+    db.delete("last_version")
+    assert db.as_dict() == {"last_check": {"platformio_upgrade": 2}}
+    db.close()
+
+
+def test_state_database_update(tmpdir):
+    path = tmpdir.join("appstate.db").strpath
+    # separate connections as in parallel processes
+    databases = [app.StateDatabase(path) for _ in range(4)]
+
+    def _update(db, name):
+        for i in range(20):
+            db.update("settings", lambda value, i=i: dict(value or {}, **{
+                "%s_%d" % (name, i): i
+            }))
+
+    threads = [
+        threading.Thread(target=_update, args=(db, "db%d" % n))
+        for n, db in enumerate(databases)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(databases[0].get("settings")) == 80
+    for db in databases:
+        db.close()
+
+
+def test_settings_cache(isolated_pio_home):
+    assert app.get_setting("check_platformio_interval") == 3
+    app.set_setting("check_platformio_interval", 5)
+    assert app.get_setting("check_platformio_interval") == 5
+    app.reset_settings()
+    assert app.get_setting("check_platformio_interval") == 3
@@ -12,11 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
 from os.path import join
+from time import sleep, time
+from xml.etree import ElementTree
 
+import click
 import pytest
 
-from platformio import util
+from platformio import fs, util
+from platformio.commands.test import scheduler
+from platformio.commands.test.native import NativeTestProcessor
+from platformio.commands.test.parser import UnityParser
+from platformio.commands.test.reports import JUnitSink
+from platformio.project.config import ProjectConfig
 
 
 def test_local_env():
@@ -29,3 +38,159 @@ def test_local_env():
     assert all(
         s in result['err'] for s in ("PASSED", "IGNORED", "FAILED")
     ), result['out']
+
+
+def test_jobs_scheduler():
+    running = []
+    overlaps = []
+    build_dirs = {}
+    # a native job waits for 2 other jobs, it fails when they are not
+    # run at once
+    barrier = threading.Barrier(3, timeout=10)
+
+    class _Job(scheduler.TestJob):
+
+        def run(self, build_dir=None):
+            for job in running:
+                if job.resources & self.resources:
+                    overlaps.append((job, self))
+                if build_dirs[job] == build_dir:
+                    overlaps.append((job, self))
+            build_dirs[self] = build_dir
+            running.append(self)
+            if self.env_name == "native":
+                barrier.wait()
+            else:
+                sleep(0.01)
+            running.remove(self)
+            return {"env": self.env_name, "test": self.test_name}
+
+    options = dict(upload_port=None,
+                   test_port=None,
+                   without_uploading=False,
+                   without_testing=False)
+    jobs = [
+        _Job(test, env, scheduler.get_job_resources(env_options, options), [])
+        for env, env_options in (("native", dict(platform="native")),
+                                 ("uno", dict(platform="atmelavr",
+                                              upload_port="/dev/ttyUSB0")),
+                                 ("due", dict(platform="atmelsam",
+                                              upload_port="/dev/ttyUSB0")))
+        for test in ("test_a", "test_b", "test_c")
+    ]
+    results = []
+    # tests of the same native environment are processed at once,
+    # boards on the same port are not
+    scheduler.run_jobs(jobs,
+                       3,
+                       lambda job, result: results.append(result),
+                       build_dir="/project/.pio/build")
+    assert len(results) == 9
+    assert not overlaps
+    assert sorted(build_dirs[job] or "" for job in jobs[:3]) == [
+        "", "/project/.pio/build-job1", "/project/.pio/build-job2"
+    ]
+
+
+def test_unity_parser():
+    events = []
+    parser = UnityParser([events.append], context=dict(env="uno"))
+    output = (b"\xff\xfe\xf0test/test_main.cpp:10:test_sum:PASS\n"
+              b"test/test_main.cpp:20:test_mul:FAIL: Expected 4 Was 5\r\n"
+              b"C:\\test\\test_main.cpp:30:test_div:IGNORE (12 ms)\n"
+              b"-----------------------\n"
+              b"3 Tests 1 Failures 1 Ignored\n")
+    # read by chunks as from a serial port
+    for i in range(0, len(output), 7):
+        parser.feed(output[i:i + 7])
+
+    cases = [e for e in events if e['type'] == "case"]
+    assert [(c['name'], c['status']) for c in cases] == [
+        ("test_sum", "PASSED"), ("test_mul", "FAILED"), ("test_div", "IGNORED")
+    ]
+    assert cases[0]['file'] == "test/test_main.cpp" and cases[0]['line'] == 10
+    assert cases[1]['message'] == "Expected 4 Was 5"
+    assert cases[2]['file'] == "C:\\test\\test_main.cpp"
+    assert cases[2]['duration'] == 0.012
+    assert all(e['env'] == "uno" for e in events)
+    assert events[-1] == dict(type="summary",
+                              tests=3,
+                              failures=1,
+                              ignored=1,
+                              env="uno")
+    assert parser.failed and parser.finished
+
+    # UTF-8 output is kept, a garbage is stripped only before results
+    events = []
+    parser = UnityParser([events.append])
+    parser.feed(u"test/t.c:10:test_x:FAIL: Expected '\u00e9' Was 'e'\n"
+                .encode("utf8") + b"\xff\xfeDone\n")
+    assert events[0]['type'] == "case"
+    assert events[0]['message'] == u"Expected '\u00e9' Was 'e'"
+    assert events[1] == dict(type="output", text=u"\ufffd\ufffdDone")
+    assert parser.failed
+
+    parser = UnityParser([events.append], timeout=0.01)
+    parser.feed("test.c:1:test_a:PASS\n")
+    assert not parser.is_timed_out()
+    sleep(0.05)
+    assert parser.is_timed_out()
+    assert parser.on_timeout()['status'] == "FAILED"
+    assert parser.failed
+
+
+@pytest.mark.skipif(util.get_systype().startswith("windows"),
+                    reason="a shell script is used as a test program")
+def test_native_processor_timeout(tmpdir):
+    tmpdir.join("platformio.ini").write("""
+[env:native]
+platform = native
+test_timeout = 1
+""")
+    program = tmpdir.join(".pio", "build", "native", "program")
+    program.write("""#!/bin/sh
+echo "test/test_main.c:5:test_first:PASS"
+sleep 30
+""", ensure=True)
+    program.chmod(0o755)
+
+    events = []
+    with fs.cd(tmpdir.strpath):
+        tp = NativeTestProcessor(
+            click.Context(click.Command("test")), "*", "native",
+            dict(project_config=ProjectConfig(
+                tmpdir.join("platformio.ini").strpath),
+                 project_dir=tmpdir.strpath,
+                 sinks=[events.append]))
+        start = time()
+        assert tp.run() is False
+    assert time() - start < 10
+    assert [(e['name'], e['status']) for e in events if e['type'] == "case"
+            ] == [("test_first", "PASSED"), ("timeout", "FAILED")]
+
+
+def test_junit_report(tmpdir):
+    path = tmpdir.join("report.xml").strpath
+    sink = JUnitSink(path)
+    parser = UnityParser([sink], context=dict(env="native", test="test_b"))
+    parser.feed("test.c:10:test_sum:PASS\n"
+                "test.c:20:test_mul:FAIL: Expected 4 Was 5\n"
+                "Debug output\n")
+    for result in (dict(env="native", test="test_a", succeeded=True,
+                        duration=1.5),
+                   dict(env="native", test="test_b", succeeded=False,
+                        duration=0.5), dict(env="uno", test="test_a")):
+        sink(dict(type="suite_end", **result))
+    sink.close()
+
+    suites = ElementTree.parse(path).getroot()
+    test_a, test_b, uno = suites.findall("testsuite")
+    assert test_a.get("name") == "native:test_a"
+    assert test_a.get("tests") == "1" and test_a.get("failures") == "0"
+    assert test_a.get("time") == "1.500"
+    assert test_b.get("tests") == "2" and test_b.get("failures") == "1"
+    assert test_b.find("testcase[@name='test_mul']/failure").get(
+        "message") == "Expected 4 Was 5"
+    assert test_b.find("testcase[@name='test_sum']").get("line") == "10"
+    assert test_b.find("system-out").text == "Debug output"
+    assert uno.get("skipped") == "1"
@@ -13,12 +13,20 @@
 # limitations under the License.
 
 import os
+import threading
 
 import pytest
 from click.testing import CliRunner
 
 from platformio import util
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qsl
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urlparse import parse_qsl
+
 
 @pytest.fixture(scope="session")
 def validate_cliresult():
@@ -52,3 +60,31 @@ def isolated_pio_home(request, tmpdir_factory):
 @pytest.fixture(scope="function")
 def without_internet(monkeypatch):
     monkeypatch.setattr(util, "_internet_on", lambda: False)
+
+
+@pytest.fixture(scope="function")
+def telemetry_collector(monkeypatch):
+    """Local stand-in for Measurement Protocol batch endpoint"""
+    hits = []
+
+    class _Handler(BaseHTTPRequestHandler):
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            data = self.rfile.read(int(self.headers['Content-Length']))
+            for line in data.decode().split("\n"):
+                hits.append(dict(parse_qsl(line)))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    monkeypatch.setenv("PLATFORMIO_TELEMETRY_URL",
+                       "http://127.0.0.1:%d/batch" % server.server_port)
+    yield hits
+    server.shutdown()
+    server.server_close()
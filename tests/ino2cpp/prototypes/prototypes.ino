@@ -0,0 +1,61 @@
+/*
+ * Cases which confuse a regular expression based parser:
+ * braces in literals, multi-line signatures, pointers to functions
+ * used before definition, class methods and default arguments
+ */
+
+const char braces[] = "{ not a block; }";
+const char brace = '{';
+
+struct Handler {
+    void (*callback)(int);
+};
+
+Handler handlers[] = {{&onEvent}, {&onError}};
+
+class Counter {
+public:
+    int value(int delta) {
+        if (delta) {
+            return delta;
+        }
+        return 0;
+    }
+};
+
+int withDefault(int a = 1) {
+    return a;
+}
+
+void setup() {
+    for (int i = 0; i < 2; i++) {
+        handlers[i].callback(multiLine(i,
+                                       1));
+    }
+    withDefault();
+}
+
+void loop() {
+    while (false) {
+    }
+}
+
+unsigned long
+multiLine(int a,
+          int b) {
+    return a + b;
+}
+
+void onEvent(int code) {
+    (void)code;
+}
+
+void onError(int code) {
+    onEvent(code);
+}
+
+static inline int *
+getBuffer() {
+    static int buffer[4];
+    return buffer;
+}
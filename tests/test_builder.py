@@ -12,6 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import subprocess
+from os.path import getmtime, isfile, join
+from shutil import which
+
+import pytest
+
+from platformio import fs
 from platformio.commands.run import cli as cmd_run
 
 
@@ -101,3 +109,232 @@ int main() {
     assert "-DTMP_MACRO1" not in build_output
     assert "-Os" not in build_output
     assert str(tmpdir) not in build_output
+
+
+def test_build_pch(clirunner, validate_cliresult, tmpdir):
+    tmpdir.join("platformio.ini").write("""
+[env:native]
+platform = native
+build_pch = pch.h
+build_flags = -Winvalid-pch
+""")
+    tmpdir.mkdir("include").join("pch.h").write("""
+#include <string>
+#define PCH_INCLUDED 1
+""")
+    tmpdir.mkdir("src").join("main.cpp").write("""
+#ifndef PCH_INCLUDED
+#error "PCH_INCLUDED"
+#endif
+
+int main() {
+    std::string s;
+    return s.size();
+}
+""")
+
+    result = clirunner.invoke(
+        cmd_run, ["--project-dir", str(tmpdir), "--verbose"])
+    validate_cliresult(result)
+    assert "-include" in result.output
+    assert "invalid" not in result.output
+    assert tmpdir.join(".pio", "build", "native", "pch").check(dir=1)
+
+
+def _new_scons_env():
+    Environment = pytest.importorskip("SCons.Environment").Environment
+    return Environment(
+        tools=["platformio"],
+        toolpath=[join(fs.get_source_dir(), "builder", "tools")])
+
+
+def test_unflags_processing():
+    env = _new_scons_env()
+    env.Append(CCFLAGS=["-O2", "-Wall", "-O2", ("-include", "a.h")],
+               LINKFLAGS=["-O2", "-s"],
+               CPPDEFINES=[("A", 1), "B", "C"])
+    env.ProcessUnFlags("-O2 -DA -DC")
+    assert env['CCFLAGS'] == ["-Wall", ("-include", "a.h")]
+    assert env['LINKFLAGS'] == ["-s"]
+    assert env['CPPDEFINES'] == ["B"]
+
+
+def test_build_graph_of_large_framework(tmpdir):
+    env = _new_scons_env()
+    src_dir = tmpdir.mkdir("framework")
+    for i in range(100):
+        for j in range(30):
+            src_dir.join("module%d" % i, "file%d.c" % j).write("",
+                                                               ensure=True)
+    flags = ["-DMACRO_%d=%d" % (i, i) for i in range(2000)]
+    env.Append(CCFLAGS=["-Wflag%d" % i for i in range(2000)])
+
+    env.ProcessFlags(flags)
+    env.ProcessUnFlags(flags[::2] + ["-Wflag%d" % i for i in range(1000)])
+    sources = env.CollectBuildFiles(tmpdir.join("build").strpath,
+                                    src_dir.strpath)
+    assert len(sources) == 3000
+    assert len(env['CPPDEFINES']) == 1000
+    assert len(env['CCFLAGS']) == 1000
+
+
+def test_compile_cache(tmpdir):
+    pytest.importorskip("SCons")
+    from platformio.builder.tools import piocache  # pylint: disable=import-outside-toplevel
+
+    assert piocache.parse_filesize("5GB") == 5 * 1024**3
+    assert piocache.parse_filesize("100 kb") == 100 * 1024
+    with pytest.raises(ValueError):
+        piocache.parse_filesize("5 apples")
+
+    keys = []
+    for project in ("project1", "project2"):
+        project_dir = tmpdir.join(project).strpath
+        cache = piocache.CompileCache(tmpdir.join("cache").strpath, 10240,
+                                      [(project_dir, "$PROJECT_DIR")])
+        keys.append(
+            cache.compute_key(
+                "gcc -c -I%s/include %s/src/main.c" %
+                (project_dir, project_dir),
+                [(join(project_dir, "src", "main.c"), "csig1")]))
+    assert keys[0] == keys[1]
+    assert cache.compute_key("gcc -c main.c", [("main.c", "csig2")]) != keys[0]
+    # a compiler does not remap paths in objects
+    command = "gcc -c %s/src/main.c" % project_dir
+    assert cache.compute_key(command, [], normalize=False) != (
+        cache.compute_key(command.replace(project_dir, "$PROJECT_DIR"), [],
+                          normalize=False))
+    assert cache.get_prefix_map_flags() == [
+        "-ffile-prefix-map=%s=PROJECT_DIR" % project_dir
+    ]
+
+    obj = tmpdir.join("main.o")
+    obj.write("x" * 4096)
+    assert not cache.fetch(keys[0], tmpdir.join("copy.o").strpath)
+    assert cache.store(keys[0], obj.strpath)
+    assert cache.fetch(keys[0], tmpdir.join("copy.o").strpath)
+    assert tmpdir.join("copy.o").read() == obj.read()
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+    # least recently used objects are evicted first
+    for i in range(3):
+        cache.store("%032d" % i, obj.strpath)
+    cache.fetch(keys[0], tmpdir.join("copy.o").strpath)
+    assert cache.evict() <= 10240 * piocache.BUILD_CACHE_EVICT_RATIO
+    assert isfile(cache.get_path(keys[0]))
+
+    # a used size is tracked in stats, the cache is walked only when
+    # the limit could be exceeded
+    cache.print_summary()
+    assert cache.load_stats()['size'] == 4096 * 2
+    cache = piocache.CompileCache(tmpdir.join("cache").strpath, 10240, [])
+    cache.fetch(keys[0], tmpdir.join("copy.o").strpath)
+    cache.print_summary()
+    assert cache.load_stats()['size'] == 4096 * 2
+    cache.store("%032d" % 4, obj.strpath)
+    cache.store("%032d" % 5, obj.strpath)
+    cache.print_summary()
+    assert cache.load_stats()['size'] <= (10240 *
+                                          piocache.BUILD_CACHE_EVICT_RATIO)
+
+
+def test_unity_build_grouping(tmpdir):
+    env = _new_scons_env()
+    src_dir = tmpdir.mkdir("src")
+    for i in range(4):
+        src_dir.join("module%d.cpp" % i).write("int module%d() {}\n" % i)
+    src_dir.join("clash1.c").write("static int helper(void) { return 1; }\n")
+    src_dir.join("clash2.c").write("static int helper(void) { return 2; }\n")
+    src_dir.join("anonymous.cpp").write("namespace {\nint helper;\n}\n")
+    src_dir.join("startup.S").write("")
+    env.Replace(BUILD_DIR=tmpdir.join("build").strpath)
+
+    variant_dir = tmpdir.join("build", "lib").strpath
+    nodes = env.GroupUnityBuildFiles(
+        variant_dir, env.CollectBuildFiles(variant_dir, src_dir.strpath))
+    names = sorted(node.name for node in nodes)
+    assert names == [
+        "anonymous.cpp", "clash1.c", "clash2.c", "startup.S", "unity_0.cpp"
+    ]
+    unity_node = [node for node in nodes if node.name == "unity_0.cpp"][0]
+    with open(unity_node.get_abspath()) as fp:
+        contents = fp.read()
+    for i in range(4):
+        assert "module%d.cpp" % i in contents
+
+
+def test_size_data(tmpdir):
+    if not which("gcc") or not which("size"):
+        pytest.skip("GCC toolchain is not installed")
+    pytest.importorskip("SCons")
+    from platformio.builder.tools import piosize  # pylint: disable=import-outside-toplevel
+
+    tmpdir.join("util.c").write("""
+int util_buffer[256];
+int util_sum(int a, int b) { return a + b; }
+""")
+    tmpdir.join("main.c").write("""
+static const char message[] = "hello";
+int counter = 5;
+int util_sum(int a, int b);
+int main() { return util_sum(counter, message[0]); }
+""")
+    with fs.cd(tmpdir.strpath):
+        for name in ("util", "main"):
+            assert not subprocess.call(["gcc", "-c", name + ".c"])
+        assert not subprocess.call(["ar", "rcs", "libutil.a", "util.o"])
+        assert not subprocess.call(
+            ["gcc", "-o", "program.elf", "main.o", "-L.", "-lutil"])
+        for args in (["-B", "-d"], ["-A", "-d"]):
+            expected = subprocess.check_output(["size"] + args +
+                                               ["program.elf"]).decode()
+            output = piosize.emulate_size_tool(
+                ["$SIZETOOL"] + args + ["$SOURCES"], "program.elf")
+            # skip a file name
+            assert expected.split()[1:] == output.split()[1:]
+        assert piosize.emulate_size_tool(["$SIZETOOL", "-x"],
+                                         "program.elf") is None
+
+    data = piosize.get_size_data(
+        tmpdir.join("program.elf").strpath,
+        [tmpdir.join("main.o").strpath,
+         tmpdir.join("libutil.a").strpath])
+    assert data['flash'] > 0 and data['ram'] >= 256 * 4
+    symbols = {item['name']: item for item in data['symbols']}
+    assert symbols['util_buffer']['size'] == 256 * 4
+    assert symbols['util_sum']['object'].endswith("libutil.a(util.o)")
+    assert symbols['counter']['object'].endswith("main.o")
+    assert symbols['message']['object'] == "main.c"
+    objects = {item['path']: item for item in data['objects']}
+    assert objects[tmpdir.join("libutil.a").strpath +
+                   "(util.o)"]['ram'] == 256 * 4
+
+
+def test_test_output_export(tmpdir):
+    Environment = pytest.importorskip("SCons.Environment").Environment
+    env = Environment(tools=["piomisc"],
+                      toolpath=[join(fs.get_source_dir(), "builder", "tools")],
+                      BUILD_DIR=tmpdir.strpath,
+                      PIOPLATFORM="atmelavr",
+                      PIOFRAMEWORK=["arduino"])
+    options = {"test_speed": 9600}
+    env.AddMethod(lambda env, name, default=None: options.get(name, default),
+                  "GetProjectOption")
+
+    path = env.GenerateTestOutputExport()
+    assert path == tmpdir.join("UnityTestOutput", "output_export.cpp").strpath
+    contents = tmpdir.join("UnityTestOutput", "output_export.cpp").read()
+    assert "#include <Arduino.h>" in contents
+    assert "Serial.begin(9600);" in contents
+
+    # the same output is not rewritten, an object is shared by test suites
+    mtime = getmtime(path) - 10
+    os.utime(path, (mtime, mtime))
+    env.GenerateTestOutputExport()
+    assert getmtime(path) == mtime
+
+    options['test_transport'] = "custom"
+    env.GenerateTestOutputExport()
+    assert getmtime(path) != mtime
+    assert "unittest_uart_putchar(c);" in tmpdir.join(
+        "UnityTestOutput", "output_export.cpp").read()
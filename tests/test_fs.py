@@ -0,0 +1,84 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from time import time
+
+import pytest
+
+from platformio import fs
+
+SRC_EXTS = ["c", "cpp", "h", "S"]
+
+FILTERS = [
+    "+<*> -<.git/> -<.svn/>",
+    "+<*> -<examples/> -<test*>",
+    "+<main.cpp> +<lib/*/src/>",
+    "+<.> -<lib/**/*.h>",
+    "+<*/*.c> -<.*>",
+    "-<*> +<lib/>",
+    ["+<*>", "-<lib/foo/>", "+<lib/foo/src/foo.c>"],
+    "+<../shared/*>",
+]
+
+
+def _make_tree(root):
+    files = [
+        "main.cpp", "main.h", "readme.md", ".hidden.c", "lib/foo/src/foo.c",
+        "lib/foo/src/foo.h", "lib/foo/.cache/tmp.c", "lib/bar/bar.cpp",
+        "examples/demo/demo.cpp", "test_one/test.c", "src/.git/obj.c",
+        ".git/objects/aa/blob.c", ".svn/entries.c"
+    ]
+    for path in files:
+        root.join(*path.split("/")).write("", ensure=True)
+    root.dirpath().join("shared").join("common.c").write("", ensure=True)
+
+
+@pytest.mark.parametrize("src_filter", FILTERS)
+def test_match_src_files(tmpdir, src_filter):
+    src_dir = tmpdir.join("project")
+    _make_tree(src_dir)
+    flat_filter = src_filter
+    if isinstance(flat_filter, list):
+        flat_filter = " ".join(flat_filter)
+    for exts in (None, SRC_EXTS):
+        assert fs.match_src_files(src_dir.strpath, src_filter, exts) == \
+            fs._match_src_files_glob(  # pylint: disable=protected-access
+                src_dir.strpath, flat_filter.replace("/", os.sep), exts)
+
+
+def test_match_src_files_cache(tmpdir):
+    src_dir = tmpdir.join("project")
+    _make_tree(src_dir)
+    assert "new.c" not in fs.match_src_files(src_dir.strpath, "+<*>")
+    src_dir.join("new.c").write("")
+    os.utime(src_dir.strpath, (time() + 10, time() + 10))
+    assert "new.c" in fs.match_src_files(src_dir.strpath, "+<*>")
+
+
+def test_match_src_files_excluded_vcs_dirs(tmpdir):
+    src_dir = tmpdir.join("project")
+    for i in range(20):
+        src_dir.join("src", "file%d.cpp" % i).write("", ensure=True)
+    for i in range(100):
+        for j in range(40):
+            src_dir.join(".git", "objects", "%02x" % i,
+                         "%038x" % j).write("", ensure=True)
+
+    src_filter = "+<*> -<.git/> -<.svn/>"
+    legacy = fs._match_src_files_glob(  # pylint: disable=protected-access
+        src_dir.strpath, src_filter, SRC_EXTS)
+    assert len(legacy) == 20
+    assert fs.SrcFilter(src_filter).match(src_dir.strpath,
+                                          SRC_EXTS) == legacy
@@ -12,10 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 from os import listdir
-from os.path import dirname, isdir, join, normpath
+from os.path import dirname, getmtime, isdir, join, normpath
 
+import pytest
+
+from platformio import fs
 from platformio.commands.ci import cli as cmd_ci
+from platformio.compat import get_file_contents
 
 INOTEST_DIR = normpath(join(dirname(__file__), "ino2cpp"))
 
@@ -49,3 +54,80 @@ def test_warning_line(clirunner, validate_cliresult):
         cmd_ci, [join(INOTEST_DIR, "strmultilines"), "-b", "uno"])
     validate_cliresult(result)
     assert ('main.ino:75:2: warning: #warning "Line 75"' in result.output)
+
+
+def _new_scons_env(tmpdir, src_dir):
+    Environment = pytest.importorskip("SCons.Environment").Environment
+    return Environment(tools=["piomisc"],
+                       toolpath=[join(fs.get_source_dir(), "builder", "tools")],
+                       ENV=dict(PATH=os.environ['PATH']),
+                       CXX="g++",
+                       PROJECTSRC_DIR=src_dir,
+                       BUILD_DIR=tmpdir.join("build").strpath)
+
+
+def test_converter_cache(tmpdir):
+    src_dir = tmpdir.mkdir("src")
+    src_dir.join("main.ino").write(
+        get_file_contents(join(INOTEST_DIR, "basic", "basic.ino")))
+    env = _new_scons_env(tmpdir, src_dir.strpath)
+
+    env.ConvertInoToCpp()
+    out_file = env['PIOINO2CPP']
+    assert out_file == tmpdir.join("build", "sketch", "main.ino.cpp").strpath
+    assert "void fooCallback();" in get_file_contents(out_file)
+    mtime = getmtime(out_file)
+
+    # unchanged sketch is not converted again
+    os.utime(out_file, (mtime - 10, mtime - 10))
+    env.ConvertInoToCpp()
+    assert getmtime(out_file) == mtime - 10
+
+    src_dir.join("main.ino").write("\nvoid newFunc() {}\n", mode="a")
+    env.ConvertInoToCpp()
+    assert getmtime(out_file) != mtime - 10
+    assert "void newFunc();" in get_file_contents(out_file)
+    assert not src_dir.join("main.ino.cpp").check()
+
+
+def test_prototypes(tmpdir):
+    env = _new_scons_env(tmpdir, join(INOTEST_DIR, "prototypes"))
+    env.ConvertInoToCpp()
+    lines = get_file_contents(env['PIOINO2CPP']).split("\n")
+    start = lines.index("void setup();")
+    assert lines[start:start + 6] == [
+        "void setup();",
+        "void loop();",
+        "unsigned long multiLine(int a, int b);",
+        "void onEvent(int code);",
+        "void onError(int code);",
+        "static inline int * getBuffer();",
+    ]
+    assert lines[start + 6].startswith("#line 14 ")
+    assert lines[start + 6].endswith('prototypes.ino"')
+    assert lines[start + 7].startswith("Handler handlers[]")
+
+
+def test_benchmark_prototypes(tmpdir):
+    env = _new_scons_env(tmpdir, tmpdir.strpath)
+    from platformio.builder.tools.piomisc import \
+        InoToCPPConverter  # pylint: disable=import-outside-toplevel
+    converter = InoToCPPConverter(env)
+    lines = ['# 1 "%s"' % tmpdir.join("main.cpp"), "#include <Arduino.h>"]
+    # a large sketch split into files with long expressions and literals
+    for i in range(100):
+        lines.append('# 1 "%s"' % tmpdir.join("file%d.ino" % i))
+        for j in range(100):
+            lines.append("Handler handler%d_%d(&func%d_%d);" % (i, j, i, j))
+        for j in range(100):
+            lines.extend([
+                'const char str%d_%d[] = "%s";' % (i, j, "{(" * 50),
+                "int func%d_%d(int a, int b) {" % (i, j),
+                "    return (%s);" % " + ".join(["a * b"] * 50),
+                "}",
+            ])
+
+    contents = converter.append_prototypes("\n".join(lines))
+    assert contents.count("int a, int b);") == 100 * 100
+    assert contents.index("int func0_0(int a, int b);") < contents.index(
+        "Handler handler0_0")
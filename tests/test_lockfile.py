@@ -0,0 +1,109 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from time import sleep, time
+
+import pytest
+
+from platformio import exception, lockfile
+from platformio.lockfile import LockFile
+
+pytestmark = pytest.mark.skipif(
+    lockfile.LOCKFILE_CURRENT_INTERFACE != lockfile.LOCKFILE_INTERFACE_FCNTL,
+    reason="requires fcntl")
+
+
+def _hold_in_thread(path, seconds, **kwargs):
+    acquired = threading.Event()
+
+    def _target():
+        with LockFile(path, **kwargs):
+            acquired.set()
+            sleep(seconds)
+
+    thread = threading.Thread(target=_target)
+    thread.start()
+    acquired.wait()
+    return thread
+
+
+def test_blocking_wait(tmpdir):
+    path = str(tmpdir.join("storage"))
+    thread = _hold_in_thread(path, 0.5)
+    lock = LockFile(path, delay=10)
+    start = time()
+    lock.acquire()
+    # woken up by release, not by the polling delay
+    assert 0.3 < time() - start < 5
+    assert lock.wait_time > 0.3
+    lock.release()
+    thread.join()
+    stats = lockfile.get_contention_stats(path)
+    assert stats['contended'] == 1
+    assert stats['max_wait_time'] > 0.3
+
+
+def test_timeout(tmpdir):
+    path = str(tmpdir.join("storage"))
+    thread = _hold_in_thread(path, 1)
+    with pytest.raises(exception.LockFileTimeoutError):
+        LockFile(path, timeout=0.2).acquire()
+    thread.join()
+
+
+def test_shared_and_nested(tmpdir):
+    path = str(tmpdir.join("storage"))
+    thread = _hold_in_thread(path, 1, shared=True)
+    start = time()
+    with LockFile(path, shared=True):
+        assert time() - start < 0.5
+    thread.join()
+
+    with LockFile(path):
+        # re-entrant within the same thread
+        with LockFile(path, timeout=0.2):
+            pass
+        with LockFile(path, shared=True, timeout=0.2):
+            pass
+    assert not tmpdir.join("storage.lock").exists()
+
+
+def test_upgrade_nested_shared(tmpdir):
+    path = str(tmpdir.join("storage"))
+
+    def _try_shared():
+        result = []
+
+        def _target():
+            try:
+                with LockFile(path, shared=True, timeout=0.2):
+                    result.append(True)
+            except exception.LockFileTimeoutError:
+                result.append(False)
+
+        thread = threading.Thread(target=_target)
+        thread.start()
+        thread.join()
+        return result == [True]
+
+    with LockFile(path, shared=True):
+        # e.g. install a package while reading installed ones
+        start = time()
+        with LockFile(path, timeout=1):
+            assert time() - start < 0.5
+            assert not _try_shared()
+        # downgraded, other readers are allowed again
+        assert _try_shared()
+    assert not tmpdir.join("storage.lock").exists()
@@ -35,6 +35,7 @@ def test_check_pio_upgrade(clirunner, isolated_pio_home, validate_cliresult):
     # check development version
     _patch_pio_version("3.0.0-a1")
     app.set_state_item("last_check", last_check)
+    maintenance.check_updates(["platformio"])
     result = clirunner.invoke(cli_pio, ["platform", "list"])
     validate_cliresult(result)
     assert "There is a new version" in result.output
@@ -43,6 +44,7 @@ def test_check_pio_upgrade(clirunner, isolated_pio_home, validate_cliresult):
     # check stable version
     _patch_pio_version("2.11.0")
     app.set_state_item("last_check", last_check)
+    maintenance.check_updates(["platformio"])
     result = clirunner.invoke(cli_pio, ["platform", "list"])
     validate_cliresult(result)
     assert "There is a new version" in result.output
@@ -62,6 +64,7 @@ def test_check_lib_updates(clirunner, isolated_pio_home, validate_cliresult):
     interval = int(app.get_setting("check_libraries_interval")) * 3600 * 24
     last_check = {"libraries_update": time() - interval - 1}
     app.set_state_item("last_check", last_check)
+    maintenance.check_updates(["libraries"])
 
     result = clirunner.invoke(cli_pio, ["lib", "-g", "list"])
     validate_cliresult(result)
@@ -87,6 +90,7 @@ def test_check_and_update_libraries(clirunner, isolated_pio_home,
     assert len(prev_data) == 1
 
     # initiate auto-updating
+    maintenance.check_updates(["libraries"])
     result = clirunner.invoke(cli_pio, ["lib", "-g", "show", "ArduinoJson"])
     validate_cliresult(result)
     assert ("There are the new updates for libraries (ArduinoJson)" in
@@ -118,6 +122,7 @@ def test_check_platform_updates(clirunner, isolated_pio_home,
     interval = int(app.get_setting("check_platforms_interval")) * 3600 * 24
     last_check = {"platforms_update": time() - interval - 1}
     app.set_state_item("last_check", last_check)
+    maintenance.check_updates(["platforms"])
 
     result = clirunner.invoke(cli_pio, ["platform", "list"])
     validate_cliresult(result)
@@ -142,6 +147,7 @@ def test_check_and_update_platforms(clirunner, isolated_pio_home,
     assert len(prev_data) == 1
 
     # initiate auto-updating
+    maintenance.check_updates(["platforms"])
     result = clirunner.invoke(cli_pio, ["platform", "show", "native"])
     validate_cliresult(result)
     assert "There are the new updates for platforms (native)" in result.output
@@ -152,3 +158,69 @@ def test_check_and_update_platforms(clirunner, isolated_pio_home,
     result = clirunner.invoke(cli_pio, ["platform", "list", "--json-output"])
     validate_cliresult(result)
     assert prev_data[0]['version'] != json.loads(result.output)[0]['version']
+
+
+def test_background_update_checks(clirunner, isolated_pio_home,
+                                  validate_cliresult, monkeypatch):
+    spawned = []
+    monkeypatch.setattr(maintenance, "spawn_detached_process",
+                        spawned.append)
+
+    interval = int(app.get_setting("check_platformio_interval")) * 3600 * 24
+    app.set_state_item(
+        "last_check", {
+            "platformio_upgrade": time() - interval - 1,
+            "platforms_update": time(),
+            "libraries_update": time()
+        })
+    result = clirunner.invoke(cli_pio, ["settings", "get"])
+    validate_cliresult(result)
+    assert len(spawned) == 1
+    assert "check_updates(['platformio'])" in spawned[0][-1]
+    assert not maintenance.get_due_update_checks()
+
+    # the next command shows results of the checker
+    app.set_state_item("update_notices", {
+        "platformio": "99.0.0",
+        "libraries": ["ArduinoJson"]
+    })
+    result = clirunner.invoke(cli_pio, ["settings", "get"])
+    validate_cliresult(result)
+    assert "There is a new version 99.0.0" in result.output
+    assert ("There are the new updates for libraries (ArduinoJson)" in
+            result.output)
+    assert len(spawned) == 1
+
+    result = clirunner.invoke(cli_pio, ["settings", "get"])
+    validate_cliresult(result)
+    assert "There is a new version" not in result.output
+
+
+def test_core_packages_notice(isolated_pio_home, monkeypatch):
+    updates = []
+    monkeypatch.setattr("platformio.managers.core.update_core_packages",
+                        lambda **kwargs: updates.append(kwargs))
+    # core packages are updated by a command, not by a background checker
+    app.set_state_item("update_notices", {"core_packages": ["tool-scons"]})
+    maintenance.show_update_notices(None)
+    assert updates == [dict(silent=True)]
+    assert not app.get_state_item("update_notices")
+
+
+def test_update_checker_offline(isolated_pio_home, without_internet):
+    app.delete_state_item("update_notices")
+    assert maintenance.check_updates(["platformio", "platforms"]) == {
+        "failed": True
+    }
+    assert app.get_state_item("update_notices") == {"failed": True}
+
+    # not shown notices are kept, fresh results override stale ones
+    app.set_state_item("update_notices", {
+        "failed": "stale",
+        "libraries": ["ArduinoJson"]
+    })
+    maintenance.check_updates(["platformio"])
+    assert app.get_state_item("update_notices") == {
+        "failed": True,
+        "libraries": ["ArduinoJson"]
+    }
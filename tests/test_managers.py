@@ -15,6 +15,7 @@
 import json
 from os.path import join
 
+from platformio.lockfile import LockFile
 from platformio.managers.package import PackageManager
 from platformio.project.helpers import get_project_core_dir
 
@@ -274,3 +275,20 @@ def test_get_package():
             continue
         for key, value in test[1].items():
             assert manifest[key] == value, test
+
+
+def test_get_installed_readonly_storage(isolated_pio_home, tmpdir,
+                                        monkeypatch):
+    pm = PackageManager(join(get_project_core_dir(), "packages"))
+    tmp_dir = tmpdir.mkdir("tmp-package")
+    tmp_dir.join("package.json").write(
+        json.dumps(dict(name="readonly", version="1.0.0")))
+    pm._install_from_url("readonly", f"file://{str(tmp_dir)}")
+    pm.cache_reset()
+
+    def _open(_):
+        raise PermissionError("Read-only file system")
+
+    # a lock file can not be created in a read-only storage
+    monkeypatch.setattr(LockFile, "_open", _open)
+    assert "readonly" in [p['name'] for p in pm.get_installed()]
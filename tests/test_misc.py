@@ -12,10 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import subprocess
+import sys
+from time import time
+
 import pytest
 import requests
 
-from platformio import exception, util
+from platformio import __version__, app, exception, util
 
 
 def test_platformio_cli():
@@ -40,3 +45,55 @@ def test_api_cache(monkeypatch, isolated_pio_home):
     assert result and "boards" in result
     monkeypatch.setattr(util, '_internet_on', lambda: False)
     assert util.get_api_result(**api_kwargs) == result
+
+
+def test_parse_duration():
+    assert util.parse_duration("7d") == 7 * 86400
+    assert util.parse_duration("30s") == 30
+    with pytest.raises(AssertionError):
+        util.parse_duration("30")
+
+
+def _get_cli_imports(args):
+    """Returns names of imported modules for a command"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "platformio"] + args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=dict(os.environ,
+                 PLATFORMIO_SETTING_ENABLE_TELEMETRY="No",
+                 PYTHONPATH=os.pathsep.join(sys.path)),
+        check=True)
+    names = set()
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        names.add(line[12:].split("|")[2].strip())
+    return names
+
+
+@pytest.mark.parametrize("args", [["--version"], ["settings", "get"],
+                                  ["device", "list", "--json-output"]])
+def test_cli_lazy_imports(isolated_pio_home, args):
+    # nothing to do for maintenance hooks
+    app.set_state_item("last_version", __version__)
+    app.set_state_item("last_check", {
+        "platformio_upgrade": int(time()),
+        "platforms_update": int(time()),
+        "libraries_update": int(time())
+    })
+
+    names = _get_cli_imports(args)
+    for name in ("requests", "semantic_version",
+                 "platformio.managers.platform", "platformio.commands.lib"):
+        assert name not in names
+    if args == ["--version"]:
+        assert "platformio.maintenance" not in names
+
+
+def test_content_cache_expire_time(isolated_pio_home):
+    with app.ContentCache() as cc:
+        assert cc.get_expire_time("missing-key") is None
+        assert cc.set("content-key", "content", "10s")
+        assert cc.get("content-key") == "content"
+        assert 0 < cc.get_expire_time("content-key") - time() <= 10
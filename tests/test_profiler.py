@@ -0,0 +1,56 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from time import sleep, time
+
+from platformio.profiler import (Profiler, get_phase_durations,
+                                 get_slowest_events, load_trace_events)
+
+
+def test_profiler(tmpdir):
+    profiler = Profiler()
+    profiler.reset()
+
+    # disabled profiler does not collect anything
+    with profiler.phase("ignored"):
+        pass
+    assert not profiler.get_events()
+
+    profiler.enable()
+    try:
+        with profiler.phase("LoadPioPlatform"):
+            sleep(0.01)
+        with profiler.phase("Build graph"):
+            pass
+        for i, duration in enumerate((0.3, 0.1, 0.2)):
+            profiler.add_event("src/file%d.cpp" % i, time(), duration,
+                               "compile")
+        trace_path = profiler.save(tmpdir.join("build", "trace.json").strpath)
+        # a trace of the last events only
+        last_path = profiler.save(tmpdir.join("build", "last.json").strpath,
+                                  profiler.get_events()[-2:])
+    finally:
+        profiler.disable()
+        profiler.reset()
+
+    events = load_trace_events(trace_path)
+    assert len(events) == 5
+    assert all(e['ph'] == "X" and "pid" in e and "tid" in e for e in events)
+    durations = get_phase_durations(events)
+    assert set(durations) == set(["LoadPioPlatform", "Build graph"])
+    assert durations['LoadPioPlatform'] >= 0.01
+    assert [e['name'] for e in get_slowest_events(events, "compile", 2)
+            ] == ["src/file0.cpp", "src/file2.cpp"]
+    assert load_trace_events(tmpdir.join("unknown.json").strpath) == []
+    assert load_trace_events(last_path) == events[-2:]
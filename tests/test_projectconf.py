@@ -12,12 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
 
 import pytest
 
+from platformio import __version__
 from platformio.exception import UnknownEnvNames
 from platformio.project.config import ConfigParser, ProjectConfig
+from platformio.project.helpers import (PROJECT_IDE_DATA_VERSION,
+                                        ProjectLayout,
+                                        compute_project_checksum,
+                                        get_project_ide_data_deps,
+                                        get_project_ide_data_path,
+                                        get_project_options_sysenv,
+                                        load_project_ide_data,
+                                        load_project_snapshot,
+                                        save_project_snapshot)
 
 BASE_CONFIG = """
 [platformio]
@@ -195,3 +206,99 @@ def test_empty_config():
     os.environ["PLATFORMIO_HOME_DIR"] = "/custom/core/dir"
     assert config.get("platformio", "core_dir") == "/custom/core/dir"
     del os.environ["PLATFORMIO_HOME_DIR"]
+
+
+def test_project_snapshot(tmpdir, monkeypatch):
+    monkeypatch.setenv("PLATFORMIO_CORE_DIR", str(tmpdir.mkdir("core")))
+    project_dir = tmpdir.mkdir("project")
+    project_dir.join("platformio.ini").write("""
+[platformio]
+src_dir = sources
+
+[env:native]
+platform = native
+build_flags = -DSNAPSHOT
+""")
+    with project_dir.as_cwd():
+        config = ProjectConfig(project_dir.join("platformio.ini").strpath)
+        path = save_project_snapshot(
+            config, "native",
+            project_dir.join(".pio", "build", "native", "project.json").strpath)
+        snapshot = load_project_snapshot(path)
+    assert snapshot['env'] == "native"
+    assert snapshot['options'] == {
+        "platform": "native",
+        "build_flags": ["-DSNAPSHOT"]
+    }
+    assert snapshot['dirs']['src_dir'] == project_dir.join("sources").strpath
+    assert snapshot['dirs']['core_dir'] == tmpdir.join("core").strpath
+    assert load_project_snapshot(tmpdir.join("unknown.json").strpath) is None
+
+
+def test_project_layout(tmpdir, monkeypatch):
+    monkeypatch.setenv("PLATFORMIO_CORE_DIR", str(tmpdir.mkdir("core")))
+    project_dir = tmpdir.mkdir("project")
+    project_dir.join("platformio.ini").write("""
+[platformio]
+build_dir = custom_build
+""")
+    layout = ProjectLayout.get_instance(project_dir.strpath)
+    assert ProjectLayout.get_instance(project_dir.strpath) is layout
+    assert layout.get_dir("core_dir") == tmpdir.join("core").strpath
+    assert layout.get_dir("build_dir") == project_dir.join(
+        "custom_build").strpath
+    assert layout.get_dir("src_dir") == project_dir.join("src").strpath
+    assert layout.get_dir("build_cache_dir") is None
+
+    # system environment is a part of the key
+    monkeypatch.setenv("PLATFORMIO_SRC_DIR", project_dir.join("app").strpath)
+    layout = ProjectLayout.get_instance(project_dir.strpath)
+    assert layout.get_dir("src_dir") == project_dir.join("app").strpath
+
+
+def test_project_ide_data_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("PLATFORMIO_CORE_DIR", str(tmpdir.mkdir("core")))
+    project_dir = tmpdir.mkdir("project")
+    project_dir.join("platformio.ini").write("""
+[env:native]
+platform = native
+""")
+    project_dir.mkdir("src").join("main.c").write("int main() {}")
+    manifest = tmpdir.join("platform.json")
+    manifest.write("{}")
+    lib_dir = tmpdir.mkdir("libraries")
+    lib_dir.join("Foo", "src", "Foo.h").write("", ensure=True)
+    ide_data = {"env_name": "native", "includes": [], "defines": []}
+    with project_dir.as_cwd():
+        config = ProjectConfig.get_instance(
+            project_dir.join("platformio.ini").strpath)
+        path = get_project_ide_data_path(
+            project_dir.join(".pio", "build").strpath, "native")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w") as fp:
+            json.dump(
+                dict(version=PROJECT_IDE_DATA_VERSION,
+                     pioversion=__version__,
+                     checksum=compute_project_checksum(config),
+                     sysenv=get_project_options_sysenv(),
+                     deps=get_project_ide_data_deps(
+                         [manifest.strpath, lib_dir.strpath]),
+                     data=ide_data), fp)
+
+    # fresh data is loaded without running of the build system
+    assert load_project_ide_data(project_dir.strpath, "native") == ide_data
+    assert load_project_ide_data(project_dir.strpath,
+                                 ["native"]) == dict(native=ide_data)
+
+    monkeypatch.setattr("click.testing.CliRunner.invoke",
+                        lambda *args, **kwargs: pytest.fail("outdated"))
+
+    # a changed header of a library makes data outdated
+    lib_dir.join("Foo", "src", "Foo.h").write("#define FOO 1")
+    with pytest.raises(pytest.fail.Exception):
+        load_project_ide_data(project_dir.strpath, "native")
+
+    # updated platform makes data outdated
+    os.utime(manifest.strpath, (0, 0))
+    with pytest.raises(pytest.fail.Exception):
+        load_project_ide_data(project_dir.strpath, "native")
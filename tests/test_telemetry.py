@@ -0,0 +1,38 @@
+# Copyright (c) 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from platformio import telemetry
+
+
+def test_spool_batches(tmpdir, telemetry_collector):
+    spool_path = tmpdir.join("telemetry.spool").strpath
+    items = [{"t": "event", "ea": str(i), "qt": 1000} for i in range(45)]
+    assert telemetry.append_to_spool(items, spool_path)
+    assert len(telemetry.read_spool(spool_path)) == 45
+
+    assert telemetry.flush_spool(spool_path)
+    assert not tmpdir.join("telemetry.spool").exists()
+    assert [hit['ea'] for hit in telemetry_collector
+            ] == [str(i) for i in range(45)]
+    assert all(int(hit['qt']) >= 0 for hit in telemetry_collector)
+
+
+def test_spool_offline(tmpdir, monkeypatch):
+    monkeypatch.setenv("PLATFORMIO_TELEMETRY_URL", "http://127.0.0.1:1/batch")
+    spool_path = tmpdir.join("telemetry.spool").strpath
+    telemetry.append_to_spool([{"t": "screenview"}], spool_path)
+    assert not telemetry.flush_spool(spool_path)
+    # hits are kept and the next sender is postponed
+    assert telemetry.read_spool(spool_path) == [{"t": "screenview"}]
+    assert telemetry.start_spool_sender(spool_path) is None